@@ -1,14 +1,29 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, Response, stream_with_context, copy_current_request_context
 from flask_cors import CORS
 import os
 import base64
 import sys
 import requests
 import json
-import re
-from openai import OpenAI
-import spacy
-from spacy.matcher import Matcher
+import logging
+import time
+import queue
+import threading
+import contextvars
+from collections import deque
+from itertools import tee
+from functools import lru_cache, wraps
+from http_clients import get_session, fan_out
+from token_counter import count_tokens
+from llm_stream import token_sink
+from id_extractor import extract_ids, extract_ids_batch, EXTRACTION_ENGINES
+from intent_classifier import IntentClassifier, INTENT_CATEGORIES, INTENT_SYSTEM_PROMPT, DESTRUCTIVE_INTENTS, build_intent_prompt
+from summarizer import MapReduceSummarizer, ChunkSummaryCache, TicketSummaryCache, note_key
+from intent_cache import IntentCache, normalize_prompt, prompt_template_version
+from token_accounting import token_ledger
+from llm_gateway import llm_gateway
+from metrics import stage_timer, start_timings, finish_timings, server_timing, register_collector, render as render_metrics, REQUEST_SECONDS, TURNS
+from log_config import configure_logging, LazyJson, begin_request, end_request, set_correlation_id, annotate, settings as log_settings
 
 # Lazy imports for workflow-specific functions
 def initialize_database():
@@ -27,18 +42,81 @@ def generate_conversation_id():
 with open('config/config.json') as config_file:
     config = json.load(config_file)
 
+# Level-gated logging; at INFO each request produces one line and the DEBUG records are never formatted
+configure_logging(config.get("logging", {}))
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
+
 OPENAI_API_KEY = config['api_keys']['openai']
 FRESH_SERVICE_API_KEY = config['api_keys']['freshservice']
 FRESH_SERVICE_BASE_URL = config['urls']['freshservice_base']
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-# Load spaCy model for entity extraction
-nlp = spacy.load("en_core_web_sm")
+# Local fast-path intent classifier; the LLM is only asked when it is not confident
+intent_classifier_config = config.get("intent_classifier", {})
+intent_classifier = None
+if intent_classifier_config.get("enabled", True):
+    intent_classifier = IntentClassifier(
+        threshold=intent_classifier_config.get("threshold", 0.8),
+        margin=intent_classifier_config.get("margin", 0.1),
+        training_log=intent_classifier_config.get("training_log")
+    )
+
+# Conversations requested per FreshService page (the API maximum)
+CONVERSATIONS_PER_PAGE = 100
+# Private notes sent for summarization are capped by tokens, keeping the most recent ones
+SUMMARY_TOKEN_BUDGET = config.get("summaries", {}).get("private_token_budget", 24000)
+
+# Defaults for /api/extract_ids/batch
+id_extraction_config = config.get("id_extraction", {})
+
+# Prometheus metrics on /metrics and the optional per-request Server-Timing header
+metrics_config = config.get("metrics", {})
 
 app = Flask(__name__)
 CORS(app) 
 
-initialize_database()
+@app.before_request
+def start_request():
+    begin_request()
+    start_timings()
+    # Hosts other than `python app.py`, async_server.py and gunicorn.conf.py (flask run,
+    # other WSGI servers) never call initialize_storage before serving
+    if not storage_ready:
+        initialize_storage()
+
+@app.after_request
+def finish_request(response):
+    """
+    Record the request's duration and log one line for it once its response has been sent,
+    streamed responses included. Adds the Server-Timing header when enabled.
+    """
+    timings = finish_timings()
+    if timings and metrics_config.get("server_timing", False) and not response.is_streamed:
+        response.headers["Server-Timing"] = server_timing(timings)
+
+    state = end_request()
+    if state is None:
+        return response
+    method, path, endpoint = request.method, request.path, request.endpoint or "unmatched"
+    log_line = log_settings["request_log"] and access_logger.isEnabledFor(logging.INFO)
+
+    def emit():
+        duration = time.perf_counter() - state["started"]
+        REQUEST_SECONDS.observe(duration, endpoint=endpoint, method=method, status=str(response.status_code))
+        if not log_line:
+            return
+        fields = {
+            "method": method,
+            "path": path,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 1),
+            **state["fields"]
+        }
+        access_logger.info("%s %s %s", method, path, response.status_code,
+                           extra={"fields": fields, "correlation_id": state["correlation_id"]})
+
+    response.call_on_close(emit)
+    return response
 
 def sanitize_user_input(input_str):
     """
@@ -46,146 +124,66 @@ def sanitize_user_input(input_str):
     """
     return input_str.isalnum()
 
-# Initialize spaCy Matcher
-matcher = Matcher(nlp.vocab)
-
-# Add custom patterns for ticket, subscription, and order IDs
-patterns = [
-    [{"LOWER": "ticket"}, {"LOWER": "id"}, {"IS_DIGIT": True}],
-    [{"LOWER": "subscription"}, {"LOWER": "id"}, {"IS_DIGIT": True}],
-    [{"LOWER": "order"}, {"LOWER": "id"}, {"IS_DIGIT": True}],
-    [{"LOWER": "ticket"}, {"LOWER": "number"}, {"IS_DIGIT": True}],
-    [{"LOWER": "order"}, {"TEXT": {"REGEX": r"SO\d+"}}],
-    [{"TEXT": {"REGEX": r"(INC|SR)-\d+"}}]  # Adjusted to match standalone prefixes like "INC-123456"
-]
-
-matcher.add("ID_PATTERNS", patterns)
-
-def extract_ids(doc):
+@lru_cache(maxsize=8)
+def basic_authorization(api_key):
     """
-    Extract ticket, subscription, and order IDs from the provided spaCy doc object.
-
-    Args:
-        doc: spaCy document object.
-
-    Returns:
-        list: A list of extracted IDs with their types.
-    """
-    matches = matcher(doc)
-    details = []
-    seen_ids = {"ticket_id": set(), "subscription_id": set(), "order_id": set()}  # Track IDs to avoid duplicates
-
-    # Define regex patterns
-    order_id_pattern = r"\b(SO|CF|CH|CL|DG|UG|RN|TA|TS)\d{6,10}\b"  # Matches prefixed order IDs like SO000099
-    ticket_id_pattern = r"\b(INC|SR)-\d+\b"  # Matches prefixed ticket IDs like INC-34 or SR-34
-    numeric_ticket_pattern = r"(ticket|sr|incident|number).*?\b\d+\b"  # Matches phrases like "Ticket ID 34"
-
-    for match_id, start, end in matches:
-        span = doc[start:end]
-        id_value = span.text.strip()  # Preserve the original text
-
-        # Extract ticket IDs (e.g., "INC-123456", "SR-34")
-        if re.match(ticket_id_pattern, span.text, re.IGNORECASE):
-            ticket_id = span.text.strip()
-            if ticket_id not in seen_ids["ticket_id"]:
-                details.append({"ticket_id": ticket_id})
-                seen_ids["ticket_id"].add(ticket_id)
-
-        # Extract subscription IDs
-        elif re.match(r"^SUB-\d+$", span.text, re.IGNORECASE) or "subscription" in span.text.lower():
-            subscription_id = span.text.strip()
-            if subscription_id not in seen_ids["subscription_id"]:
-                details.append({"subscription_id": subscription_id})
-                seen_ids["subscription_id"].add(subscription_id)
-
-        # Extract order IDs (e.g., "SO000099")
-        elif re.match(order_id_pattern, span.text, re.IGNORECASE):
-            order_id = span.text.strip()
-            if order_id not in seen_ids["order_id"]:
-                details.append({"order_id": order_id})
-                seen_ids["order_id"].add(order_id)
-
-    # Fallback: Handle phrases like "Ticket ID 34" and "Order SO000099"
-    text = doc.text.lower()  # Case-insensitive matching for fallback logic
-    fallback_matches = re.findall(r"(order|subscription|ticket|sr|incident|number)\s+(with\s+)?(id|number)?\s+(\S+)", text)
-    for match in fallback_matches:
-        id_type, _, _, id_value = match
-        if id_type == "order" and re.match(order_id_pattern, id_value, re.IGNORECASE) and id_value not in seen_ids["order_id"]:
-            details.append({"order_id": id_value})
-            seen_ids["order_id"].add(id_value)
-        elif id_type in ["ticket", "sr", "incident", "number"] and id_value not in seen_ids["ticket_id"]:
-            details.append({"ticket_id": id_value})
-            seen_ids["ticket_id"].add(id_value)
-
-    # Fallback: Match standalone numeric ticket IDs
-    numeric_ticket_matches = re.findall(r"\b\d+\b", text)
-    for match in numeric_ticket_matches:
-        if match not in seen_ids["ticket_id"]:
-            details.append({"ticket_id": match})
-            seen_ids["ticket_id"].add(match)
-
-    # Remove overlapping IDs to ensure a single ID is not classified as multiple types
-    order_ids = seen_ids["order_id"]
-    subscription_ids = seen_ids["subscription_id"]
-    ticket_ids = seen_ids["ticket_id"]
-
-    # Remove IDs from order if they exist in subscription
-    seen_ids["order_id"] -= subscription_ids
-    # Remove IDs from ticket if they exist in order or subscription
-    seen_ids["ticket_id"] -= (order_ids | subscription_ids)
-
-    # Rebuild the details list to ensure no overlap
-    details = (
-        [{"ticket_id": ticket_id} for ticket_id in seen_ids["ticket_id"]] +
-        [{"subscription_id": subscription_id} for subscription_id in seen_ids["subscription_id"]] +
-        [{"order_id": order_id} for order_id in seen_ids["order_id"]]
-    )
-
-    return details
-
-def generate_auth_header(api_key):
-    """
-    Generate the authorization header for FreshService API requests.
+    Return the Basic authorization value for a FreshService API key, encoded once per key.
     """
     if sanitize_user_input(api_key):
         encoded_credentials = base64.b64encode(f"{api_key}:X".encode('utf-8')).decode('utf-8')
-        return {
-            "Content-Type": "application/json",
-            "Authorization": f"Basic {encoded_credentials}"
-        }
+        return f"Basic {encoded_credentials}"
     else:
         sys.exit("Special characters or whitespaces are not allowed in the API key. Authentication failed.")
 
-def fetch_ticket_conversations(ticket_id):
+def generate_auth_header(api_key):
     """
-    Fetch conversations and ticket details for a specific ticket from FreshService.
-
-    Args:
-    - ticket_id (int): The ID of the ticket.
+    Generate the authorization header for FreshService API requests.
+    """
+    return {
+        "Content-Type": "application/json",
+        "Authorization": basic_authorization(api_key)
+    }
 
-    Returns:
-    - list: Combined list of conversations and ticket details.
+def iter_conversations(ticket_id, headers, per_page=CONVERSATIONS_PER_PAGE):
     """
-    headers = generate_auth_header(FRESH_SERVICE_API_KEY)
+    Yield the conversations of a ticket from FreshService, one page at a time.
 
-    # Fetch conversations from FreshService
-    try:
-        conversations_url = f"{FRESH_SERVICE_BASE_URL}/tickets/{ticket_id}/conversations"
-        conversations_response = requests.get(conversations_url, headers=headers)
-        conversations_response.raise_for_status()
+    Pages are requested lazily with `page`/`per_page` and the `next` link of the Link
+    header is followed until the last page.
+    """
+    url = f"{FRESH_SERVICE_BASE_URL}/tickets/{ticket_id}/conversations"
+    params = {"page": 1, "per_page": per_page}
+    while url:
+        try:
+            conversations_response = get_session("freshservice").get(url, headers=headers, params=params)
+            conversations_response.raise_for_status()
+            conversations_data = conversations_response.json()
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Failed to fetch conversations: {e}")
 
-        conversations_data = conversations_response.json()
         if "conversations" not in conversations_data:
             raise Exception("Invalid response format: 'conversations' key not found.")
 
         conversations = conversations_data["conversations"]
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Failed to fetch conversations: {e}")
+        yield from conversations
+
+        next_url = conversations_response.links.get("next", {}).get("url")
+        if next_url:
+            # The next link already carries the paging parameters
+            url, params = next_url, None
+        elif "Link" not in conversations_response.headers and params and len(conversations) == per_page:
+            # No Link header at all: keep paging until a short page
+            params = {**params, "page": params["page"] + 1}
+        else:
+            url = None
 
-    # Fetch ticket details from FreshService
+def fetch_ticket_details_entry(ticket_id, headers):
+    """
+    Fetch the details of a ticket from FreshService as a conversation entry.
+    """
     try:
         ticket_details_url = f"{FRESH_SERVICE_BASE_URL}/tickets/{ticket_id}"
-        ticket_details_response = requests.get(ticket_details_url, headers=headers)
+        ticket_details_response = get_session("freshservice").get(ticket_details_url, headers=headers)
         ticket_details_response.raise_for_status()
 
         ticket_details_data = ticket_details_response.json()
@@ -196,29 +194,66 @@ def fetch_ticket_conversations(ticket_id):
         subject = ticket.get("subject", "N/A")
         description_text = ticket.get("description_text", "N/A")
 
-        # Add ticket details as a new conversation entry
-        conversations.append({
+        return {
             "body_text": f"Subject: {subject}\nDescription: {description_text}",
-            "private": False  # Marking it public for inclusion in summaries
-        })
+            "private": False,  # Marking it public for inclusion in summaries
+            "updated_at": ticket.get("updated_at")
+        }
     except requests.exceptions.RequestException as e:
         raise Exception(f"Failed to fetch ticket details: {e}")
 
-    return conversations
+def iter_ticket_conversations(ticket_id):
+    """
+    Yield the conversations of a ticket followed by its details entry, without holding
+    them all in memory.
+
+    The ticket details are fetched concurrently with the first page of conversations.
+    """
+    headers = generate_auth_header(FRESH_SERVICE_API_KEY)
+    ticket_details_future, = fan_out(lambda: fetch_ticket_details_entry(ticket_id, headers))
+    yield from iter_conversations(ticket_id, headers)
+    yield ticket_details_future.result()
 
-def get_customer_friendly_response(private_messages):
+def latest_private_messages(conversations, token_budget=SUMMARY_TOKEN_BUDGET):
     """
-    Generate a customer-friendly response summarizing the private messages.
+    Collect the private notes, keeping the most recent ones that fit in `token_budget`.
+
+    Conversations are consumed one at a time and older notes are dropped as soon as the
+    budget is exceeded, so memory is bounded by the budget rather than the thread length.
+    With the map-reduce summarizer, notes are dropped a whole summarizer chunk at a time,
+    so the kept notes are chunked as in the full thread and their chunk summaries stay
+    cached as new notes arrive.
 
     Args:
-    - private_messages (list): A list of private messages (strings).
+    - conversations (iterable): Conversations, oldest first.
+    - token_budget (int): Maximum tokens of private notes to keep, or None for no cap.
 
     Returns:
-    - str: A customer-friendly response.
+    - list: The kept private messages as {"id", "body_text"}, oldest first.
     """
-    combined_text = "\n\n".join([f"Private Message {i+1}: {message}" for i, message in enumerate(private_messages)])
-
-    prompt = f"""
+    notes = ((conv.get("id"), conv.get("body_text", "")) for conv in conversations if conv.get("private"))
+    if summarizer:
+        packed = summarizer.chunk_starts(notes)
+    else:
+        packed = ((note_id, text, count_tokens(text), True) for note_id, text in notes)
+
+    private_messages = deque()
+    used_tokens = 0
+    for note_id, text, tokens, starts_chunk in packed:
+        private_messages.append(({"id": note_id, "body_text": text}, tokens, starts_chunk))
+        used_tokens += tokens
+        # Always keep the newest note, even if it alone exceeds the budget
+        while token_budget is not None and used_tokens > token_budget and len(private_messages) > 1:
+            used_tokens -= private_messages.popleft()[1]
+            while len(private_messages) > 1 and not private_messages[0][2]:
+                used_tokens -= private_messages.popleft()[1]
+    return [message for message, _, _ in private_messages]
+
+def build_customer_friendly_prompt(combined_text, label="Private Messages"):
+    """
+    Build the prompt turning private discussion text into a customer-friendly response.
+    """
+    return f"""
     The following text contains technical details from private discussions about a customer's issue. 
     These messages are not accessible to the customer and may contain sensitive or internal information.
 
@@ -231,38 +266,158 @@ def get_customer_friendly_response(private_messages):
     6. Do not sign the reply with Best regards,\n[Your Name] or Sincerely etc.
     7. Do not label each of the summaries with ANYTHING.  Specifically \"Subject & Description Summary:\" or \"Private Messages Summary:\"
 
-    Private Messages:
+    {label}:
     {combined_text}
 
     Customer-Friendly Response:
     """
 
+UPDATE_CUSTOMER_FRIENDLY_PROMPT = """
+    The customer already received the update below about their issue. New private messages have been added to the ticket since.
+    These messages are not accessible to the customer and may contain sensitive or internal information.
+
+    Your task is to:
+    1. Rewrite the previous update so that it also covers what the new private messages add.
+    2. Keep what is still accurate in the previous update and drop what the new messages make outdated.
+    3. Avoid sharing sensitive or technical details.
+    4. Focus on providing a clear, reassuring update to the customer.
+    5. Do not sign the reply with Best regards,\n[Your Name] or Sincerely etc.
+    6. Do not label the update or its parts with ANYTHING.
+
+    Previous Update:
+    {previous_response}
+
+    New Private Messages:
+    {combined_text}
+
+    Customer-Friendly Response:
+    """
+
+def complete_summary(prompt, max_tokens=2000):
+    """
+    Run a summarization prompt through the LLM and return the completion text.
+    """
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
+    # Streamed to the user when a streaming request is in progress
+    return llm_gateway.complete(messages, purpose="summary", max_tokens=max_tokens)
+
+def as_notes(private_messages):
+    """
+    Turn private messages (strings or conversations with "id" and "body_text") into (note_id, text) pairs.
+    """
+    return [
+        (message.get("id"), message.get("body_text", "")) if isinstance(message, dict) else (None, message)
+        for message in private_messages
+    ]
+
+def condense_notes(notes, label):
+    """
+    Join notes into prompt text, going through the map-reduce summarizer when they do not fit one chunk.
+
+    Returns:
+    - tuple: (combined_text, is_summary)
+    """
+    if summarizer and summarizer.needs_chunking(notes):
+        summaries = summarizer.summarize(notes)
+        return "\n\n".join([f"Summary of {label}, part {i+1}: {summary}" for i, summary in enumerate(summaries)]), True
+    return "\n\n".join([f"{label[:-1]} {i+1}: {message}" for i, (_, message) in enumerate(notes)]), False
+
+def generate_customer_friendly_response(private_messages):
+    """
+    Generate a customer-friendly response summarizing the private messages, raising on errors.
+
+    Threads that fit in one summarizer chunk are sent in a single prompt. Longer ones are
+    summarized chunk by chunk first (see summarizer.MapReduceSummarizer) and the reply is
+    written from the chunk summaries.
+    """
+    combined_text, is_summary = condense_notes(as_notes(private_messages), "Private Messages")
+    label = "Private Message Summaries" if is_summary else "Private Messages"
+    return complete_summary(build_customer_friendly_prompt(combined_text, label=label))
+
+def get_customer_friendly_response(private_messages):
+    """
+    Generate a customer-friendly response summarizing the private messages.
+
+    Args:
+    - private_messages (list): Private messages, as strings or conversations with "id" and "body_text".
+
+    Returns:
+    - str: A customer-friendly response.
+    """
+    try:
+        return generate_customer_friendly_response(private_messages)
+    except Exception as e:
+        return f"An error occurred: {e}"
+
+def update_customer_friendly_response(previous_response, new_messages):
+    """
+    Update a customer-friendly response with private messages added since it was written.
+    """
+    combined_text, _ = condense_notes(as_notes(new_messages), "New Private Messages")
+    return complete_summary(UPDATE_CUSTOMER_FRIENDLY_PROMPT.format(
+        previous_response=previous_response,
+        combined_text=combined_text
+    ))
+
+def summarize_ticket_update(ticket_id):
+    """
+    Summarize the private notes of a ticket into a customer-friendly update.
+
+    The summary is served from the ticket summary cache while the ticket's private notes
+    and `updated_at` are unchanged. When notes were added, the previous summary is updated
+    with the new notes only.
+
+    Args:
+    - ticket_id (int): The ID of the ticket.
+
+    Returns:
+    - str: The customer-friendly update, or None when the ticket has no private notes.
+    """
+    ticket_details = {}
+
+    def remember_updated_at(conversations):
+        for conv in conversations:
+            if "updated_at" in conv:
+                ticket_details["updated_at"] = conv["updated_at"]
+            yield conv
+
+    private_messages = latest_private_messages(remember_updated_at(iter_ticket_conversations(ticket_id)))
+    if not private_messages:
+        return None
+    if not ticket_summary_cache:
+        return get_customer_friendly_response(private_messages)
+
+    note_keys = [note_key(note_id, text) for note_id, text in as_notes(private_messages)]
+    fingerprint = ticket_summary_cache.fingerprint(note_keys, ticket_details.get("updated_at"))
+    status, previous_response, previous_keys = ticket_summary_cache.lookup(ticket_id, fingerprint)
+    if status == "hit":
+        return previous_response
+
     try:
-        response = client.chat.completions.create(model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=2000,
-        temperature=0.4)
-        return response.choices[0].message.content.strip()
+        if status == "stale":
+            covered = set(previous_keys)
+            new_messages = [message for message, key in zip(private_messages, note_keys) if key not in covered]
+            # A change without new notes (e.g. a status update) leaves the summary as it is
+            response = update_customer_friendly_response(previous_response, new_messages) if new_messages else previous_response
+        else:
+            response = generate_customer_friendly_response(private_messages)
     except Exception as e:
         return f"An error occurred: {e}"
 
+    ticket_summary_cache.put(ticket_id, fingerprint, note_keys, response)
+    return response
+
 def call_openai_api(model, messages):
     """
-    Standardized method to call the OpenAI API using the OpenAI client library.
+    Standardized method to call the OpenAI API through the LLM gateway.
     """
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=2000,
-            temperature=0.4
-        )
-        return response.choices[0].message.content.strip()
+        return llm_gateway.complete(messages, model=model)
     except Exception as e:
-        print(f"Error calling OpenAI API: {e}")
+        logger.error("Error calling OpenAI API: %s", e)
         return None
     
 @app.route('/')
@@ -321,18 +476,10 @@ def summarize_ticket_html():
     """
     ticket_id = request.form.get('ticket_id')
     try:
-        conversations = fetch_ticket_conversations(ticket_id)
+        response = summarize_ticket_update(ticket_id)
 
-        private_messages = [
-            conv.get("body_text", "")
-            for conv in conversations
-            if conv.get("private") == True
-        ]
-
-        if not private_messages:
+        if response is None:
             response = "No private messages found to summarize."
-        else:
-            response = get_customer_friendly_response(private_messages)
     except Exception as e:
         response = f"An error occurred: {e}"
 
@@ -378,6 +525,70 @@ def summarize_ticket_html():
     </html>
     ''', response=response)
 
+# System prompt for /api/summarize
+DOCUMENTATION_SYSTEM_PROMPT = 'You are CloudBlue Insight, a specialized bot designed to answer questions based on the CloudBlue Commerce documentation. Always provide answers by referencing the online documentation at: https://docs.cloudblue.com/cbc/21.0/home.htm . If the information cannot be found in the documentation, inform the user and suggest they contact CloudBlue Support, linking to the support page.'
+
+def complete_documentation_answer(prompt):
+    """
+    Answer a prompt from the CloudBlue Commerce documentation and return the completion text.
+    """
+    messages = [
+        {"role": "system", "content": DOCUMENTATION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    # Streamed to the user when a streaming request is in progress
+    return llm_gateway.complete(messages, purpose="documentation", max_tokens=2000)
+
+def format_sse(event, data):
+    """
+    Format one Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_events(work):
+    """
+    Run `work` in a worker thread and stream its LLM output as Server-Sent Events.
+
+    Every text delta of the LLM calls made by `work` is sent as a `token` event
+    ({"delta": ...}) as soon as it arrives. The payload returned by `work` follows as a
+    `done` event, or as an `error` event with its "status" when that is not 200 or when
+    `work` raised.
+
+    Args:
+    - work (callable): Takes no arguments and returns the final JSON payload, or a
+      (payload, status) tuple. It runs with a copy of the current request context.
+
+    Returns:
+    - Response: A text/event-stream response.
+    """
+    events = queue.Queue()
+
+    @copy_current_request_context
+    def run():
+        try:
+            with token_sink(lambda delta: events.put(("token", {"delta": delta}))):
+                result = work()
+            payload, status = result if isinstance(result, tuple) else (result, 200)
+            if status == 200:
+                events.put(("done", payload))
+            else:
+                events.put(("error", {**payload, "status": status}))
+        except Exception as e:
+            events.put(("error", {"error": str(e), "status": 500}))
+
+    # The worker keeps the request's logging state (correlation ID, sampling)
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+
+    def generate():
+        while True:
+            event, data = events.get()
+            yield format_sse(event, data)
+            if event != "token":
+                break
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/api/summarize', methods=['POST'])
 def summarize_text():
     """
@@ -391,28 +602,125 @@ def summarize_text():
 
         prompt = data['prompt']
 
-        # Call OpenAI GPT
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": 'You are CloudBlue Insight, a specialized bot designed to answer questions based on the CloudBlue Commerce documentation. Always provide answers by referencing the online documentation at: https://docs.cloudblue.com/cbc/21.0/home.htm . If the information cannot be found in the documentation, inform the user and suggest they contact CloudBlue Support, linking to the support page.'
-                    },
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.4
-        )
-
-        # Extract the summarized content
-        summary = response.choices[0].message.content.strip()
-
-        return jsonify({"summary": summary})
+        if data.get("stream"):
+            return stream_events(lambda: {"summary": complete_documentation_answer(prompt)})
+
+        return jsonify({"summary": complete_documentation_answer(prompt)})
 
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+
+def parse_batch_record(record):
+    """
+    Turn a batch input record into a (record_id, text) pair.
+
+    A record is either a string or an object with a "text" field and an optional "id".
+    Invalid records get a text of None.
+    """
+    if isinstance(record, str):
+        return None, record
+    if isinstance(record, dict):
+        text = record.get("text")
+        return record.get("id"), text if isinstance(text, str) else None
+    return None, None
+
+def read_batch_records(lines):
+    """
+    Parse NDJSON lines into (record_id, text) pairs, skipping blank lines.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield parse_batch_record(json.loads(line))
+        except ValueError:
+            yield None, None
+
+@app.route('/api/extract_ids/batch', methods=['POST'])
+def extract_ids_batch_route():
+    """
+    Extract IDs from many texts and stream the results back as NDJSON.
+
+    The body is either JSON ({"texts": [...]}) or NDJSON (Content-Type application/x-ndjson)
+    with one record per line, where a record is a string or {"id": ..., "text": ...}.
+    "engine" ("regex" or "spacy") and "batch_size" are read from the JSON payload or, for
+    NDJSON, from the query string. Records are read and answered one at a time, so memory
+    stays flat regardless of the input size. Each output line is
+    {"index": n, "id": ..., "details": [...]}, or carries an "error" for an invalid record.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        options = request.args
+        records = read_batch_records(line.decode("utf-8") for line in request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get("texts"), list):
+            return jsonify({"error": "Missing 'texts' list in JSON payload"}), 400
+        options = data
+        records = (parse_batch_record(record) for record in data["texts"])
+
+    engine = options.get("engine", id_extraction_config.get("engine", "regex"))
+    if engine not in EXTRACTION_ENGINES:
+        return jsonify({"error": f"Unknown engine '{engine}', expected one of {', '.join(EXTRACTION_ENGINES)}"}), 400
+    try:
+        batch_size = int(options.get("batch_size", id_extraction_config.get("batch_size", 256)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'batch_size' must be an integer"}), 400
+    n_process = id_extraction_config.get("n_process", 1)
+
+    def generate():
+        # The extractor only sees the texts; the ids are zipped back in order, and tee only
+        # buffers the records nlp.pipe has read ahead
+        metadata, pending = tee(records)
+        texts = (text or "" for _, text in pending)
+        results = extract_ids_batch(texts, engine=engine, batch_size=max(1, batch_size), n_process=n_process)
+        for index, ((record_id, text), details) in enumerate(zip(metadata, results)):
+            line = {"index": index, "id": record_id}
+            if text is None:
+                line["error"] = "Record is not a string or an object with a 'text' field"
+            else:
+                line["details"] = details
+            yield json.dumps(line) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# Model used for LLM intent classification
+INTENT_MODEL = llm_gateway.route("intent_classification")
+# Classifications by a cheaper model below this certainty are asked again of a larger one
+INTENT_MIN_CERTAINTY = config.get("model_routing", {}).get("intent_min_certainty", 0.6)
+
+def parse_intent_reply(response_content):
+    """
+    Parse the JSON reply of the intent classification prompt.
+
+    Args:
+     - response_content (str): LLM reply.
+
+    Returns:
+     - tuple: Intent, category and certainty (as a float).
+    """
+    intent_data = json.loads(response_content)
+    intent = intent_data.get("intent")
+    category = intent_data.get("category")
+    certainty = intent_data.get("certainty", "0.2")  # Default to "0.2" as a string if not provided
+
+    # Ensure certainty is a float
+    try:
+        certainty = round(float(certainty), 2)
+    except ValueError:
+        certainty = 1.0 if certainty.lower() == "high" else 0.2
+    return intent, category, certainty
+
+def usable_intent_reply(response_content):
+    """
+    Whether an intent classification reply names a known intent with enough certainty.
+    Replies that fail are escalated by the LLM gateway to the next larger model.
+    """
+    intent, _, certainty = parse_intent_reply(response_content)
+    return intent in INTENT_CATEGORIES and certainty >= INTENT_MIN_CERTAINTY
+
 @app.route('/api/intent', methods=['POST'])
 def detect_intent():
     data = request.json
@@ -421,104 +729,52 @@ def detect_intent():
 
     prompt = data['prompt']
 
-    # Query OpenAI API for intent classification
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful assistant that classifies user intents. "
-                        "Focus on identifying the primary intent based on the user's question or request. "
-                        "If the user includes information like 'order ID' or 'subscription ID,' use this as additional context, not as the primary intent indicator."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        f"Classify the following prompt into one of the predefined intents: \n{prompt}\n\n"
-                        "Predefined intents are:\n"
-                        "- Trouble Tickets:\n"
-                        "  - createTicket: Used when the user explicitly requests creating a ticket. Examples: \n"
-                        "    - 'Can you open a ticket for me?'\n"
-                        "    - 'Please create a ticket.'\n"
-                        "    - 'I need help, can you log a ticket?'\n"
-                        "  - getTicketUpdate: Used when the user asks for an update on a ticket. Examples: \n"
-                        "    - 'What is the status of my ticket'\n"
-                        "    - 'Can you update me on ticket number'\n"
-                        "  - updateTicket: Used when the user wants to modify an existing ticket. Examples: \n"
-                        "    - 'I need to update ticket'\n"
-                        "    - 'Please make changes to ticket'\n"
-                        "  - closeTicket: Used when the user asks to close a ticket. Examples: \n"
-                        "    - 'Close ticket ID 12345.'\n"
-                        "    - 'Please resolve and close ticket 54321.'\n"
-                        "- How to Help:\n"
-                        "  - howToHelp: Used when the user requests guidance or troubleshooting help. Examples: \n"
-                        "    - 'Where can I find help in the documentation?'\n"
-                        "    - 'Can you guide me on this process?'\n"
-                        "  - integrationHelp: Used when the user requests help integrating systems. Examples: \n"
-                        "    - 'I need help with integrating your API.'\n"
-                        "- Order from Catalog:\n"
-                        "  - listProducts: Used when the user requests a list of all products in the catalog. Examples: \n"
-                        "    - 'Show me all products'\n"
-                        "    - 'What products do you have?'\n"
-                        "  - filterProducts: Used when the user requests filtering the catalog based on a keyword. Examples: \n"
-                        "    - 'Show products related to laptops'\n"
-                        "  - orderProduct: Used when the user wants to place an order from the catalog. Examples: \n"
-                        "    - 'Order item ID 123'\n"
-                        "    - 'I want to buy a laptop.'\n"
-                        "- Manage Orders:\n"
-                        "  - getOrderStatus: Used when the user asks for the status of a specific order. Examples: \n"
-                        "    - 'What is the status of my order ID 98765?'\n"
-                        "    - 'Track my order 12345.'\n"
-                        "    - 'What is happening with order ID 12345'\n"
-                        "  - listOpenOrders: Used when the user asks to see all open orders. Examples: \n"
-                        "    - 'Show me all open orders'\n"
-                        "  - listFailedOrders: Used when the user requests to see failed orders. Examples: \n"
-                        "    - 'Show me failed orders'\n"
-                        "  - cancelOrder: Used when the user wants to cancel an existing order. Examples: \n"
-                        "    - 'Cancel order ID 12345.'\n"
-                        "  - pushOrder: Used for when the user wants to resubmit an order due to an error. Examples: \n"
-                        "    - 'Please resubmit order ID 12345'\n"
-                        "    - 'Please try order ID 12345 again'\n"
-                        "    - 'Please process order ID 12345'\n"
-                        "  - orderReports: Used when the user requests order reports for a specific period. Examples: \n"
-                        "    - 'Provide a report of all orders for January 2025.'\n"
-                        "    - 'Generate a summary of orders placed last week.'\n"
-                        "    - 'Give me a list of my last orders.'\n"
-                        "    - 'Show me my last orders.'\n"
-                        "    - 'Show me the orders from 01-01-2025 to 01-07-2025.'\n"
-                        "    - 'Show me a list of orders with that failed payment?'\n"
-                        "\nProvide the response ONLY as a JSON object containing 'intent', 'category', and 'certainty'."
-                    )
-                }
-            ],
-            max_tokens=300,
-            temperature=0
-        )
-
-        # Parse OpenAI response for intent and classification
-        response_content = response.choices[0].message.content.strip()
-        intent_data = json.loads(response_content)
-        intent = intent_data.get("intent")
-        category = intent_data.get("category")
-        certainty = intent_data.get("certainty", "0.2")  # Default to "0.2" as a string if not provided
-
-        # Ensure certainty is a float
-        try:
-            certainty = round(float(certainty), 2)
-        except ValueError:
-            certainty = 1.0 if certainty.lower() == "high" else 0.2
-
-    except json.JSONDecodeError:
-        return jsonify({"error": "Invalid response format from OpenAI API."}), 500
-    except Exception as e:
-        return jsonify({"error": f"Failed to classify intent: {str(e)}"}), 500
-
     # Extract IDs using the extract_ids function
-    doc = nlp(prompt)
-    details = extract_ids(doc)
+    with stage_timer("extraction"):
+        details = extract_ids(prompt)
+
+    # Try the local classifier first, then previously seen phrasings, and only pay for
+    # the LLM round trip when neither knows the answer
+    with stage_timer("local_classifier"):
+        local_result = intent_classifier.classify(prompt) if intent_classifier else None
+    normalized_prompt = normalize_prompt(prompt, details)
+    cached_result = None
+    if not local_result and intent_cache:
+        with stage_timer("intent_cache"):
+            cached_result = intent_cache.get(normalized_prompt)
+
+    if local_result or cached_result:
+        intent_data = local_result or cached_result
+        intent = intent_data["intent"]
+        category = intent_data["category"]
+        certainty = intent_data["certainty"]
+    else:
+        # Query OpenAI API for intent classification
+        llm_started = time.perf_counter()
+        try:
+            # The JSON classification is never streamed to the user
+            response_content = llm_gateway.complete([
+                {"role": "system", "content": INTENT_SYSTEM_PROMPT},
+                {"role": "user", "content": build_intent_prompt(prompt)}
+            ], purpose="intent_classification", max_tokens=300, temperature=0, stream=False,
+                validate=usable_intent_reply)
+
+            # Parse OpenAI response for intent and classification
+            intent, category, certainty = parse_intent_reply(response_content)
+
+        except json.JSONDecodeError:
+            return jsonify({"error": "Invalid response format from OpenAI API."}), 500
+        except Exception as e:
+            return jsonify({"error": f"Failed to classify intent: {str(e)}"}), 500
+
+        # Keep the LLM label as training data for the local classifier
+        if intent_classifier:
+            intent_classifier.record(prompt, intent, category, certainty, (time.perf_counter() - llm_started) * 1000)
+
+        # Serve the same phrasing from the cache next time; requests that change tickets
+        # or orders are always classified by the LLM
+        if intent_cache and intent not in DESTRUCTIVE_INTENTS:
+            intent_cache.put(normalized_prompt, {"intent": intent, "category": category, "certainty": certainty})
 
     # Return response
     return jsonify({
@@ -528,10 +784,87 @@ def detect_intent():
         "details": details
     })
 
-from workflow import initialize_database, handle_intent, generate_conversation_id, retrieve_context, save_context
+from workflow import initialize_database, handle_intent, generate_conversation_id, save_context, begin_context_session, commit_context_session, context_store
+from workflow import active_flow_step, is_escape_phrase, handle_flow_escape, commerce_client, context_cache, order_cache
+from commerce_client import install_sighup_reload
+from context_store import ContextConflictError, ContextUnavailableError
+
+# Persistent cache of LLM intent classifications, stored next to the conversation contexts
+intent_cache_config = config.get("intent_cache", {})
+intent_cache = None
+if intent_cache_config.get("enabled", True):
+    intent_cache = IntentCache(
+        context_store.connection,
+        prompt_template_version(INTENT_SYSTEM_PROMPT, build_intent_prompt("{prompt}"), INTENT_MODEL),
+        ttl_seconds=intent_cache_config.get("ttl_seconds", 86400)
+    )
+
+# Long ticket threads are summarized chunk by chunk, with chunk summaries cached by note
+summaries_config = config.get("summaries", {})
+summarizer = None
+chunk_summary_cache = None
+if summaries_config.get("map_reduce", True):
+    chunk_summary_cache = ChunkSummaryCache(
+        context_store.connection,
+        ttl_seconds=summaries_config.get("chunk_cache_ttl_seconds", 30 * 86400)
+    )
+    summarizer = MapReduceSummarizer(
+        complete_summary,
+        model=llm_gateway.route("summary"),
+        chunk_tokens=summaries_config.get("chunk_tokens", 3000),
+        summary_tokens=summaries_config.get("chunk_summary_tokens", 400),
+        reduce_tokens=summaries_config.get("reduce_tokens", 4000),
+        cache=chunk_summary_cache,
+        workers=summaries_config.get("map_workers", 4)
+    )
+
+# Customer-friendly ticket summaries are reused until the ticket changes
+ticket_summary_cache = None
+if summaries_config.get("ticket_cache", True):
+    ticket_summary_cache = TicketSummaryCache(
+        context_store.connection,
+        prompt_template_version(build_customer_friendly_prompt("{combined_text}"), UPDATE_CUSTOMER_FRIENDLY_PROMPT, llm_gateway.route("summary")),
+        ttl_seconds=summaries_config.get("ticket_cache_ttl_seconds", 30 * 86400)
+    )
+
+storage_ready = False
+storage_lock = threading.Lock()
+
+def initialize_storage():
+    """
+    Create the SQLite tables and drop expired cache entries, once per process.
+
+    Runs before serving rather than at import: `python app.py`, async_server.py and the
+    gunicorn master (gunicorn.conf.py) call it, and pre-fork workers inherit the done
+    flag. Under any other host the first request runs it instead.
+    """
+    global storage_ready
+    with storage_lock:
+        if storage_ready:
+            return
+        initialize_database()
+        for cache in (intent_cache, chunk_summary_cache, ticket_summary_cache):
+            if cache is not None:
+                cache.initialize()
+        storage_ready = True
+
 from app import detect_intent  # Import detect_intent directly from summarize.py
 
+def counted_turn(view):
+    """
+    Count the conversation turns handled by `view` by intent and response status.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        result = view(*args, **kwargs)
+        response, status = result if isinstance(result, tuple) else (result, 200)
+        intent = (response.get_json(silent=True) or {}).get("intent")
+        TURNS.inc(intent=intent if intent in INTENT_CATEGORIES else "none", status=str(status))
+        return result
+    return wrapper
+
 @app.route('/api/conversation', methods=['POST'])
+@counted_turn
 def conversation():
     """
     Handle conversation endpoint, ensuring conversation_id persists and details are updated.
@@ -544,36 +877,75 @@ def conversation():
     # Generate or use existing conversation_id
     conversation_id = data.get("conversation_id") or generate_conversation_id()
 
-    # Retrieve conversation context
-    context = retrieve_context(conversation_id)
-    print("DEBUG: Retrieving Context Start of Conversation function")
-    print(f"DEBUG: {json.dumps(context, indent=2)}")
+    # Load the conversation context once; handlers share it and it is written once at the end
+    try:
+        with stage_timer("context_load"):
+            context = begin_context_session(conversation_id).context
+    except ContextUnavailableError:
+        # Carrying on with a default context would overwrite the stored one
+        return jsonify({
+            "error": "The conversation could not be loaded right now. Please try again.",
+            "conversation_id": conversation_id
+        }), 503
+    set_correlation_id(conversation_id)
+    logger.debug("Context at the start of the conversation turn: %s", LazyJson(context))
 
     # Extract intent and details
     prompt = data['prompt']
     try:
-        # Use detect_intent to classify intent and extract details
-        intent_response = detect_intent()
-        intent_data = intent_response.get_json()
-        intent = intent_data.get("intent")
-        details = intent_data.get("details", [])
-        certainty = intent_data.get("certainty", 0.2)
-
-        # Use extract_ids if no details are populated
-        if not details:
-            doc = nlp(prompt)
-            details = extract_ids(doc)
+        flow_step = active_flow_step(context)
+        if flow_step and is_escape_phrase(prompt):
+            # The user wants out of the ongoing flow; no classification needed
+            logger.debug("Escape phrase received during %s, resetting the conversation", flow_step)
+            reply_data = handle_flow_escape(context, conversation_id)
+            with stage_timer("context_save"):
+                commit_context_session()
+            return jsonify({
+                "conversation_id": conversation_id,
+                "classification": None,
+                "intent": None,
+                "certainty": 1.0,
+                "details": [],
+                "reply": reply_data.get("reply"),
+                "next_step": reply_data.get("next_step")
+            })
+
+        if flow_step:
+            # Mid-flow prompts are answers to the pending step, which handle_intent follows
+            # regardless of the intent, so skip classification (and the LLM) entirely
+            logger.debug("Flow in progress at %s, skipping intent detection", flow_step)
+            intent = context.get("intent")
+            certainty = 1.0
+            intent_data = {"classification": INTENT_CATEGORIES.get(intent)}
+            with stage_timer("extraction"):
+                details = extract_ids(prompt)
+        else:
+            # Use detect_intent to classify intent and extract details
+            with stage_timer("classification"):
+                intent_response = detect_intent()
+            if isinstance(intent_response, tuple):
+                # Classification failed; report its error with its status
+                error_response, status = intent_response
+                return jsonify({**error_response.get_json(), "conversation_id": conversation_id}), status
+            intent_data = intent_response.get_json()
+            intent = intent_data.get("intent")
+            details = intent_data.get("details", [])
+            certainty = intent_data.get("certainty", 0.2)
 
         # Update context with new details
-        print("DEBUG: Retrieving Context Mid of Conversation function before feeding handle intent")
-        print(f"DEBUG: {json.dumps(context, indent=2)}")
+        annotate(intent=intent)
+        logger.debug("Context before handle_intent: %s", LazyJson(context))
         context.update({"intent": intent, "details": details})
         # Save updated context
-        print("DEBUG: Saving Context in conversation ROUTE function")
         save_context(conversation_id, context)
 
         # Handle intent logic
-        reply_data = handle_intent(intent, details, conversation_id)
+        with stage_timer(f"handler.{intent if intent in INTENT_CATEGORIES else 'unknown'}"):
+            reply_data = handle_intent(intent, details, conversation_id)
+
+        # Persist the context changes made during this turn in a single write
+        with stage_timer("context_save"):
+            commit_context_session()
 
         # Construct full response
         return jsonify({
@@ -586,15 +958,107 @@ def conversation():
             "next_step": reply_data.get("next_step")
         })
 
+    except ContextConflictError:
+        return jsonify({
+            "error": "This conversation was updated from another window. Please reload and try again.",
+            "conversation_id": conversation_id
+        }), 409
     except Exception as e:
         return jsonify({"error": f"Failed to process the conversation: {str(e)}"}), 500
 
+@app.route('/api/conversation/stream', methods=['POST'])
+def conversation_stream():
+    """
+    Streaming variant of /api/conversation using Server-Sent Events.
+
+    Takes the same payload. The reply is sent as `token` events while the LLM generates
+    it, then the full /api/conversation response (with the cleaned reply, after the
+    context has been saved) follows as a `done` event. Failed turns end with an `error`
+    event carrying the error and the HTTP status /api/conversation would have returned.
+    """
+    # Read the body now, while the request is still open; the worker shares the parsed JSON
+    request.get_json(silent=True)
+
+    def run_turn():
+        result = conversation()
+        response, status = result if isinstance(result, tuple) else (result, 200)
+        return response.get_json(), status
+
+    return stream_events(run_turn)
+
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    """
+    Return the hit and miss counters of this process's caches; disabled caches are null.
+    """
+    return jsonify({name: cache.stats() if cache is not None else None for name, cache in process_caches().items()})
+
+@app.route('/api/token_usage', methods=['GET'])
+def token_usage():
+    """
+    Return this process's LLM token totals by purpose, model and intent, or those of the
+    conversation given as `conversation_id`.
+    """
+    conversation_id = request.args.get("conversation_id")
+    if conversation_id:
+        totals = token_ledger.conversation(conversation_id)
+        if totals is None:
+            return jsonify({"error": "No token usage recorded for this conversation."}), 404
+        return jsonify({"conversation_id": conversation_id, **totals})
+    return jsonify(token_ledger.stats())
+
+def process_caches():
+    return {
+        "context": context_cache,
+        "intent": intent_cache,
+        "summary_chunks": chunk_summary_cache,
+        "ticket_summaries": ticket_summary_cache,
+        "orders": order_cache
+    }
+
+# Cache statistics that are sizes rather than event counts
+CACHE_SIZE_STATS = ("entries", "bytes")
+
+def cache_metrics():
+    """
+    Expose the cache_stats counters on /metrics; hit ratios are left to the queries.
+    """
+    events, sizes = [], []
+    for name, cache in process_caches().items():
+        if cache is None:
+            continue
+        for stat, value in cache.stats().items():
+            if stat in CACHE_SIZE_STATS:
+                sizes.append(({"cache": name, "unit": stat}, value))
+            elif not stat.endswith("hit_ratio"):
+                events.append(({"cache": name, "event": stat}, value))
+    return [
+        ("ceebee_cache_events_total", "counter", "Cache lookups and maintenance events, by cache.", events),
+        ("ceebee_cache_size", "gauge", "Entries and bytes held by in-memory caches.", sizes)
+    ]
+
+register_collector(cache_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Return this process's metrics in the Prometheus text format: stage, upstream and request
+    latency histograms, conversation turns, LLM token usage and cache counters.
+    """
+    if not metrics_config.get("enabled", True):
+        return jsonify({"error": "Metrics are disabled."}), 404
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == '__main__':
     import argparse
 
     parser = argparse.ArgumentParser(description="Run the Flask app with a specified port.")
     parser.add_argument('--port', type=int, default=int(os.getenv("FLASK_PORT", 5000)),
                         help="Port number for the Flask app (default: 5000 or FLASK_PORT environment variable).")
+    parser.add_argument('--debug', action='store_true',
+                        help="Enable the Flask debugger and reloader (imports the app twice).")
     args = parser.parse_args()
 
-    app.run(debug=True, host="0.0.0.0", port=args.port)
+    initialize_storage()
+    install_sighup_reload(commerce_client)
+    app.run(debug=args.debug, host="0.0.0.0", port=args.port)
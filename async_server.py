@@ -0,0 +1,54 @@
+"""
+Cooperative (gevent) serving mode for the conversation API.
+
+The Flask handlers spend almost all of their time waiting on OpenAI, FreshService and
+the commerce API. Under `python app.py` every in-flight request holds an OS thread for
+those seconds. Here the standard library is monkey-patched by gevent before anything
+else is imported, so the blocking socket I/O in `requests`, the OpenAI client and the
+fan-out pool yields to other requests instead, and one worker process keeps thousands
+of conversations in flight with unchanged handlers.
+
+Usage:
+    pip install gevent
+    python async_server.py --port 5000 --max-connections 1000
+"""
+try:
+    from gevent import monkey
+except ImportError:  # gevent is only needed for this serving mode
+    monkey = None
+
+if monkey is not None:
+    # Must run before requests, ssl, openai or the app are imported
+    monkey.patch_all()
+
+import argparse
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Flask app with gevent.")
+    parser.add_argument('--host', default="0.0.0.0", help="Interface to listen on (default: 0.0.0.0).")
+    parser.add_argument('--port', type=int, default=int(os.getenv("FLASK_PORT", 5000)),
+                        help="Port number (default: 5000 or FLASK_PORT environment variable).")
+    parser.add_argument('--max-connections', type=int, default=1000,
+                        help="Maximum concurrent requests per process (default: 1000).")
+    args = parser.parse_args()
+
+    if monkey is None:
+        sys.exit("async_server.py needs gevent: pip install gevent")
+
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+    from app import app, initialize_storage, commerce_client
+    from commerce_client import install_sighup_reload
+
+    initialize_storage()
+    install_sighup_reload(commerce_client)
+    server = WSGIServer((args.host, args.port), app, spawn=Pool(args.max_connections))
+    print(f"Serving on http://{args.host}:{args.port} (gevent, up to {args.max_connections} concurrent requests)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Microbenchmark for conversation context persistence.
+
+Replays the context I/O of a single /api/conversation turn (retrieve, save, retrieve,
+save, save) against a scratch database, once with the old connect-per-call functions
+and once with the pooled ContextStore, and prints turns per second for both. With
+--thread-per-turn every turn runs on a new thread, as under werkzeug's development
+server or one greenlet per request under gevent.
+
+Usage:
+    python benchmarks/bench_context_store.py --turns 2000 --threads 4 --thread-per-turn
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_store import ContextStore, CREATE_CONVERSATIONS_SQL  # noqa: E402
+
+SAMPLE_CONTEXT = {
+    "intent": "createTicket",
+    "email": "jane.doe@domain.com",
+    "ticket_type": "incident",
+    "environment": "Production",
+    "subject": "order failing on checkout",
+    "description": "orders for customer 1002003 fail with a payment error " * 4,
+    "details": [{"ticket_id": "765884"}, {"order_id": "SO000099"}],
+    "ticket_id": None,
+    "next_step": "await_description",
+    "reply": "To help our engineers, can you describe the problem in full detail?",
+    "prompt": "the checkout page returns an error"
+}
+
+
+def legacy_save(db_path, conversation_id, context):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    cursor = conn.cursor()
+    cursor.execute('''INSERT INTO conversations (conversation_id, context)
+                      VALUES (?, ?)
+                      ON CONFLICT(conversation_id)
+                      DO UPDATE SET context = excluded.context''',
+                   (conversation_id, json.dumps(context)))
+    conn.commit()
+    conn.close()
+
+
+def legacy_retrieve(db_path, conversation_id):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    cursor = conn.cursor()
+    cursor.execute('SELECT context FROM conversations WHERE conversation_id = ?', (conversation_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return json.loads(row[0]) if row else dict(SAMPLE_CONTEXT)
+
+
+def run_turns(retrieve, save, turns):
+    for _ in range(turns):
+        conversation_id = str(uuid.uuid4())
+        context = retrieve(conversation_id)
+        save(conversation_id, context)
+        context = retrieve(conversation_id)
+        save(conversation_id, context)
+        save(conversation_id, context)
+
+
+def run_turns_on_new_threads(retrieve, save, turns):
+    for _ in range(turns):
+        turn = threading.Thread(target=run_turns, args=(retrieve, save, 1))
+        turn.start()
+        turn.join()
+
+
+def measure(retrieve, save, turns, threads, thread_per_turn=False):
+    per_thread = max(1, turns // threads)
+    target = run_turns_on_new_threads if thread_per_turn else run_turns
+    workers = [threading.Thread(target=target, args=(retrieve, save, per_thread)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return (per_thread * threads) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark context persistence per conversation turn.")
+    parser.add_argument("--turns", type=int, default=2000, help="Number of simulated turns (default: 2000).")
+    parser.add_argument("--threads", type=int, default=1, help="Number of worker threads (default: 1).")
+    parser.add_argument("--thread-per-turn", action="store_true", help="Run every turn on a new thread.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, "legacy.db")
+        conn = sqlite3.connect(legacy_db)
+        conn.execute(CREATE_CONVERSATIONS_SQL)
+        conn.commit()
+        conn.close()
+
+        legacy_rate = measure(
+            lambda cid: legacy_retrieve(legacy_db, cid),
+            lambda cid, ctx: legacy_save(legacy_db, cid, ctx),
+            args.turns, args.threads, args.thread_per_turn
+        )
+
+        store = ContextStore(db_path=os.path.join(tmp, "pooled.db"))
+        store.initialize()
+
+        def pooled_retrieve(cid):
+            payload = store.load(cid)
+            return json.loads(payload) if payload else dict(SAMPLE_CONTEXT)
+
+        pooled_rate = measure(
+            pooled_retrieve,
+            lambda cid, ctx: store.save(cid, json.dumps(ctx)),
+            args.turns, args.threads, args.thread_per_turn
+        )
+        store.close()
+
+    print(f"turns={args.turns} threads={args.threads} thread_per_turn={args.thread_per_turn}")
+    print(f"connect-per-call: {legacy_rate:10.1f} turns/s")
+    print(f"ContextStore:     {pooled_rate:10.1f} turns/s  ({pooled_rate / legacy_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Time to first token of a conversation turn, buffered versus streamed.
+
+Drives a howToHelp turn through the Flask test client with OpenAI replaced by
+benchmarks/stub_upstreams.py, which streams its completion word by word:
+
+  * buffered: POST /api/conversation, the reply arrives in one piece
+  * streamed: POST /api/conversation/stream, Server-Sent Events with `token` deltas
+
+Both modes take about as long in total; the streamed turn shows its first words as soon
+as the model produces them.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/bench_conversation_stream.py --latency-ms 300 --token-delay-ms 30
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+PROMPT = "What can you help me with?"
+REPLY = " ".join(["I can check tickets, look up orders and explain the platform."] * 8)
+
+
+def classify_stub(prompt_text):
+    return {"intent": "howToHelp", "category": "General", "certainty": 0.95}
+
+
+def buffered_turn(client):
+    start = time.perf_counter()
+    response = client.post("/api/conversation", json={"prompt": PROMPT})
+    response.get_data()
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+def streamed_turn(client):
+    start = time.perf_counter()
+    response = client.post("/api/conversation/stream", json={"prompt": PROMPT}, buffered=False)
+    first_token = None
+    for chunk in response.response:
+        if first_token is None and b"event: token" in chunk:
+            first_token = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    response.close()
+    return first_token if first_token is not None else elapsed, elapsed
+
+
+def measure(label, turn, client, runs):
+    first, total = 0.0, 0.0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(runs):
+            turn_first, turn_total = turn(client)
+            first += turn_first
+            total += turn_total
+    print(f"{label:10s} first token {first / runs * 1000:8.1f} ms   complete {total / runs * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare time to first token of buffered and streamed turns.")
+    parser.add_argument("--latency-ms", type=int, default=300, help="Upstream latency before the first token (default: 300).")
+    parser.add_argument("--token-delay-ms", type=int, default=30, help="Delay between streamed words (default: 30).")
+    parser.add_argument("--runs", type=int, default=3, help="Turns per mode (default: 3).")
+    args = parser.parse_args()
+
+    stub = StubUpstreams(latency_ms=args.latency_ms, classify=classify_stub, completion_text=REPLY,
+                         token_delay_ms=args.token_delay_ms).start()
+    os.environ["OPENAI_BASE_URL"] = stub.openai_base_url
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as ceebee
+        ceebee.initialize_storage()
+    # Keep the per-request log lines out of the report
+    logging.disable(logging.INFO)
+
+    ceebee.intent_classifier = None
+    ceebee.intent_cache = None
+    client = ceebee.app.test_client()
+
+    measure("buffered", buffered_turn, client, args.runs)
+    measure("streamed", streamed_turn, client, args.runs)
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
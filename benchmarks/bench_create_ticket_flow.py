@@ -0,0 +1,110 @@
+"""
+End-to-end benchmark of a createTicket conversation against stubbed upstreams.
+
+Drives /api/conversation through the Flask test client for a complete ticket creation
+flow (8 turns) with OpenAI and FreshService replaced by benchmarks/stub_upstreams.py,
+and reports how many LLM calls were made:
+
+  * classify-every-turn: intent detection runs on every turn (previous behaviour)
+  * state-aware:         mid-flow turns skip intent detection
+
+The local intent classifier and the intent cache are disabled by default so that the
+effect of the dispatcher is measured in isolation; pass --with-local-tiers to keep them.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/bench_create_ticket_flow.py --flows 5 --latency-ms 200
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+FLOW = [
+    "Can you open a ticket for me?",
+    "incident",
+    "jane.doe@domain.com",
+    "production",
+    "Order failing on checkout",
+    "Orders for customer 1002003 fail on checkout with a payment error.",
+    "1. Add any product to the cart 2. Check out with a credit card",
+    "yes"
+]
+
+
+def classify_stub(prompt_text):
+    return {"intent": "createTicket", "category": "Trouble Tickets", "certainty": 0.95}
+
+
+def run_flow(client):
+    conversation_id = None
+    for prompt in FLOW:
+        payload = {"prompt": prompt}
+        if conversation_id:
+            payload["conversation_id"] = conversation_id
+        response = client.post("/api/conversation", json=payload)
+        data = response.get_json()
+        if response.status_code != 200:
+            raise RuntimeError(f"Turn {prompt!r} failed: {data}")
+        conversation_id = data.get("conversation_id")
+    return data
+
+
+def measure(label, client, stub, flows):
+    stub.reset()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(flows):
+            last = run_flow(client)
+    elapsed = time.perf_counter() - start
+    calls = stub.llm_calls()
+    print(f"{label:22s} LLM calls per flow: {calls / flows:4.1f} of {len(FLOW)} turns   "
+          f"{elapsed / flows * 1000:8.1f} ms/flow   last reply: {last.get('next_step')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count LLM calls made by an end-to-end createTicket flow.")
+    parser.add_argument("--flows", type=int, default=3, help="Number of complete flows per mode (default: 3).")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Artificial upstream latency (default: 0).")
+    parser.add_argument("--with-local-tiers", action="store_true",
+                        help="Keep the local intent classifier and intent cache enabled.")
+    args = parser.parse_args()
+
+    stub = StubUpstreams(latency_ms=args.latency_ms, classify=classify_stub).start()
+    os.environ["OPENAI_BASE_URL"] = stub.openai_base_url
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as ceebee
+        ceebee.initialize_storage()
+    # Keep the per-request log lines out of the report
+    logging.disable(logging.INFO)
+
+    ceebee.FRESH_SERVICE_BASE_URL = stub.freshservice_base_url
+    ceebee.FRESH_SERVICE_API_KEY = "stubkey"
+    if not args.with_local_tiers:
+        ceebee.intent_classifier = None
+        ceebee.intent_cache = None
+
+    client = ceebee.app.test_client()
+
+    state_aware_step = ceebee.active_flow_step
+    ceebee.active_flow_step = lambda context: None
+    measure("classify-every-turn", client, stub, args.flows)
+
+    ceebee.active_flow_step = state_aware_step
+    measure("state-aware", client, stub, args.flows)
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Per-call latency of upstream requests with and without connection pooling.
+
+Fetches a FreshService ticket from benchmarks/stub_upstreams.py over and over:
+
+  * bare:   requests.get for every call (a new TCP connection each time, as before)
+  * pooled: the shared keep-alive session from http_clients.get_session
+
+The stub speaks plain HTTP on localhost, so only the TCP handshake is saved here; against
+FreshService or the APS endpoint every bare call also pays a TLS handshake and the
+round trips to a remote host, so the real savings are larger.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/bench_http_clients.py --calls 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+import requests  # noqa: E402
+from http_clients import get_session  # noqa: E402
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+
+def measure(label, get, url, calls):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        response = get(url)
+        response.raise_for_status()
+        response.json()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:7s} mean {statistics.mean(timings):7.3f} ms   p50 {statistics.median(timings):7.3f} ms   "
+          f"p95 {p95:7.3f} ms")
+    return statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call latency of bare and pooled HTTP requests.")
+    parser.add_argument("--calls", type=int, default=500, help="Requests per mode (default: 500).")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Artificial upstream latency (default: 0).")
+    args = parser.parse_args()
+
+    stub = StubUpstreams(latency_ms=args.latency_ms).start()
+    url = f"{stub.freshservice_base_url}tickets/1001"
+
+    bare = measure("bare", requests.get, url, args.calls)
+    pooled = measure("pooled", get_session("freshservice").get, url, args.calls)
+    print(f"saved   {bare - pooled:7.3f} ms per call")
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
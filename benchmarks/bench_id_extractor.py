@@ -0,0 +1,95 @@
+"""
+Compatibility check and throughput benchmark for ID extraction.
+
+Every prompt in benchmarks/data/extract_ids_golden.jsonl is run through
+id_extractor.extract_ids and compared with its expected ticket, subscription and order
+IDs (order-insensitive, since the original extraction returned them in set order).
+When spaCy is installed the original Matcher based extraction
+(nlp_service.extract_ids_from_doc) is checked against the same corpus, and both are
+timed in prompts per second:
+
+  * regex: id_extractor.extract_ids on the raw text
+  * spacy: nlp_service.extract_ids_from_doc(nlp_service.tokenize(text))
+
+Exits with status 1 when an extractor disagrees with the corpus.
+
+Usage (from the repository root):
+    python benchmarks/bench_id_extractor.py --repeat 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+from id_extractor import extract_ids  # noqa: E402
+
+GOLDEN_PATH = os.path.join("benchmarks", "data", "extract_ids_golden.jsonl")
+ID_TYPES = ("ticket_id", "subscription_id", "order_id")
+
+
+def load_corpus(path):
+    with open(path) as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def group_ids(details):
+    grouped = {id_type: [] for id_type in ID_TYPES}
+    for detail in details:
+        for id_type, value in detail.items():
+            grouped[id_type].append(value)
+    return {id_type: sorted(values) for id_type, values in grouped.items()}
+
+
+def check(label, extract, corpus):
+    failures = 0
+    for sample in corpus:
+        actual = group_ids(extract(sample["text"]))
+        if actual != sample["expected"]:
+            failures += 1
+            print(f"  {label}: {sample['text']!r}\n    expected {sample['expected']}\n    actual   {actual}")
+    print(f"{label:6s} {len(corpus) - failures}/{len(corpus)} prompts match the golden corpus")
+    return failures
+
+
+def throughput(extract, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            extract(text)
+    return len(texts) * repeat / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ID extraction against the golden corpus and time it.")
+    parser.add_argument("--corpus", default=GOLDEN_PATH, help=f"Golden JSONL file (default: {GOLDEN_PATH}).")
+    parser.add_argument("--repeat", type=int, default=200, help="Passes over the corpus when timing (default: 200).")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    texts = [sample["text"] for sample in corpus]
+    extractors = {"regex": extract_ids}
+
+    try:
+        import nlp_service
+    except ImportError:
+        print("spaCy is not installed, skipping the Matcher based extraction")
+    else:
+        extractors["spacy"] = lambda text: nlp_service.extract_ids_from_doc(nlp_service.tokenize(text))
+        extractors["spacy"]("warm up")
+
+    failures = sum(check(label, extract, corpus) for label, extract in extractors.items())
+
+    for label, extract in extractors.items():
+        repeat = args.repeat if label == "regex" else max(1, args.repeat // 20)
+        print(f"{label:6s} {throughput(extract, texts, repeat):12,.0f} prompts/s")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+A burst of LLM calls against a rate limited OpenAI stub, with and without the LLM gateway.
+
+Fires --requests chat completions at once from as many threads, drawn from --distinct
+different prompts, at benchmarks/stub_upstreams.py configured to answer 429 when more than
+--upstream-limit completions are in flight:
+
+  * direct:  the OpenAI client as the call sites used it, with its default two retries
+             (previous behaviour)
+  * gateway: llm_gateway.LLMGateway with --concurrency slots, jittered retries and
+             coalescing of identical prompts
+
+For each it reports the calls that succeeded, the requests that reached the stub (and
+how many of those were rejected) and the wall time of the burst.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/bench_llm_gateway.py --requests 64 --distinct 16 --upstream-limit 8 --latency-ms 200
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+
+def burst(label, complete, prompts, stub):
+    stub.reset()
+    results = [None] * len(prompts)
+
+    def run(index):
+        try:
+            results[index] = complete(prompts[index])
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(prompts))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    succeeded = sum(1 for result in results if isinstance(result, str))
+    rejected = stub.counts["openai.rate_limited"]
+    print(f"{label:8s} succeeded {succeeded:4d}/{len(prompts)}   upstream requests {stub.llm_calls():4d} "
+          f"({rejected} rejected)   {elapsed:6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a burst of LLM calls with and without the gateway.")
+    parser.add_argument("--requests", type=int, default=64, help="Calls in the burst (default: 64).")
+    parser.add_argument("--distinct", type=int, default=16, help="Distinct prompts among them (default: 16).")
+    parser.add_argument("--upstream-limit", type=int, default=8,
+                        help="Completions the stub serves at once before answering 429 (default: 8).")
+    parser.add_argument("--latency-ms", type=int, default=200, help="Stub latency per completion (default: 200).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Gateway concurrency slots (default: 8).")
+    args = parser.parse_args()
+
+    stub = StubUpstreams(latency_ms=args.latency_ms).start()
+    stub.max_concurrent_completions = args.upstream_limit
+    os.environ["OPENAI_BASE_URL"] = stub.openai_base_url
+
+    from openai import OpenAI
+    from llm_gateway import LLMGateway
+
+    prompts = [
+        [{"role": "user", "content": f"How do I configure product {index % args.distinct}?"}]
+        for index in range(args.requests)
+    ]
+
+    client = OpenAI(api_key="stub")
+
+    def direct(messages):
+        response = client.chat.completions.create(model="gpt-4", messages=messages, max_tokens=2000, temperature=0.4)
+        return response.choices[0].message.content.strip()
+
+    burst("direct", direct, prompts, stub)
+
+    gateway = LLMGateway(OpenAI(api_key="stub", max_retries=0), max_concurrency=args.concurrency)
+    burst("gateway", lambda messages: gateway.complete(messages, purpose="benchmark"), prompts, stub)
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+CPU time per conversation turn spent on logging, by log level.
+
+Drives the createTicket flow of bench_create_ticket_flow.py through the Flask test client
+against benchmarks/stub_upstreams.py, with the log records written to os.devnull, in
+three modes:
+
+  * debug:   level DEBUG, every record formatted, including the contexts (what the
+             unconditional DEBUG prints cost before)
+  * sampled: level DEBUG with debug_sample_rate --sample-rate
+  * info:    level INFO, one JSON line per request (the production setting)
+
+It reports process CPU time per turn; the difference to "info" is what logging costs.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/bench_logging_overhead.py --flows 20 --sample-rate 0.05
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+from bench_create_ticket_flow import FLOW, classify_stub, run_flow  # noqa: E402
+
+
+def measure(label, client, flows, sink, **logging_config):
+    from log_config import configure_logging, JsonFormatter
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(JsonFormatter())
+    root.addHandler(handler)
+    configure_logging(logging_config)
+
+    run_flow(client)  # warm up
+    start_cpu, start = time.process_time(), time.perf_counter()
+    for _ in range(flows):
+        run_flow(client)
+    cpu, elapsed = time.process_time() - start_cpu, time.perf_counter() - start
+    turns = flows * len(FLOW)
+    print(f"{label:8s} {cpu / turns * 1000:7.2f} ms CPU/turn   {elapsed / turns * 1000:7.2f} ms/turn")
+    return cpu / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the CPU cost of logging per conversation turn.")
+    parser.add_argument("--flows", type=int, default=20, help="Complete createTicket flows per mode (default: 20).")
+    parser.add_argument("--sample-rate", type=float, default=0.05,
+                        help="debug_sample_rate of the sampled mode (default: 0.05).")
+    args = parser.parse_args()
+
+    stub = StubUpstreams(classify=classify_stub).start()
+    os.environ["OPENAI_BASE_URL"] = stub.openai_base_url
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as ceebee
+        ceebee.initialize_storage()
+
+    ceebee.FRESH_SERVICE_BASE_URL = stub.freshservice_base_url
+    ceebee.FRESH_SERVICE_API_KEY = "stubkey"
+    ceebee.intent_classifier = None
+    ceebee.intent_cache = None
+    client = ceebee.app.test_client()
+
+    with open(os.devnull, "w") as sink:
+        debug = measure("debug", client, args.flows, sink, level="DEBUG")
+        measure("sampled", client, args.flows, sink, level="DEBUG", debug_sample_rate=args.sample_rate)
+        info = measure("info", client, args.flows, sink, level="INFO")
+    print(f"CPU saved at INFO: {(debug - info) * 1000:.2f} ms/turn ({(debug - info) / debug:.0%})")
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Latency and cost of LLM calls per model tier, with and without model routing.
+
+Replays recorded prompts against benchmarks/stub_upstreams.py: labelled intent prompts
+(JSONL with "prompt", "intent" and "category", such as benchmarks/data/intent_samples.jsonl
+or the training log written by detect_intent) through /api/intent, and short help
+questions through workflow.call_openai_api. The stub answers each classification with
+its recorded label, takes --fast-latency-ms or --large-latency-ms per completion
+depending on the model, and answers --degraded of the fast model's classifications with
+a low certainty, so that they are escalated. Two runs:
+
+  * large only: every call on the large model (previous behaviour)
+  * routed:     the configured model_routing tiers, escalating rejected classifications
+
+For each it reports, per kind of call, the p50/p95 latency, the completions each model
+served and the share of intents answered correctly and confidently, then the tokens and
+cost per model from the token ledger at the configured prices.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/bench_model_routing.py --repeat 3 --degraded 0.1
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+DEFAULT_PROMPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_samples.jsonl")
+
+HELP_PROMPTS = [
+    "How do I add a new reseller in CloudBlue?",
+    "Where can I change the billing period of a subscription?",
+    "How do I reset the password of a customer account?",
+    "What does the order status 'Provisioning' mean?"
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def user_prompt(prompt_text):
+    # The user's prompt sits between the first line of build_intent_prompt and the intent list
+    return prompt_text.split("predefined intents: \n", 1)[-1].split("Predefined intents are:", 1)[0].strip().lower()
+
+
+def replay(label, stub, calls):
+    """Run `calls` (a list of functions returning whether the answer was good) and print a summary line."""
+    stub.reset()
+    latencies_ms = []
+    good = 0
+    for call in calls:
+        start = time.perf_counter()
+        good += bool(call())
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+    models = ", ".join(f"{key[len('model.'):]} {value}" for key, value in sorted(stub.counts.items())
+                       if key.startswith("model."))
+    print(f"  {label:22s} {len(calls):4d} calls   p50 {percentile(latencies_ms, 50):6.0f} ms   "
+          f"p95 {percentile(latencies_ms, 95):6.0f} ms   good {good / len(calls):6.1%}   completions: {models}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LLM latency and cost per model tier, routed and unrouted.")
+    parser.add_argument("--prompts", default=DEFAULT_PROMPTS,
+                        help="JSONL of labelled intent prompts (default: the smoke set).")
+    parser.add_argument("--repeat", type=int, default=3, help="Times the prompts are replayed (default: 3).")
+    parser.add_argument("--fast-latency-ms", type=int, default=150, help="Stub latency of the fast model (default: 150).")
+    parser.add_argument("--large-latency-ms", type=int, default=600,
+                        help="Stub latency of the large model (default: 600).")
+    parser.add_argument("--degraded", type=float, default=0.1,
+                        help="Share of fast model classifications with low certainty (default: 0.1).")
+    args = parser.parse_args()
+
+    with open(args.prompts) as prompts_file:
+        records = [json.loads(line) for line in prompts_file if line.strip()]
+    labels = {record["prompt"].strip().lower(): record for record in records}
+
+    def classify(prompt_text):
+        record = labels.get(user_prompt(prompt_text), {})
+        return {"intent": record.get("intent", "howToHelp"), "category": record.get("category", "How to Help"),
+                "certainty": 0.9}
+
+    stub = StubUpstreams(classify=classify, completion_text="Open Settings, then Resellers, and choose Add.").start()
+    os.environ["OPENAI_BASE_URL"] = stub.openai_base_url
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as ceebee
+        import workflow
+        ceebee.initialize_storage()
+    logging.disable(logging.INFO)
+
+    from model_router import ModelRouter
+    from token_accounting import TokenLedger
+
+    ceebee.intent_classifier = None
+    ceebee.intent_cache = None
+    client = ceebee.app.test_client()
+    gateway = ceebee.llm_gateway
+    router = gateway.router or ModelRouter()
+    fast_model, large_model = router.model_for("intent_classification"), router.model_for("summary")
+    stub.model_latency_ms = {fast_model: args.fast_latency_ms, large_model: args.large_latency_ms}
+    stub.degraded_models = {fast_model: args.degraded}
+
+    def intent_call(record):
+        def call():
+            result = client.post("/api/intent", json={"prompt": record["prompt"]}).get_json()
+            return result.get("intent") == record["intent"] and result.get("certainty", 0) >= ceebee.INTENT_MIN_CERTAINTY
+        return call
+
+    def help_call(prompt):
+        def call():
+            return workflow.call_openai_api(messages=[
+                {"role": "system", "content": "You are a helpful CloudBlue Commerce assistant."},
+                {"role": "user", "content": prompt}
+            ], purpose="help") is not None
+        return call
+
+    intent_calls = [intent_call(record) for record in records] * args.repeat
+    help_calls = [help_call(prompt) for prompt in HELP_PROMPTS] * args.repeat
+
+    for mode, mode_router in (("large only", None), ("routed", router)):
+        gateway.router = mode_router
+        gateway.default_model = large_model
+        gateway.ledger = TokenLedger(budgets=ceebee.token_ledger.budgets, prices=ceebee.token_ledger.prices)
+        print(mode)
+        replay("intent_classification", stub, intent_calls)
+        replay("help", stub, help_calls)
+        for model, totals in sorted(gateway.ledger.stats()["by_model"].items()):
+            print(f"  {model:22s} {totals['calls']:4d} calls   prompt {totals['prompt_tokens']:7d}   "
+                  f"completion {totals['completion_tokens']:6d}   ${totals['cost_usd']:.4f}")
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Startup time and memory benchmark for the spaCy pipeline.
+
+Each variant runs in a fresh Python process that imports spaCy, loads the pipeline,
+tokenizes one prompt and reports its wall time and peak RSS:
+
+  * legacy: en_core_web_sm loaded twice with every component (app.py + workflow.py before)
+  * shared: the single nlp_service pipeline with unused components excluded
+  * blank:  a bare English tokenizer (nlp.model = "blank")
+
+Usage (from the repository root):
+    python benchmarks/bench_nlp_startup.py --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = '''
+import json, resource, time
+start = time.perf_counter()
+{body}
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                   "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+'''
+
+VARIANTS = {
+    "legacy": (
+        "import spacy\n"
+        "app_nlp = spacy.load('en_core_web_sm')\n"
+        "workflow_nlp = spacy.load('en_core_web_sm')\n"
+        "app_nlp('Close ticket ID 12345')\n"
+    ),
+    "shared": (
+        "import nlp_service\n"
+        "nlp_service.get_matcher()(nlp_service.tokenize('Close ticket ID 12345'))\n"
+    ),
+    "blank": (
+        "import nlp_service\n"
+        "nlp_service.load_pipeline('blank')('Close ticket ID 12345')\n"
+    )
+}
+
+
+def run_variant(body):
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE.format(body=body)],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure spaCy pipeline startup time and peak RSS.")
+    parser.add_argument("--runs", type=int, default=3, help="Processes per variant (default: 3).")
+    args = parser.parse_args()
+
+    for name, body in VARIANTS.items():
+        results = [run_variant(body) for _ in range(args.runs)]
+        seconds = sum(result["seconds"] for result in results) / len(results)
+        rss = sum(result["maxrss_mb"] for result in results) / len(results)
+        print(f"{name:8s} startup {seconds:6.2f}s   peak RSS {rss:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
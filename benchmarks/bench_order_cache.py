@@ -0,0 +1,101 @@
+"""
+Commerce API calls and latency of repeated order lookups, with and without the order cache.
+
+Resolves a few order numbers and fetches their order documents repeatedly, the way
+getOrderInfo, orderResubmission and orderCancellation turns do, against
+benchmarks/stub_upstreams.py with an artificial latency per request:
+
+  * uncached:  every lookup searches the order number and fetches the document (previous behaviour)
+  * cached:    workflow.resolve_order_id / fetch_order_details with the order cache
+  * in flight: the same with orders still being processed, whose documents expire after
+               --ttl-seconds and are revalidated with If-None-Match (lookups are spread
+               over the TTL, so ms/lookup includes that pause)
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/bench_order_cache.py --latency-ms 100 --orders 5 --lookups 50
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+
+def run(label, lookup, order_numbers, lookups, stub):
+    stub.reset()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index in range(lookups):
+            lookup(order_numbers[index % len(order_numbers)])
+    elapsed = time.perf_counter() - start
+    calls = sum(count for key, count in stub.counts.items() if key.startswith("commerce."))
+    print(f"{label:10s} {elapsed / lookups * 1000:8.1f} ms/lookup   commerce calls {calls:5d}   "
+          f"{dict(sorted(stub.counts.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare order lookups with and without the order cache.")
+    parser.add_argument("--latency-ms", type=int, default=100, help="Artificial upstream latency (default: 100).")
+    parser.add_argument("--orders", type=int, default=5, help="Distinct order numbers (default: 5).")
+    parser.add_argument("--lookups", type=int, default=50, help="Lookups per mode (default: 50).")
+    parser.add_argument("--ttl-seconds", type=float, default=0.2,
+                        help="TTL of in-flight orders for the last mode (default: 0.2).")
+    args = parser.parse_args()
+
+    stub = StubUpstreams(latency_ms=args.latency_ms).start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import workflow
+    from order_cache import OrderCache
+
+    # Point the commerce client at the stub through a copy of the config
+    with open("config/config.json") as config_file:
+        config = json.load(config_file)
+    config["aps_info"] = {"aps_token": "stubtoken", "aps_endpoint": stub.commerce_base_url}
+    with tempfile.TemporaryDirectory() as scratch:
+        config_path = os.path.join(scratch, "config.json")
+        with open(config_path, "w") as config_file:
+            json.dump(config, config_file)
+        workflow.commerce_client.config_path = config_path
+        workflow.commerce_client.invalidate()
+
+        order_numbers = [f"SO{100000 + offset}" for offset in range(args.orders)]
+        workflow.order_cache = None
+        run("uncached", lambda number: workflow.fetch_order_details(workflow.resolve_order_id(number)),
+            order_numbers, args.lookups, stub)
+
+        workflow.order_cache = OrderCache(workflow.context_store.connection, ttl_seconds=args.ttl_seconds)
+        workflow.order_cache.initialize()
+
+        def forget_documents():
+            for number in order_numbers:
+                workflow.order_cache.invalidate(f"order-{number}")
+
+        forget_documents()
+        run("cached", lambda number: workflow.fetch_order_details(workflow.resolve_order_id(number)),
+            order_numbers, args.lookups, stub)
+
+        stub.order_status = "PD"
+        forget_documents()
+
+        def in_flight(number):
+            workflow.fetch_order_details(workflow.resolve_order_id(number))
+            time.sleep(args.ttl_seconds / len(order_numbers))
+
+        run("in flight", in_flight, order_numbers, args.lookups, stub)
+        print(f"cache stats: {workflow.order_cache.stats()}")
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
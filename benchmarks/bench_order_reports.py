@@ -0,0 +1,117 @@
+"""
+Coverage and cost of order report queries: one fixed page filtered in Python versus RQL filters.
+
+Serves a synthetic order history from benchmarks/stub_upstreams.py (one order every
+--hours-apart hours, every fifth with a zero total) and, for a few prompts, compares:
+
+  * legacy: the newest 40 orders of any date, filtered on orderDate and total in Python
+            (previous behaviour)
+  * rql:    parse_date_range + OrderQuery filters sent to the API, paged with iter_orders
+            and capped at --max-orders
+
+For each it prints how many of the matching orders it found and how many requests it made.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/bench_order_reports.py --orders 5000 --hours-apart 2
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+PROMPTS = [
+    "Show me the orders from last week",
+    "Which orders failed this month?",
+    "Summarize the orders of the last 90 days",
+    "Orders in Q1 2025"
+]
+
+
+def synthetic_orders(count, hours_apart):
+    now = datetime.now(timezone.utc)
+    orders = []
+    for index in range(count):
+        ordered = now - timedelta(hours=index * hours_apart)
+        orders.append({
+            "orderId": f"order-{index}",
+            "internalId": index,
+            "orderNumber": f"SO{100000 + index}",
+            "total": {"value": 0.0 if index % 5 == 4 else 100.0 + index, "code": "USD"},
+            "status": "CP",
+            "paymentStatus": "PD",
+            "provisioningStatus": "CP",
+            "orderDate": ordered.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "endCustomerName": "Example Corp"
+        })
+    return orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare order report coverage with and without RQL filters.")
+    parser.add_argument("--orders", type=int, default=5000, help="Orders in the synthetic history (default: 5000).")
+    parser.add_argument("--hours-apart", type=float, default=2, help="Hours between orders (default: 2).")
+    parser.add_argument("--max-orders", type=int, default=100, help="Orders per report (default: 100).")
+    parser.add_argument("--page-size", type=int, default=50, help="Orders per page (default: 50).")
+    args = parser.parse_args()
+
+    stub = StubUpstreams().start()
+    stub.orders = synthetic_orders(args.orders, args.hours_apart)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import workflow
+    from order_query import OrderQuery, parse_date_range
+
+    with open("config/config.json") as config_file:
+        config = json.load(config_file)
+    config["aps_info"] = {"aps_token": "stubtoken", "aps_endpoint": stub.commerce_base_url}
+    with tempfile.TemporaryDirectory() as scratch:
+        config_path = os.path.join(scratch, "config.json")
+        with open(config_path, "w") as config_file:
+            json.dump(config, config_file)
+        workflow.commerce_client.config_path = config_path
+        workflow.commerce_client.invalidate()
+
+        for prompt in PROMPTS:
+            start, end = parse_date_range(prompt)
+            query = OrderQuery(start, end, min_total=0)
+            window_start = start.isoformat()
+            window_end = (end or date.max).isoformat()
+            matching = [
+                order for order in stub.orders
+                if window_start <= order["orderDate"] < window_end and order["total"]["value"] > 0
+            ]
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                stub.reset()
+                page = workflow.call_commerce_api(f"{workflow.ORDERS_RESOURCE}/?{OrderQuery().rql(0, 40)}")
+                legacy = [
+                    order for order in page
+                    if window_start <= order["orderDate"] < window_end and order["total"]["value"] > 0
+                ]
+                legacy_requests = sum(stub.counts.values())
+
+                stub.reset()
+                found = list(islice(workflow.iter_orders(query, page_size=args.page_size), args.max_orders))
+                rql_requests = sum(stub.counts.values())
+
+            expected = min(len(matching), args.max_orders)
+            print(f"{prompt!r}: {len(matching)} matching orders, {start} to {end}")
+            print(f"  legacy  found {len(legacy):4d} of {expected:4d}   transferred {len(page):4d} orders in {legacy_requests} requests")
+            print(f"  rql     found {len(found):4d} of {expected:4d}   in {rql_requests} requests of up to {args.page_size} orders")
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Wall-clock latency of FreshService ticket fetches, serial versus concurrent.
+
+Runs against benchmarks/stub_upstreams.py with an artificial latency per request:
+
+  * serial:     conversations, then ticket details, one ticket after the other (previous behaviour)
+  * concurrent: app.iter_ticket_conversations, as the summary path reads a ticket
+
+With a fixed upstream latency a ticket should drop from two round trips to one.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/bench_ticket_fan_out.py --latency-ms 100
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+
+def timed(label, function, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        function()
+    elapsed_ms = (time.perf_counter() - start) / runs * 1000
+    print(f"{label:28s} {elapsed_ms:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serial and concurrent FreshService ticket fetches.")
+    parser.add_argument("--latency-ms", type=int, default=100, help="Artificial upstream latency (default: 100).")
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions per measurement (default: 5).")
+    args = parser.parse_args()
+
+    stub = StubUpstreams(latency_ms=args.latency_ms).start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as ceebee
+        ceebee.initialize_storage()
+    # Keep the per-request log lines out of the report
+    logging.disable(logging.INFO)
+
+    ceebee.FRESH_SERVICE_BASE_URL = stub.freshservice_base_url
+    ceebee.FRESH_SERVICE_API_KEY = "stubkey"
+    headers = ceebee.generate_auth_header(ceebee.FRESH_SERVICE_API_KEY)
+    ticket_id = 1001
+
+    def serial_fetch(ticket_id):
+        conversations = list(ceebee.iter_conversations(ticket_id, headers))
+        conversations.append(ceebee.fetch_ticket_details_entry(ticket_id, headers))
+        return conversations
+
+    # Warm the connection pool so both modes reuse connections
+    list(ceebee.iter_ticket_conversations(ticket_id))
+
+    timed("serial", lambda: serial_fetch(ticket_id), args.runs)
+    timed("concurrent", lambda: list(ceebee.iter_ticket_conversations(ticket_id)), args.runs)
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Memory per gunicorn worker with the preloaded app (Linux only).
+
+Starts `gunicorn app:app` with gunicorn.conf.py, sends a few requests so every worker has
+served traffic, then reads /proc/<pid>/smaps_rollup of the master and each worker:
+
+  * rss:     resident memory, counting pages shared with the master in full
+  * pss:     proportional share; shared pages are split between the processes using them
+  * private: pages only this process uses, i.e. what one more worker costs
+
+The private figure of a worker is the number to plan capacity with.
+
+Usage (from the repository root, with config/config.json in place and gunicorn installed):
+    python benchmarks/bench_worker_memory.py --workers 4 --requests 200
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def memory_kb(pid):
+    """Return rss, pss and private memory of a process in kB from smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    }
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as children:
+        return [int(pid) for pid in children.read().split()]
+
+
+def wait_for_workers(master_pid, port, workers, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                if len(worker_pids(master_pid)) >= workers:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"gunicorn did not start {workers} workers within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per gunicorn worker.")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes (default: 4).")
+    parser.add_argument("--requests", type=int, default=200, help="Warm-up requests before measuring (default: 200).")
+    args = parser.parse_args()
+
+    port = free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(args.workers))
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_workers(master.pid, port, args.workers)
+        for _ in range(args.requests):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=30).read()
+
+        print(f"{'process':10s} {'rss MB':>9s} {'pss MB':>9s} {'private MB':>11s}")
+        for label, pid in [("master", master.pid)] + [(f"worker {i + 1}", pid) for i, pid in enumerate(worker_pids(master.pid))]:
+            memory = memory_kb(pid)
+            print(f"{label:10s} {memory['rss'] / 1024:9.1f} {memory['pss'] / 1024:9.1f} {memory['private'] / 1024:11.1f}")
+    finally:
+        master.terminate()
+        master.wait()
+
+
+if __name__ == "__main__":
+    main()
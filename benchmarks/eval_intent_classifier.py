@@ -0,0 +1,85 @@
+"""
+Offline evaluation of the local intent classifier.
+
+Runs every labelled prompt through IntentClassifier and reports how many turns it
+answers locally (and so skip the LLM), its accuracy against the reference labels and
+its p50/p95 latency. The label file is JSONL with "prompt" and "intent" fields; the
+training log written by detect_intent (intent_classifier.training_log) holds LLM labels
+in exactly this format. Records that carry "llm_latency_ms" are summarized as well.
+
+The default label file is a small hand-labelled set held out from the intent catalog
+examples the classifier is trained on, including negated and hypothetical requests
+("don't cancel order ...") that must be deferred to the LLM.
+
+Usage:
+    python benchmarks/eval_intent_classifier.py --labels intent_training.jsonl --threshold 0.8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_classifier import IntentClassifier  # noqa: E402
+
+DEFAULT_LABELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_samples.jsonl")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local intent classifier against labelled prompts.")
+    parser.add_argument("--labels", default=DEFAULT_LABELS, help="JSONL file with 'prompt' and 'intent' fields.")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Model confidence threshold (default: 0.8).")
+    parser.add_argument("--margin", type=float, default=0.1, help="Required lead over the runner-up intent (default: 0.1).")
+    parser.add_argument("--train-log", default=None, help="Optional JSONL of extra LLM-labelled training prompts.")
+    parser.add_argument("--verbose", action="store_true", help="Print every misclassified or deferred prompt.")
+    args = parser.parse_args()
+
+    classifier = IntentClassifier(threshold=args.threshold, margin=args.margin, training_log=args.train_log)
+
+    with open(args.labels) as label_file:
+        records = [json.loads(line) for line in label_file if line.strip()]
+
+    latencies_ms = []
+    llm_latencies_ms = [float(record["llm_latency_ms"]) for record in records if "llm_latency_ms" in record]
+    answered = correct = 0
+    by_source = {"rules": 0, "model": 0}
+
+    for record in records:
+        start = time.perf_counter()
+        result = classifier.classify(record["prompt"])
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+
+        if result is None:
+            if args.verbose:
+                print(f"  deferred to LLM: {record['prompt']!r} (label {record['intent']})")
+            continue
+
+        answered += 1
+        by_source[result["source"]] += 1
+        if result["intent"] == record["intent"]:
+            correct += 1
+        elif args.verbose:
+            print(f"  mismatch: {record['prompt']!r} -> {result['intent']} (label {record['intent']})")
+
+    total = len(records)
+    print(f"prompts:            {total}")
+    print(f"answered locally:   {answered} ({answered / total:.0%}) rules={by_source['rules']} model={by_source['model']}")
+    print(f"deferred to LLM:    {total - answered}")
+    print(f"local accuracy:     {correct / answered:.1%}" if answered else "local accuracy:     n/a")
+    print(f"local latency:      p50={percentile(latencies_ms, 50):.3f}ms p95={percentile(latencies_ms, 95):.3f}ms")
+    if llm_latencies_ms:
+        print(f"LLM latency:        p50={percentile(llm_latencies_ms, 50):.0f}ms p95={percentile(llm_latencies_ms, 95):.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
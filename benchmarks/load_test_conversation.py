@@ -0,0 +1,180 @@
+"""
+Load test of /api/conversation: concurrent sessions per worker process, threaded versus gevent.
+
+Starts benchmarks/stub_upstreams.py with an artificial latency per OpenAI call, then for
+each mode launches one server process against it and drives increasing numbers of
+concurrent sessions, each sending `--turns` howToHelp turns one after the other:
+
+  * threaded: the app behind a WSGI server with a fixed pool of `--threads` threads, as a
+              threaded worker runs it (previous behaviour)
+  * gevent:   the app under async_server.py (requires `pip install gevent`)
+
+A threaded worker serves at most `--threads` turns at a time, so once the sessions
+outnumber the threads the turns queue up and latency grows with every extra session.
+Under gevent the waits on the stubbed upstream overlap and latency stays close to the
+upstream latency until the worker runs out of CPU.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/load_test_conversation.py --latency-ms 500 --threads 8 --sessions 8 32 128 256
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+PROMPT = "What can you help me with?"
+
+
+def classify_stub(prompt_text):
+    return {"intent": "howToHelp", "category": "General", "certainty": 0.95}
+
+
+def serve_threaded(port, threads):
+    """Serve the app with a fixed pool of `threads` request threads (runs in the server process)."""
+    from werkzeug.serving import BaseWSGIServer
+    from app import app, initialize_storage
+
+    initialize_storage()
+
+    class PooledWSGIServer(BaseWSGIServer):
+        multithread = True
+        request_queue_size = 1024
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.executor = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.executor.submit(self.process_request_thread, request, client_address)
+
+        def process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledWSGIServer("127.0.0.1", port, app).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command, port, env, timeout=60):
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}: {' '.join(command)}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Server did not start within {timeout}s: {' '.join(command)}")
+
+
+def post_turn(url, conversation_id):
+    payload = {"prompt": PROMPT}
+    if conversation_id:
+        payload["conversation_id"] = conversation_id
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=300) as response:
+        return json.loads(response.read())
+
+
+def run_session(url, turns, latencies, errors, lock):
+    conversation_id = None
+    for _ in range(turns):
+        start = time.perf_counter()
+        try:
+            conversation_id = post_turn(url, conversation_id).get("conversation_id")
+        except Exception:
+            with lock:
+                errors.append(1)
+            continue
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def measure(label, url, sessions, turns):
+    latencies, errors, lock = [], [], threading.Lock()
+    workers = [threading.Thread(target=run_session, args=(url, turns, latencies, errors, lock)) for _ in range(sessions)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    print(f"{label:9s} {sessions:5d} sessions   {len(latencies) / elapsed:8.1f} turns/s   "
+          f"p50 {percentile(latencies, 0.5) * 1000:8.1f} ms   p95 {percentile(latencies, 0.95) * 1000:8.1f} ms   "
+          f"errors {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare concurrent sessions per worker, threaded versus gevent.")
+    parser.add_argument("--latency-ms", type=int, default=500, help="Artificial upstream latency (default: 500).")
+    parser.add_argument("--threads", type=int, default=8, help="Request threads of the threaded worker (default: 8).")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[8, 32, 128, 256],
+                        help="Concurrent sessions to measure (default: 8 32 128 256).")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session (default: 3).")
+    parser.add_argument("--serve-threaded", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_threaded:
+        serve_threaded(args.serve_threaded, args.threads)
+        return
+
+    stub = StubUpstreams(latency_ms=args.latency_ms, classify=classify_stub).start()
+    env = dict(os.environ, OPENAI_BASE_URL=stub.openai_base_url)
+
+    modes = [
+        ("threaded", lambda port: [sys.executable, os.path.abspath(__file__), "--threads", str(args.threads),
+                                   "--serve-threaded", str(port)]),
+        ("gevent", lambda port: [sys.executable, "async_server.py", "--host", "127.0.0.1", "--port", str(port)])
+    ]
+    for label, command in modes:
+        port = free_port()
+        try:
+            server = start_server(command(port), port, env)
+        except RuntimeError as e:
+            print(f"{label:9s} skipped: {e}")
+            continue
+        try:
+            url = f"http://127.0.0.1:{port}/api/conversation"
+            post_turn(url, None)  # warm up the server and the intent cache
+            for sessions in args.sessions:
+                measure(label, url, sessions, args.turns)
+        finally:
+            server.terminate()
+            server.wait()
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
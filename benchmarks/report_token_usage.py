@@ -0,0 +1,94 @@
+"""
+LLM token usage and cost per call purpose and per intent for a sample of conversations.
+
+Replays a few conversations through /api/conversation with the Flask test client against
+benchmarks/stub_upstreams.py, with the local intent classifier and the intent cache
+disabled so every first turn is classified by the LLM, then prints the token ledger
+(GET /api/token_usage): prompt tokens counted locally before sending, the prompt and
+completion tokens reported in `usage` (by the stub: one token per four characters) and
+the cost at the configured prices. Pass --budget to see how often a lower intent
+classification budget trims the prompt.
+
+Usage (from the repository root, with config/config.json in place):
+    python benchmarks/report_token_usage.py --repeat 5
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(REPO_ROOT)
+
+from stub_upstreams import StubUpstreams  # noqa: E402
+
+CONVERSATIONS = {
+    "createTicket": ["Can you open a ticket for me?", "incident"],
+    "howToHelp": ["How do I add a new reseller in CloudBlue?"],
+    "integrationHelp": ["How can I integrate my billing system with the Connect API?"]
+}
+
+
+def classify_by_keyword(prompt_text):
+    # The user's prompt sits between the first line of build_intent_prompt and the intent list
+    prompt = prompt_text.split("predefined intents: \n", 1)[-1].split("Predefined intents are:", 1)[0].lower()
+    if "ticket" in prompt:
+        return {"intent": "createTicket", "category": "Trouble Tickets", "certainty": 0.95}
+    if "integrate" in prompt:
+        return {"intent": "integrationHelp", "category": "Integration Help", "certainty": 0.9}
+    return {"intent": "howToHelp", "category": "How to Help", "certainty": 0.9}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report LLM token usage per purpose and intent.")
+    parser.add_argument("--repeat", type=int, default=5, help="Times each conversation is replayed (default: 5).")
+    parser.add_argument("--budget", type=int, default=None,
+                        help="Token budget for intent classification (default: the configured one).")
+    args = parser.parse_args()
+
+    stub = StubUpstreams(classify=classify_by_keyword).start()
+    os.environ["OPENAI_BASE_URL"] = stub.openai_base_url
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as ceebee
+        ceebee.initialize_storage()
+    logging.disable(logging.INFO)
+
+    ceebee.FRESH_SERVICE_BASE_URL = stub.freshservice_base_url
+    ceebee.FRESH_SERVICE_API_KEY = "stubkey"
+    ceebee.intent_classifier = None
+    ceebee.intent_cache = None
+    if args.budget:
+        ceebee.token_ledger.budgets["intent_classification"] = args.budget
+    client = ceebee.app.test_client()
+
+    for _ in range(args.repeat):
+        for prompts in CONVERSATIONS.values():
+            conversation_id = None
+            for prompt in prompts:
+                payload = {"prompt": prompt}
+                if conversation_id:
+                    payload["conversation_id"] = conversation_id
+                conversation_id = client.post("/api/conversation", json=payload).get_json().get("conversation_id")
+
+    usage = client.get("/api/token_usage").get_json()
+    for table in ("by_purpose", "by_intent"):
+        print(table)
+        for key, totals in sorted(usage[table].items()):
+            calls = totals["calls"]
+            print(f"  {key:22s} {calls:4d} calls   prompt {totals['estimated_prompt_tokens'] / calls:7.0f} counted "
+                  f"{totals['prompt_tokens'] / calls:7.0f} billed   completion {totals['completion_tokens'] / calls:5.0f}   "
+                  f"${totals['cost_usd'] / calls:.4f}/call")
+    trimmed = [line for line in client.get("/metrics").get_data(as_text=True).splitlines()
+               if line.startswith("ceebee_llm_prompts_trimmed_total{")]
+    print("trimmed prompts:", ", ".join(trimmed) or "none")
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
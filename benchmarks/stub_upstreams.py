@@ -0,0 +1,312 @@
+"""
+Local stub of the upstream services used by the benchmarks.
+
+A single threaded HTTP server answers the OpenAI chat completions API, the FreshService
+ticket endpoints and the commerce (APS) API with canned responses, optionally after an
+artificial delay, and counts every request it receives. Streamed chat completions
+("stream": true) are sent word by word, `token_delay_ms` apart. Order documents carry an
+ETag derived from `order_status` and answer a matching If-None-Match with 304. With
+`max_concurrent_completions` set, chat completions beyond that many in flight are
+rejected with 429, like a rate limited OpenAI account. `model_latency_ms` sets the delay
+of chat completions per model and `degraded_models` the share of classifications a model
+answers with low certainty, to compare model tiers.
+
+    stub = StubUpstreams(latency_ms=50)
+    stub.start()
+    os.environ["OPENAI_BASE_URL"] = stub.openai_base_url
+    ...
+    print(stub.counts)
+    stub.stop()
+"""
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+CLASSIFICATION_MARKER = "Classify the following prompt"
+
+
+def default_classification(prompt_text):
+    return {"intent": "howToHelp", "category": "How to Help", "certainty": 0.9}
+
+
+class StubServer(ThreadingHTTPServer):
+    # Load tests open hundreds of connections at once
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StubUpstreams:
+    """In-process stub for OpenAI, FreshService and the commerce API."""
+
+    def __init__(self, latency_ms=0, classify=default_classification, completion_text="This is a stubbed reply.",
+                 token_delay_ms=0):
+        self.latency_ms = latency_ms
+        self.classify = classify
+        self.completion_text = completion_text
+        self.token_delay_ms = token_delay_ms
+        self.order_status = "CP"
+        self.max_concurrent_completions = None
+        # Model name -> completion latency, overriding latency_ms
+        self.model_latency_ms = {}
+        # Model name -> share (0 to 1) of classifications answered with low certainty
+        self.degraded_models = {}
+        self._completions_in_flight = 0
+        # Order list served to RQL queries, newest first
+        self.orders = []
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._server = StubServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = None
+
+    def list_orders(self, rql):
+        """Apply the date, status, total and limit terms of an RQL order query to `self.orders`."""
+        orders = self.orders
+        for operator, value in re.findall(r"\b(ge|lt)\(orderDate,([^)]+)\)", rql):
+            orders = [order for order in orders if (order["orderDate"] >= value) == (operator == "ge")]
+        for values in re.findall(r"\bin\(status,\(([^)]*)\)\)", rql):
+            orders = [order for order in orders if order["status"] in values.split(",")]
+        for value in re.findall(r"\bgt\(total\.value,([^)]+)\)", rql):
+            orders = [order for order in orders if order["total"]["value"] > float(value)]
+        limit = re.search(r"\blimit\((\d+),(\d+)\)", rql)
+        if limit:
+            offset, count = int(limit.group(1)), int(limit.group(2))
+            orders = orders[offset:offset + count]
+        return orders
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_base_url(self):
+        return f"{self.base_url}/v1"
+
+    @property
+    def freshservice_base_url(self):
+        return f"{self.base_url}/api/v2/"
+
+    @property
+    def commerce_base_url(self):
+        return f"{self.base_url}/aps/2/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def llm_calls(self):
+        with self._lock:
+            return sum(value for key, value in self.counts.items() if key.startswith("openai."))
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                try:
+                    return json.loads(body) if body else {}
+                except ValueError:
+                    return {}
+
+            def _send_json(self, payload, status=200, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _route(self, method):
+                path = re.sub(r"/+", "/", self.path.split("?", 1)[0])
+                payload = self._read_json() if method == "POST" else {}
+
+                if path.startswith("/v1/chat/completions"):
+                    with stub._lock:
+                        stub._completions_in_flight += 1
+                        in_flight = stub._completions_in_flight
+                    try:
+                        if stub.max_concurrent_completions and in_flight > stub.max_concurrent_completions:
+                            stub.count("openai.rate_limited")
+                            return self._send_json({"error": {"message": "Rate limit reached", "type": "requests"}},
+                                                   status=429, headers={"Retry-After": "0.1"})
+                        latency_ms = stub.model_latency_ms.get(payload.get("model"), stub.latency_ms)
+                        if latency_ms:
+                            time.sleep(latency_ms / 1000)
+                        return self._chat_completion(payload)
+                    finally:
+                        with stub._lock:
+                            stub._completions_in_flight -= 1
+
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000)
+                if path.startswith("/api/v2/"):
+                    return self._freshservice(method, path[len("/api/v2"):])
+                if path.startswith("/aps/2/"):
+                    return self._commerce(method, path[len("/aps/2"):])
+                stub.count("unknown")
+                return self._send_json({"error": "not found"}, status=404)
+
+            def _chat_completion(self, payload):
+                messages = payload.get("messages", [])
+                text = "\n".join(str(message.get("content", "")) for message in messages)
+                # Counted apart from the "openai." keys that llm_calls adds up
+                stub.count(f"model.{payload.get('model', 'gpt-4')}")
+                if CLASSIFICATION_MARKER in text:
+                    stub.count("openai.classification")
+                    classification = stub.classify(text)
+                    # The same prompt is always degraded, or not, for a given model
+                    share = stub.degraded_models.get(payload.get("model"), 0)
+                    if zlib.crc32(text.encode("utf-8")) % 1000 < share * 1000:
+                        classification = {**classification, "certainty": 0.3}
+                    content = json.dumps(classification)
+                else:
+                    stub.count("openai.completion")
+                    content = stub.completion_text
+
+                prompt_tokens = max(1, len(text) // 4)
+                completion_tokens = max(1, len(content) // 4)
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+                if payload.get("stream"):
+                    return self._stream_completion(payload, content, usage)
+
+                self._send_json({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": payload.get("model", "gpt-4"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": usage
+                })
+
+            def _stream_completion(self, payload, content, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send_chunk(data):
+                    body = f"data: {data}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(body):X}\r\n".encode("ascii") + body + b"\r\n")
+                    self.wfile.flush()
+
+                words = re.findall(r"\S+\s*", content) or [content]
+                for index, word in enumerate(words):
+                    if index and stub.token_delay_ms:
+                        time.sleep(stub.token_delay_ms / 1000)
+                    send_chunk(json.dumps({
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": payload.get("model", "gpt-4"),
+                        "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]
+                    }))
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    send_chunk(json.dumps({
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": payload.get("model", "gpt-4"),
+                        "choices": [],
+                        "usage": usage
+                    }))
+                send_chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _commerce(self, method, path):
+                search_match = re.search(r"like\(orderNumber,(\w+)\)", unquote(self.path))
+                order_match = re.match(r"^/resources/[\w-]+/orders/([\w-]+)$", path)
+                if method == "GET" and path == "/services/order-manager/orders" and search_match:
+                    stub.count("commerce.order_search")
+                    return self._send_json([{"orderId": f"order-{search_match.group(1)}"}])
+                if method == "GET" and order_match:
+                    etag = f'"{order_match.group(1)}-{stub.order_status}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        stub.count("commerce.order_not_modified")
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    stub.count("commerce.order_details")
+                    return self._send_json({
+                        "orderId": order_match.group(1),
+                        "endCustomerName": "Example Corp",
+                        "status": stub.order_status,
+                        "total": {"value": 120.0, "code": "USD"}
+                    }, headers={"ETag": etag})
+                if method == "GET" and re.match(r"^/resources/[\w-]+/orders/?$", path):
+                    stub.count("commerce.order_list")
+                    return self._send_json(stub.list_orders(unquote(self.path.split("?", 1)[1] if "?" in self.path else "")))
+                if method == "POST" and path.endswith("/push"):
+                    stub.count("commerce.push")
+                    return self._send_json({})
+                stub.count(f"commerce.{method}")
+                return self._send_json([] if method == "GET" and "?" in self.path else {})
+
+            def _freshservice(self, method, path):
+                ticket_match = re.match(r"^/tickets/(\d+)(/conversations|/reply)?$", path)
+                if method == "POST" and path == "/tickets":
+                    stub.count("freshservice.create_ticket")
+                    return self._send_json({"ticket": {"id": 1001}}, status=201)
+                if ticket_match and ticket_match.group(2) == "/conversations":
+                    stub.count("freshservice.conversations")
+                    return self._send_json({"conversations": [
+                        {"id": 1, "body_text": "Engineering is looking into the failing order.", "private": True},
+                        {"id": 2, "body_text": "A fix has been deployed to staging.", "private": True}
+                    ]})
+                if ticket_match and ticket_match.group(2) == "/reply":
+                    stub.count("freshservice.reply")
+                    return self._send_json({"conversation": {"id": 3}}, status=201)
+                if ticket_match:
+                    stub.count("freshservice.ticket")
+                    return self._send_json({"ticket": {
+                        "id": int(ticket_match.group(1)),
+                        "subject": "Order failing on checkout",
+                        "description_text": "Orders fail with a payment error.",
+                        "updated_at": "2025-01-01T00:00:00Z"
+                    }})
+                stub.count("freshservice.unknown")
+                return self._send_json({"error": "not found"}, status=404)
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+        return Handler
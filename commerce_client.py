@@ -0,0 +1,125 @@
+import json
+import os
+import signal
+import threading
+import time
+from http_clients import get_session
+
+CONFIG_PATH = 'config/config.json'
+
+
+class CommerceClient:
+    """
+    Client for the commerce (APS) API.
+
+    The endpoint and token are read from config.json on first use and the request headers
+    are built once. The file's mtime is checked at most every `check_interval` seconds and
+    the settings are reloaded when it changed, or on the next call after `invalidate`
+    (see install_sighup_reload). Requests go through the shared "commerce" session.
+    """
+
+    def __init__(self, config_path=CONFIG_PATH, check_interval=1.0):
+        self.config_path = config_path
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._settings = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def reload(self):
+        """
+        Read the commerce settings from the config file and rebuild the headers.
+
+        Raises:
+            Exception: If the file is missing or lacks the `aps_info` keys.
+        """
+        with self._lock:
+            try:
+                mtime = os.stat(self.config_path).st_mtime_ns
+                with open(self.config_path) as config_file:
+                    aps_info = json.load(config_file)['aps_info']
+                base_url = aps_info['aps_endpoint'].rstrip('/')
+                headers = {
+                    'Content-Type': 'application/json',
+                    'APS-Token': aps_info['aps_token']
+                }
+            except FileNotFoundError:
+                raise Exception("Configuration file 'config.json' not found.")
+            except KeyError as e:
+                raise Exception(f"Missing required configuration key: {e}")
+
+            self._settings = (base_url, headers)
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+            self.reloads += 1
+            return self._settings
+
+    def invalidate(self):
+        """Reload the settings on the next call, whether or not the file changed."""
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def settings(self):
+        """
+        Return the current (base_url, headers), reloading them if the config file changed.
+        """
+        settings = self._settings
+        if settings is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return settings
+        try:
+            mtime = os.stat(self.config_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if settings is None or mtime != self._mtime:
+            return self.reload()
+        self._checked_at = time.monotonic()
+        return settings
+
+    def url(self, endpoint):
+        """Return the full URL of `endpoint`."""
+        return f"{self.settings()[0]}/{endpoint.lstrip('/')}"
+
+    def request(self, endpoint, method='GET', payload=None, params=None, headers=None):
+        """
+        Send a request to the commerce API.
+
+        Args:
+            endpoint: API endpoint, relative to the configured base URL.
+            method: 'GET' or 'POST'.
+            payload: JSON body for POST requests.
+            params: Query parameters for GET requests.
+            headers: Extra headers, e.g. If-None-Match.
+
+        Returns:
+            requests.Response: The response, without its status checked.
+        """
+        base_url, default_headers = self.settings()
+        url = f"{base_url}/{endpoint.lstrip('/')}"
+        headers = {**default_headers, **headers} if headers else default_headers
+        if method.upper() == 'GET':
+            return get_session("commerce").get(url, headers=headers, params=params)
+        if method.upper() == 'POST':
+            return get_session("commerce").post(url, headers=headers, json=payload)
+        raise ValueError(f"Unsupported HTTP method: {method}. Use 'GET' or 'POST'.")
+
+
+def install_sighup_reload(*clients):
+    """
+    Make SIGHUP reload the settings of `clients` on their next call.
+
+    Must be called from the main thread. Not used under gunicorn, where SIGHUP restarts
+    the workers and the new workers pick up a changed file through its mtime.
+    """
+    if not hasattr(signal, "SIGHUP"):  # Not available on Windows
+        return
+    previous = signal.getsignal(signal.SIGHUP)
+
+    def handle_sighup(signum, frame):
+        for client in clients:
+            client.invalidate()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGHUP, handle_sighup)
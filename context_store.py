@@ -0,0 +1,384 @@
+import contextlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# SQL statements are module constants so that sqlite3's per-connection statement
+# cache hands back the already prepared statement on every call.
+CREATE_CONVERSATIONS_SQL = '''CREATE TABLE IF NOT EXISTS conversations (
+    conversation_id TEXT PRIMARY KEY,
+    context TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+)'''
+
+ADD_VERSION_COLUMN_SQL = 'ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 0'
+
+SELECT_CONTEXT_SQL = 'SELECT context, version FROM conversations WHERE conversation_id = ?'
+
+UPSERT_CONTEXT_SQL = '''INSERT INTO conversations (conversation_id, context, version)
+                        VALUES (?, ?, 1)
+                        ON CONFLICT(conversation_id)
+                        DO UPDATE SET context = excluded.context, version = conversations.version + 1'''
+
+INSERT_NEW_CONTEXT_SQL = '''INSERT INTO conversations (conversation_id, context, version)
+                            VALUES (?, ?, 1)
+                            ON CONFLICT(conversation_id) DO NOTHING'''
+
+UPDATE_CONTEXT_IF_VERSION_SQL = '''UPDATE conversations
+                                   SET context = ?, version = version + 1
+                                   WHERE conversation_id = ? AND version = ?'''
+
+SELECT_VERSION_SQL = 'SELECT version FROM conversations WHERE conversation_id = ?'
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class ContextConflictError(Exception):
+    """Raised when a conversation context was changed by another request since it was loaded."""
+
+    def __init__(self, conversation_id):
+        super().__init__(f"Context for conversation {conversation_id} was modified by another request.")
+        self.conversation_id = conversation_id
+
+
+class ContextUnavailableError(Exception):
+    """Raised when a conversation context cannot be read, e.g. the database is locked or the pool is exhausted."""
+
+    def __init__(self, conversation_id):
+        super().__init__(f"Context for conversation {conversation_id} could not be loaded.")
+        self.conversation_id = conversation_id
+
+
+class ContextCache:
+    """
+    Bounded in-process cache of serialized conversation contexts.
+
+    Entries are kept in least-recently-used order and are dropped when they have been
+    idle for longer than `ttl_seconds`, or when the cache grows past `max_entries` or
+    `max_bytes`. A cached payload of None records a conversation known not to exist yet.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=8 * 1024 * 1024, ttl_seconds=300):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.ttl_seconds = float(ttl_seconds)
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _entry_size(conversation_id, payload):
+        # Contexts are serialized with json.dumps' default ensure_ascii, so characters are bytes.
+        return len(conversation_id) + (len(payload) if payload else 0)
+
+    def _remove(self, conversation_id):
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+        return entry
+
+    def get(self, conversation_id):
+        """
+        Look up a conversation.
+
+        Returns:
+            tuple: (payload, version) on a hit, or None on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if now - entry[3] > self.ttl_seconds:
+                self._remove(conversation_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries[conversation_id] = (entry[0], entry[1], entry[2], now)
+            self._entries.move_to_end(conversation_id)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, conversation_id, payload, version):
+        """Store a payload and its version, evicting idle and least recently used entries as needed."""
+        size = self._entry_size(conversation_id, payload)
+        now = time.monotonic()
+        with self._lock:
+            self._remove(conversation_id)
+            if size > self.max_bytes:
+                return
+            self._entries[conversation_id] = (payload, version, size, now)
+            self._bytes += size
+
+            # Least recently used entries sit at the front, so expired ones are found there first.
+            while self._entries:
+                oldest_id, oldest = next(iter(self._entries.items()))
+                if now - oldest[3] > self.ttl_seconds:
+                    self._remove(oldest_id)
+                    self.expirations += 1
+                elif len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                    self._remove(oldest_id)
+                    self.evictions += 1
+                else:
+                    break
+
+    def invalidate(self, conversation_id):
+        """Drop a conversation from the cache."""
+        with self._lock:
+            self._remove(conversation_id)
+
+    def stats(self):
+        """Return the cache counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
+
+
+class ContextStore:
+    """
+    Long-lived SQLite store for conversation contexts.
+
+    Connections come from a pool of at most `pool_size`, opened on demand and reused
+    for the lifetime of the process. `connection()` checks one out for the duration of
+    a `with` block, so a thread (or greenlet, under gevent) started per request reuses
+    the pooled connections instead of opening its own. Connection-level PRAGMAs are
+    applied once per connection and WAL mode is set once on the database file in
+    `initialize`.
+
+    When a `ContextCache` is given, reads are served from it and every write goes
+    through to SQLite before the cache is updated, so a restart loses nothing. Each
+    worker process has its own cache, so a cached context is only used after its
+    version has been checked against the database (an indexed lookup of one integer):
+    a turn handled by another worker in between makes it reload the row instead of
+    running the handlers on a stale context.
+    """
+
+    def __init__(self, db_path="conversations.db", busy_timeout_ms=5000, synchronous="NORMAL", cached_statements=64, cache=None,
+                 pool_size=8):
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Unsupported synchronous mode: {synchronous}. Use one of {', '.join(SYNCHRONOUS_MODES)}.")
+
+        self.db_path = db_path
+        self.busy_timeout_ms = int(busy_timeout_ms)
+        self.synchronous = synchronous
+        self.cached_statements = int(cached_statements)
+        self.cache = cache
+        self.pool_size = int(pool_size)
+
+        # Last in, first out, so a quiet process keeps reusing its warmest connections
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Open a new connection with the tuned connection-level PRAGMAs applied."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            # A pooled connection is used by one thread at a time, but not always the same one.
+            check_same_thread=False
+        )
+        conn.execute(f"PRAGMA synchronous={self.synchronous};")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms};")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Check a connection out of the pool for the duration of the `with` block.
+
+        A new connection is opened while fewer than `pool_size` exist; after that the
+        caller waits up to the busy timeout for one to be returned.
+
+        Raises:
+            sqlite3.OperationalError: If no connection became free in time.
+        """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if len(self._connections) < self.pool_size:
+                    conn = self._connect()
+                    self._connections.append(conn)
+            if conn is None:
+                try:
+                    conn = self._idle.get(timeout=self.busy_timeout_ms / 1000)
+                except queue.Empty:
+                    raise sqlite3.OperationalError(f"No free connection in the pool of {self.pool_size}.") from None
+        try:
+            yield conn
+        finally:
+            # An open transaction must not leak into the next checkout
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def initialize(self):
+        """Create the conversations table and switch the database file to WAL mode."""
+        with self.connection() as conn:
+            # journal_mode=WAL is persistent on the database file, so it only needs to be set once.
+            conn.execute("PRAGMA journal_mode=WAL;")
+            with conn:
+                conn.execute(CREATE_CONVERSATIONS_SQL)
+                # Databases created before context versioning lack the version column.
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(conversations);")]
+                if "version" not in columns:
+                    conn.execute(ADD_VERSION_COLUMN_SQL)
+
+    def load(self, conversation_id):
+        """
+        Load the raw JSON context for a conversation.
+
+        Returns:
+            str: The serialized context, or None if the conversation is unknown.
+        """
+        return self.load_versioned(conversation_id)[0]
+
+    def load_versioned(self, conversation_id):
+        """
+        Load the raw JSON context for a conversation together with its version.
+
+        Returns:
+            tuple: (serialized context, version), or (None, None) if the conversation is unknown.
+        """
+        cached = self.cache.get(conversation_id) if self.cache is not None else None
+        # IDs generated by this process (version None) cannot have been written elsewhere yet
+        if cached is not None and cached[1] is None:
+            return cached
+
+        with self.connection() as conn:
+            if cached is not None:
+                row = conn.execute(SELECT_VERSION_SQL, (conversation_id,)).fetchone()
+                if row is not None and row[0] == cached[1]:
+                    return cached
+                self.cache.invalidate(conversation_id)
+            row = conn.execute(SELECT_CONTEXT_SQL, (conversation_id,)).fetchone()
+        result = (row[0], row[1]) if row else (None, None)
+        if self.cache is not None:
+            self.cache.put(conversation_id, *result)
+        return result
+
+    def mark_new(self, conversation_id):
+        """Record a freshly generated conversation ID so its first load skips the database."""
+        if self.cache is not None:
+            self.cache.put(conversation_id, None, None)
+
+    def save(self, conversation_id, payload):
+        """Insert or update the raw JSON context for a conversation, regardless of its version."""
+        with self.connection() as conn, conn:
+            conn.execute(UPSERT_CONTEXT_SQL, (conversation_id, payload))
+            if self.cache is not None:
+                version = conn.execute(SELECT_VERSION_SQL, (conversation_id,)).fetchone()[0]
+        if self.cache is not None:
+            self.cache.put(conversation_id, payload, version)
+
+    def save_versioned(self, conversation_id, payload, expected_version):
+        """
+        Write the raw JSON context only if the stored version still matches `expected_version`.
+
+        Args:
+            conversation_id (str): The conversation to write.
+            payload (str): The serialized context.
+            expected_version (int): The version that was loaded, or None if the conversation did not exist yet.
+
+        Returns:
+            int: The new version of the stored context.
+
+        Raises:
+            ContextConflictError: If another request wrote the context in the meantime.
+        """
+        with self.connection() as conn, conn:
+            if expected_version is None:
+                cursor = conn.execute(INSERT_NEW_CONTEXT_SQL, (conversation_id, payload))
+            else:
+                cursor = conn.execute(UPDATE_CONTEXT_IF_VERSION_SQL, (payload, conversation_id, expected_version))
+        if cursor.rowcount != 1:
+            # Whatever is cached for this conversation is stale.
+            if self.cache is not None:
+                self.cache.invalidate(conversation_id)
+            raise ContextConflictError(conversation_id)
+
+        version = 1 if expected_version is None else expected_version + 1
+        if self.cache is not None:
+            self.cache.put(conversation_id, payload, version)
+        return version
+
+    def close(self):
+        """Close every connection opened by this store; the pool starts empty again."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._idle = queue.LifoQueue()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+class ContextSession:
+    """
+    Unit of work for the context of one conversation turn.
+
+    The context row is read once in `load`. Handlers mutate `context` in memory and call
+    `mark_dirty` instead of writing to the database; `commit` then performs a single
+    version-checked write at the end of the request, so two browser tabs sharing one
+    conversation_id cannot silently overwrite each other's progress.
+    """
+
+    def __init__(self, store, conversation_id, decode):
+        self.store = store
+        self.conversation_id = conversation_id
+        self.decode = decode
+        self.context = None
+        self.version = None
+        self.dirty = False
+
+    def load(self):
+        """Read the context row once and decode it with the session's `decode` callable."""
+        payload, self.version = self.store.load_versioned(self.conversation_id)
+        self.context = self.decode(payload)
+        return self.context
+
+    def mark_dirty(self, context=None):
+        """Record that the context changed, optionally replacing it with a different dict."""
+        if context is not None:
+            self.context = context
+        self.dirty = True
+
+    def commit(self):
+        """
+        Write the context if it changed during the request.
+
+        Returns:
+            bool: True if a write was issued.
+
+        Raises:
+            ContextConflictError: If the stored context changed since it was loaded.
+        """
+        if not self.dirty:
+            return False
+
+        self.version = self.store.save_versioned(self.conversation_id, json.dumps(self.context), self.version)
+        self.dirty = False
+        return True
@@ -0,0 +1,90 @@
+"""
+Gunicorn configuration for production serving.
+
+    pip install gunicorn
+    gunicorn app:app
+
+Gunicorn picks this file up from the working directory. The app is imported once in the
+master (preload_app), which also creates the SQLite tables and, when the "spacy" ID
+extraction engine is configured or `preload_nlp` is set, loads the spaCy pipeline; the
+workers are then forked and share those pages copy-on-write. Settings come from the
+optional `server` section of config.json; command-line flags and GUNICORN_CMD_ARGS still
+override them, and WEB_CONCURRENCY sets the worker count.
+
+Reloading:
+    kill -HUP <master pid>    re-read this file and replace the workers gracefully
+    kill -USR2 <master pid>   start a new master with new code, then kill -TERM the old one
+Since the app is preloaded, code changes need USR2; HUP forks the new workers from the
+already loaded app.
+"""
+import gc
+import json
+import multiprocessing
+import os
+
+# Module-level names that match gunicorn settings are read as settings, so `config` is avoided
+with open('config/config.json') as config_file:
+    app_config = json.load(config_file)
+server_config = app_config.get("server", {})
+# Requests extract IDs with regular expressions; only the batch "spacy" engine needs the pipeline
+id_extraction_engine = app_config.get("id_extraction", {}).get("engine", "regex")
+
+worker_class = server_config.get("worker_class", "gthread")
+
+if worker_class == "gevent":
+    # The app is imported in the master, so patch before it imports requests and ssl
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = server_config.get("bind", f"0.0.0.0:{os.getenv('FLASK_PORT', 5000)}")
+workers = int(os.getenv("WEB_CONCURRENCY", server_config.get("workers", multiprocessing.cpu_count())))
+# Requests mostly wait on upstreams, so each worker serves several at once
+threads = server_config.get("threads", 8)
+worker_connections = server_config.get("worker_connections", 1000)
+
+preload_app = True
+# Conversation turns wait on several LLM calls; keep them clear of the worker timeout
+timeout = server_config.get("timeout", 120)
+graceful_timeout = server_config.get("graceful_timeout", 30)
+keepalive = server_config.get("keepalive", 5)
+# Recycle workers now and then so slow leaks and un-shared pages do not pile up
+max_requests = server_config.get("max_requests", 1000)
+max_requests_jitter = server_config.get("max_requests_jitter", 100)
+
+# The app logs one JSON line per request itself (see the `logging` section of config.json)
+accesslog = server_config.get("accesslog")
+
+
+def on_starting(server):
+    """Prepare the database and shared models once, in the master."""
+    from app import initialize_storage
+    from workflow import context_store
+
+    initialize_storage()
+    # Workers open their own connections; none may cross the fork
+    context_store.close()
+
+    if server_config.get("preload_nlp", id_extraction_engine == "spacy"):
+        try:
+            from nlp_service import get_matcher
+            get_matcher()
+        except (ImportError, OSError) as e:
+            server.log.warning("spaCy pipeline not preloaded: %s", e)
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the garbage collector's reach, so collections
+    # in the workers do not touch (and un-share) the preloaded pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Drop state that must not be shared with the master."""
+    from http_clients import close_sessions
+    from workflow import context_store
+    from app import summarizer
+
+    close_sessions()
+    context_store.close()
+    if summarizer is not None:
+        summarizer.close()
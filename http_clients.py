@@ -0,0 +1,158 @@
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import observe_upstream
+
+with open('config/config.json') as config_file:
+    config = json.load(config_file)
+
+# Defaults for every upstream; each one can override them in the "http" section of config.json
+DEFAULT_HTTP_SETTINGS = {
+    "pool_connections": 4,
+    "pool_maxsize": 10,
+    "connect_timeout": 5,
+    "read_timeout": 30,
+    "retries": 3,
+    "backoff_factor": 0.5
+}
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Threads for concurrent upstream calls; kept at or below pool_maxsize so every call
+# gets a pooled connection
+FAN_OUT_WORKERS = config.get("http", {}).get("fan_out_workers", 8)
+
+_sessions = {}
+_executor = None
+_lock = threading.Lock()
+
+
+class UpstreamRetry(Retry):
+    """
+    Retry policy for upstream calls.
+
+    5xx responses are only retried for idempotent methods, so a POST that created a ticket
+    is never sent twice. A 429 means the request was rejected without being processed, so
+    it is retried for every method, honouring Retry-After.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default (connect, read) timeout to every request."""
+
+    def __init__(self, timeout, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def upstream_settings(upstream):
+    """
+    Return the HTTP settings for `upstream` (e.g. "freshservice" or "commerce").
+    """
+    return {**DEFAULT_HTTP_SETTINGS, **config.get("http", {}).get(upstream, {})}
+
+
+def build_session(pool_connections=4, pool_maxsize=10, connect_timeout=5, read_timeout=30,
+                  retries=3, backoff_factor=0.5):
+    """
+    Build a requests.Session with keep-alive connection pools, default timeouts and retries.
+
+    Args:
+        pool_connections: Number of host pools to keep.
+        pool_maxsize: Connections kept alive per host.
+        connect_timeout: Seconds to wait for a connection.
+        read_timeout: Seconds to wait for the response.
+        retries: Retries on connection errors, 429 and 5xx responses.
+        backoff_factor: Exponential backoff factor between retries.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = UpstreamRetry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        raise_on_status=False  # Hand the last response back so raise_for_status behaves as before
+    )
+    adapter = TimeoutHTTPAdapter(
+        (connect_timeout, read_timeout),
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def upstream_metrics_hook(upstream):
+    """
+    Return a response hook recording the duration and status of each call to `upstream`.
+    """
+    def record(response, *args, **kwargs):
+        observe_upstream(upstream, response.status_code, response.elapsed.total_seconds())
+    return record
+
+
+def get_session(upstream):
+    """
+    Return the shared session for `upstream`, creating it on first use.
+    """
+    session = _sessions.get(upstream)
+    if session is None:
+        with _lock:
+            session = _sessions.get(upstream)
+            if session is None:
+                session = build_session(**upstream_settings(upstream))
+                session.hooks["response"].append(upstream_metrics_hook(upstream))
+                _sessions[upstream] = session
+    return session
+
+
+def fan_out(*calls):
+    """
+    Start every call on the shared upstream thread pool.
+
+    Args:
+        calls: Callables taking no arguments.
+
+    Returns:
+        list: One future per call, in the same order. Calling `result()` on them in
+        order raises the same exception a serial run would have raised first.
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix="upstream")
+    # Each call runs in a copy of the caller's context, so its timings and log records
+    # are attributed to the request that started it
+    return [_executor.submit(contextvars.copy_context().run, call) for call in calls]
+
+
+def close_sessions():
+    """Close every shared session and its pooled connections, and stop the thread pool."""
+    global _executor
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
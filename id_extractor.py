@@ -0,0 +1,181 @@
+import re
+
+# Prefixed order IDs like SO000099
+ORDER_ID_PATTERN = re.compile(r"\b(SO|CF|CH|CL|DG|UG|RN|TA|TS)\d{6,10}\b", re.IGNORECASE)
+# Prefixed ticket IDs like INC-34 or SR-34
+TICKET_ID_PATTERN = re.compile(r"\b(INC|SR)-\d+\b", re.IGNORECASE)
+TICKET_TOKEN_PATTERN = re.compile(r"(INC|SR)-\d+")
+NUMBER_PATTERN = re.compile(r"\b\d+\b")
+
+# Engines accepted by extract_ids_batch
+EXTRACTION_ENGINES = ("regex", "spacy")
+
+# Punctuation the spaCy English tokenizer splits off either end of a whitespace-delimited
+# chunk, and the infixes it splits inside one. Only what can surround an ID is covered.
+# Brackets of either kind split off both ends; currency signs and "%" only end a token
+# when they follow a digit.
+_PREFIX_CHARS = "\"'`‘’“”«»()\\[\\]{}<>*#&_,;:!?$£€¥§%=…—–"
+_SUFFIX_CHARS = "\"'`‘’“”«»()\\[\\]{}<>*#&_,;:!?…—–"
+_UNIT_CHARS = "$£€¥%"
+PREFIX_PATTERN = re.compile(rf"^(?:[{_PREFIX_CHARS}]|\+(?![0-9])|\.\.+)")
+SUFFIX_PATTERN = re.compile(
+    rf"(?:[{_SUFFIX_CHARS}]|['’][sS]|\.\.+|(?<=[0-9])[+{_UNIT_CHARS}]|(?<=[0-9a-z%+\-{_SUFFIX_CHARS}])\.|(?<=[A-Z][A-Z])\.)$"
+)
+INFIX_PATTERN = re.compile(
+    r"(?<=[0-9])[+\-*^](?=[0-9-])|(?<=[A-Za-z0-9])[-–—~:<>=/](?=[A-Za-z])|(?<=[A-Za-z]),(?=[A-Za-z])"
+    r"|(?<=[a-z\"'`‘’“”«»])\.(?=[A-Z\"'`‘’“”«»])|\.\.+|…"
+)
+
+# "subscription ID <digits>" as three adjacent tokens, with the trailing digits allowed to
+# be followed by punctuation the tokenizer would split off. The spaCy tokenizer splits
+# "id" and "Id" into "i" + "d", so only the "ID" and "iD" spellings ever matched.
+_SUBSCRIPTION = (
+    rf"(?<!\S)(?=[{_PREFIX_CHARS}]*(?P<subscription>(?i:subscription)[ ](?:ID|iD)[ ]\d+)"
+    rf"(?:[{_UNIT_CHARS}]?[{_SUFFIX_CHARS}.]*(?!\S)|[+\-*^][0-9-]|[-–—~:<>=/][A-Za-z]|\.\.|…))"
+)
+SUBSCRIPTION_PATTERN = re.compile(_SUBSCRIPTION)
+
+# All ID forms in one pattern, scanned once from left to right. The subscription and
+# INC/SR alternatives are zero-width lookaheads at the start of a chunk, so they never
+# hide a phrase or number starting at the same position.
+COMBINED_PATTERN = re.compile(
+    _SUBSCRIPTION
+    + r"|(?<!\S)(?=(?P<chunk>\S*(?:INC|SR)-\d\S*))"
+    + r"|(?i:(?P<kind>order|subscription|ticket|sr|incident|number)\s+(?:with\s+)?(?:id|number)?\s+)(?P<value>\S+)"
+    + r"|\b(?P<number>\d+)\b"
+)
+
+
+def split_tokens(chunk):
+    """
+    Split a whitespace-delimited chunk the way the spaCy English tokenizer does.
+
+    Args:
+        chunk: Text without whitespace.
+
+    Returns:
+        list: The tokens of the chunk.
+    """
+    prefixes, suffixes = [], []
+    while chunk:
+        prefix = PREFIX_PATTERN.search(chunk)
+        if prefix and prefix.end() < len(chunk):
+            prefixes.append(chunk[:prefix.end()])
+            chunk = chunk[prefix.end():]
+            continue
+        suffix = SUFFIX_PATTERN.search(chunk)
+        if suffix and suffix.start() > 0:
+            suffixes.insert(0, chunk[suffix.start():])
+            chunk = chunk[:suffix.start()]
+            continue
+        break
+
+    tokens = []
+    start = 0
+    for infix in INFIX_PATTERN.finditer(chunk):
+        if infix.start() > start:
+            tokens.append(chunk[start:infix.start()])
+        tokens.append(infix.group())
+        start = infix.end()
+    if start < len(chunk):
+        tokens.append(chunk[start:])
+    return prefixes + tokens + suffixes
+
+
+def _add_ticket_tokens(chunk, ticket_ids, subscription_ids, order_ids):
+    # Tokens containing INC-/SR-<digits> anywhere are matched, then sorted like the
+    # original: a leading ticket ID, else "subscription" in the token, else a leading order ID
+    for token in split_tokens(chunk):
+        if not TICKET_TOKEN_PATTERN.search(token):
+            continue
+        if TICKET_ID_PATTERN.match(token):
+            ticket_ids[token] = None
+        elif "subscription" in token.lower():
+            subscription_ids[token] = None
+        elif ORDER_ID_PATTERN.match(token):
+            order_ids[token] = None
+
+
+def extract_ids(text):
+    """
+    Extract ticket, subscription, and order IDs from the provided text.
+
+    Returns the same IDs as the original spaCy Matcher based extraction (see
+    benchmarks/data/extract_ids_golden.jsonl) in a single pass over the text:
+    INC/SR tokens keep their case, "subscription ID N" keeps the original span
+    (only with "ID" in capitals, as the tokenizer splits "id" in two),
+    phrases like "ticket id 34" or "order SO000099" yield the lowercased value and
+    every standalone number is taken as a ticket ID.
+
+    Args:
+        text: The text to scan.
+
+    Returns:
+        list: A list of extracted IDs with their types.
+    """
+    # Dicts are used as insertion-ordered sets so the output order is deterministic
+    ticket_ids, subscription_ids, order_ids = {}, {}, {}
+
+    for match in COMBINED_PATTERN.finditer(text):
+        if match["subscription"] is not None:
+            subscription_ids[match["subscription"]] = None
+        elif match["chunk"] is not None:
+            _add_ticket_tokens(match["chunk"], ticket_ids, subscription_ids, order_ids)
+        elif match["number"] is not None:
+            ticket_ids[match["number"]] = None
+        else:
+            kind = match["kind"].lower()
+            value = match["value"]
+            if kind == "order":
+                if ORDER_ID_PATTERN.match(value):
+                    order_ids[value.lower()] = None
+            elif kind != "subscription":
+                ticket_ids[value.lower()] = None
+
+            # The phrase consumed the value chunk, so look for the other ID forms in it here
+            subscription = SUBSCRIPTION_PATTERN.match(text, match.start("value"))
+            if subscription:
+                subscription_ids[subscription["subscription"]] = None
+            if TICKET_TOKEN_PATTERN.search(value):
+                _add_ticket_tokens(value, ticket_ids, subscription_ids, order_ids)
+            for number in NUMBER_PATTERN.findall(value):
+                ticket_ids[number] = None
+
+    # Remove overlapping IDs to ensure a single ID is not classified as multiple types
+    for order_id in subscription_ids:
+        order_ids.pop(order_id, None)
+    for other_id in list(order_ids) + list(subscription_ids):
+        ticket_ids.pop(other_id, None)
+
+    return (
+        [{"ticket_id": ticket_id} for ticket_id in ticket_ids] +
+        [{"subscription_id": subscription_id} for subscription_id in subscription_ids] +
+        [{"order_id": order_id} for order_id in order_ids]
+    )
+
+
+def extract_ids_batch(texts, engine="regex", batch_size=256, n_process=1):
+    """
+    Extract IDs from many texts, yielding one result per text in input order.
+
+    `texts` can be any iterable (e.g. a generator over a JSONL file), and results are
+    produced as it is consumed, so memory stays flat regardless of the input size.
+
+    Args:
+        texts: Iterable of strings.
+        engine: "regex" for extract_ids, or "spacy" to run the original Matcher based
+            extraction over nlp.pipe.
+        batch_size: Texts per nlp.pipe batch (spacy engine only).
+        n_process: Worker processes for nlp.pipe (spacy engine only).
+
+    Yields:
+        list: The extracted IDs of each text, as returned by extract_ids.
+    """
+    if engine == "regex":
+        for text in texts:
+            yield extract_ids(text)
+    elif engine == "spacy":
+        from nlp_service import extract_ids_pipe
+        yield from extract_ids_pipe(texts, batch_size=batch_size, n_process=n_process)
+    else:
+        raise ValueError(f"Unknown ID extraction engine: {engine}")
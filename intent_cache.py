@@ -0,0 +1,101 @@
+import hashlib
+import json
+import re
+import threading
+import time
+
+CREATE_INTENT_CACHE_SQL = '''CREATE TABLE IF NOT EXISTS intent_cache (
+    normalized_prompt TEXT NOT NULL,
+    template_version TEXT NOT NULL,
+    intent_json TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (normalized_prompt, template_version)
+)'''
+
+SELECT_INTENT_SQL = '''SELECT intent_json, created_at FROM intent_cache
+                       WHERE normalized_prompt = ? AND template_version = ?'''
+
+UPSERT_INTENT_SQL = '''INSERT INTO intent_cache (normalized_prompt, template_version, intent_json, created_at)
+                       VALUES (?, ?, ?, ?)
+                       ON CONFLICT(normalized_prompt, template_version)
+                       DO UPDATE SET intent_json = excluded.intent_json, created_at = excluded.created_at'''
+
+DELETE_STALE_INTENTS_SQL = 'DELETE FROM intent_cache WHERE created_at < ? OR template_version != ?'
+
+
+def prompt_template_version(*template_parts):
+    """Hash the parts of the classification prompt template (system prompt, user template, model)."""
+    digest = hashlib.sha256("\x00".join(template_parts).encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+def normalize_prompt(prompt, details):
+    """
+    Normalize a prompt for cache lookups.
+
+    Every ID found by extract_ids is masked with a placeholder for its type
+    (e.g. "<order_id>"), then the text is lowercased and whitespace is collapsed.
+    """
+    text = prompt.lower()
+    ids = {(key, str(value).lower()) for detail in details for key, value in detail.items() if value}
+    # Longest IDs first, so "12345" is masked before "123" could match inside it
+    for key, value in sorted(ids, key=lambda item: len(item[1]), reverse=True):
+        text = re.sub(r"(?<!\w)" + re.escape(value) + r"(?!\w)", f"<{key}>", text)
+    return " ".join(text.split())
+
+
+class IntentCache:
+    """
+    Persistent cache of LLM intent classifications keyed on the normalized prompt.
+
+    Entries live in the `intent_cache` table and are tied to the hash of the prompt
+    template, so changing the intent catalog or the model invalidates them. Entries
+    older than `ttl_seconds` are ignored and purged on `initialize`.
+    """
+
+    def __init__(self, connection, template_version, ttl_seconds=86400):
+        self.connection = connection
+        self.template_version = template_version
+        self.ttl_seconds = float(ttl_seconds)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def initialize(self):
+        """Create the cache table and drop expired or outdated entries."""
+        with self.connection() as conn, conn:
+            conn.execute(CREATE_INTENT_CACHE_SQL)
+            conn.execute(DELETE_STALE_INTENTS_SQL, (time.time() - self.ttl_seconds, self.template_version))
+
+    def get(self, normalized_prompt):
+        """
+        Look up a cached classification.
+
+        Returns:
+            dict: The cached {"intent", "category", "certainty"}, or None on a miss.
+        """
+        with self.connection() as conn:
+            row = conn.execute(SELECT_INTENT_SQL, (normalized_prompt, self.template_version)).fetchone()
+        hit = row is not None and time.time() - row[1] <= self.ttl_seconds
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return json.loads(row[0]) if hit else None
+
+    def put(self, normalized_prompt, intent_data):
+        """Store a classification for a normalized prompt."""
+        with self.connection() as conn, conn:
+            conn.execute(UPSERT_INTENT_SQL, (normalized_prompt, self.template_version, json.dumps(intent_data), time.time()))
+
+    def stats(self):
+        """Return the hit and miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
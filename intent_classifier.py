@@ -0,0 +1,288 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+
+# Intent catalog used both to build the LLM classification prompt and to train the
+# local classifier, so the two never drift apart.
+INTENT_CATALOG = [
+    ("Trouble Tickets", [
+        ("createTicket", "Used when the user explicitly requests creating a ticket.", [
+            "Can you open a ticket for me?",
+            "Please create a ticket.",
+            "I need help, can you log a ticket?"
+        ]),
+        ("getTicketUpdate", "Used when the user asks for an update on a ticket.", [
+            "What is the status of my ticket",
+            "Can you update me on ticket number"
+        ]),
+        ("updateTicket", "Used when the user wants to modify an existing ticket.", [
+            "I need to update ticket",
+            "Please make changes to ticket"
+        ]),
+        ("closeTicket", "Used when the user asks to close a ticket.", [
+            "Close ticket ID 12345.",
+            "Please resolve and close ticket 54321."
+        ])
+    ]),
+    ("How to Help", [
+        ("howToHelp", "Used when the user requests guidance or troubleshooting help.", [
+            "Where can I find help in the documentation?",
+            "Can you guide me on this process?"
+        ]),
+        ("integrationHelp", "Used when the user requests help integrating systems.", [
+            "I need help with integrating your API."
+        ])
+    ]),
+    ("Order from Catalog", [
+        ("listProducts", "Used when the user requests a list of all products in the catalog.", [
+            "Show me all products",
+            "What products do you have?"
+        ]),
+        ("filterProducts", "Used when the user requests filtering the catalog based on a keyword.", [
+            "Show products related to laptops"
+        ]),
+        ("orderProduct", "Used when the user wants to place an order from the catalog.", [
+            "Order item ID 123",
+            "I want to buy a laptop."
+        ])
+    ]),
+    ("Manage Orders", [
+        ("getOrderStatus", "Used when the user asks for the status of a specific order.", [
+            "What is the status of my order ID 98765?",
+            "Track my order 12345.",
+            "What is happening with order ID 12345"
+        ]),
+        ("listOpenOrders", "Used when the user asks to see all open orders.", [
+            "Show me all open orders"
+        ]),
+        ("listFailedOrders", "Used when the user requests to see failed orders.", [
+            "Show me failed orders"
+        ]),
+        ("cancelOrder", "Used when the user wants to cancel an existing order.", [
+            "Cancel order ID 12345."
+        ]),
+        ("pushOrder", "Used for when the user wants to resubmit an order due to an error.", [
+            "Please resubmit order ID 12345",
+            "Please try order ID 12345 again",
+            "Please process order ID 12345"
+        ]),
+        ("orderReports", "Used when the user requests order reports for a specific period.", [
+            "Provide a report of all orders for January 2025.",
+            "Generate a summary of orders placed last week.",
+            "Give me a list of my last orders.",
+            "Show me my last orders.",
+            "Show me the orders from 01-01-2025 to 01-07-2025.",
+            "Show me a list of orders with that failed payment?"
+        ])
+    ])
+]
+
+INTENT_CATEGORIES = {
+    intent: category
+    for category, intents in INTENT_CATALOG
+    for intent, _, _ in intents
+}
+
+INTENT_SYSTEM_PROMPT = (
+    "You are a helpful assistant that classifies user intents. "
+    "Focus on identifying the primary intent based on the user's question or request. "
+    "If the user includes information like 'order ID' or 'subscription ID,' use this as additional context, not as the primary intent indicator."
+)
+
+
+def build_intent_prompt(prompt):
+    """
+    Build the few-shot user message that asks the LLM to classify `prompt`.
+    """
+    lines = [f"Classify the following prompt into one of the predefined intents: \n{prompt}\n\n", "Predefined intents are:\n"]
+    for category, intents in INTENT_CATALOG:
+        lines.append(f"- {category}:\n")
+        for intent, description, examples in intents:
+            lines.append(f"  - {intent}: {description} Examples: \n")
+            lines.extend(f"    - '{example}'\n" for example in examples)
+    lines.append("\nProvide the response ONLY as a JSON object containing 'intent', 'category', and 'certainty'.")
+    return "".join(lines)
+
+
+# Text normalization: IDs are masked so "order SO000099" and "order SO000123" look the same
+ORDER_ID_RE = re.compile(r"\b(?:SO|CF|CH|CL|DG|UG|RN|TA|TS)\d{6,10}\b", re.IGNORECASE)
+TICKET_ID_RE = re.compile(r"\b(?:INC|SR)-\d+\b", re.IGNORECASE)
+NUMBER_RE = re.compile(r"\b\d+\b")
+WORD_RE = re.compile(r"<\w+>|[a-z]+(?:'[a-z]+)?")
+
+
+def normalize_text(text):
+    """Lowercase `text` and mask order, ticket and numeric IDs."""
+    text = ORDER_ID_RE.sub(" <order> ", text)
+    text = TICKET_ID_RE.sub(" <ticket> ", text)
+    text = NUMBER_RE.sub(" <num> ", text)
+    return text.lower()
+
+
+def extract_features(text):
+    """Return the unigram and bigram features of a normalized text."""
+    words = WORD_RE.findall(text)
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+# Intents whose handlers change tickets or orders right away. They are never answered
+# locally (nor from the intent cache): only the LLM, which sees negations and
+# questions like "don't cancel order X" or "what happens if I cancel it?", picks them.
+DESTRUCTIVE_INTENTS = {"closeTicket", "cancelOrder", "pushOrder"}
+
+# A negated or hypothetical request is not what the rules below describe
+NEGATION_RE = re.compile(r"\b(?:not|don't|dont|never|shouldn't|should not|without)\b|^\s*no\s*,")
+QUESTION_RE = re.compile(r"^\s*(?:why|what happens|what if|should|how do|how can|how to)\b")
+
+# Phrasings that are unambiguous enough to classify without any model (read-only or
+# the start of a flow that asks for more details before it changes anything)
+RULES = [
+    ("getOrderStatus", re.compile(r"\b(?:status|track|happening)\b[^.?!]*\border\s+(?:id\s+|number\s+)?(?:<order>|<num>)")),
+    ("getTicketUpdate", re.compile(r"\b(?:status of|update on|update me on|updates? for|any update)\b[^.?!]*\bticket\b")),
+    ("updateTicket", re.compile(r"\b(?:update|modify|change|edit)\s+(?:the\s+|my\s+)?ticket\b")),
+    ("createTicket", re.compile(r"\b(?:open|create|log|raise)\s+(?:a\s+|an\s+|new\s+|a\s+new\s+)?ticket\b")),
+    ("createTicket", re.compile(r"^\s*(?:incident|service request)\s*[.!]?\s*$")),
+    ("unknown", re.compile(r"^\s*(?:yes|no)\s*[.!]?\s*$"))
+]
+
+RULE_CERTAINTY = 0.95
+
+
+class IntentClassifier:
+    """
+    Local fast-path intent classifier.
+
+    Tries a small set of unambiguous rules first, then a TF-IDF nearest-neighbour model
+    trained on the intent catalog examples plus any logged LLM labels. `classify`
+    returns None when neither tier is confident, or when the prompt looks like one of
+    the DESTRUCTIVE_INTENTS, so callers fall back to the LLM.
+    """
+
+    def __init__(self, threshold=0.8, margin=0.1, training_log=None, min_log_certainty=0.8):
+        self.threshold = float(threshold)
+        self.margin = float(margin)
+        self.training_log = training_log
+        self.min_log_certainty = float(min_log_certainty)
+        self._log_lock = threading.Lock()
+
+        examples = [
+            (example, intent)
+            for _, intents in INTENT_CATALOG
+            for intent, _, intent_examples in intents
+            for example in intent_examples
+        ]
+        examples.extend(self._load_logged_examples())
+        self._fit(examples)
+
+    def _load_logged_examples(self):
+        """Read LLM-labelled prompts previously appended to the training log."""
+        if not self.training_log or not os.path.exists(self.training_log):
+            return []
+
+        examples = []
+        with open(self.training_log) as log_file:
+            for line in log_file:
+                try:
+                    record = json.loads(line)
+                    certainty = float(record.get("certainty", 0))
+                except (ValueError, TypeError):
+                    continue
+                if record.get("intent") in INTENT_CATEGORIES and record.get("prompt") and certainty >= self.min_log_certainty:
+                    examples.append((record["prompt"], record["intent"]))
+        return examples
+
+    def _fit(self, examples):
+        """Build the TF-IDF vectors and an inverted index over the training examples."""
+        documents = [(extract_features(normalize_text(text)), intent) for text, intent in examples]
+
+        document_frequency = defaultdict(int)
+        for features, _ in documents:
+            for feature in set(features):
+                document_frequency[feature] += 1
+
+        count = len(documents)
+        self.idf = {feature: math.log((1 + count) / (1 + df)) + 1 for feature, df in document_frequency.items()}
+        self.labels = []
+        self.index = defaultdict(list)
+        for features, intent in documents:
+            vector = self._vectorize(features)
+            if not vector:
+                continue
+            position = len(self.labels)
+            self.labels.append(intent)
+            for feature, weight in vector.items():
+                self.index[feature].append((position, weight))
+
+    def _vectorize(self, features):
+        """Return the L2-normalized TF-IDF vector of a feature list, ignoring unseen features."""
+        vector = defaultdict(float)
+        for feature in features:
+            if feature in self.idf:
+                vector[feature] += self.idf[feature]
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {feature: weight / norm for feature, weight in vector.items()} if norm else {}
+
+    def classify(self, prompt):
+        """
+        Classify `prompt` locally.
+
+        Returns:
+            dict: {"intent", "category", "certainty", "source"} if confident, otherwise None.
+        """
+        text = normalize_text(prompt)
+
+        if not NEGATION_RE.search(text) and not QUESTION_RE.search(text):
+            for intent, pattern in RULES:
+                if pattern.search(text):
+                    return self._result(intent, RULE_CERTAINTY, "rules")
+
+        vector = self._vectorize(extract_features(text))
+        if not vector:
+            return None
+
+        scores = defaultdict(float)
+        for feature, weight in vector.items():
+            for position, example_weight in self.index[feature]:
+                scores[position] += weight * example_weight
+
+        # Best similarity per intent
+        best_by_intent = {}
+        for position, score in scores.items():
+            intent = self.labels[position]
+            if score > best_by_intent.get(intent, 0.0):
+                best_by_intent[intent] = score
+        if not best_by_intent:
+            return None
+
+        ranked = sorted(best_by_intent.items(), key=lambda item: item[1], reverse=True)
+        best_intent, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        if best_score < self.threshold or best_score - runner_up < self.margin:
+            return None
+        if best_intent in DESTRUCTIVE_INTENTS:
+            return None
+        return self._result(best_intent, min(best_score, 1.0), "model")
+
+    @staticmethod
+    def _result(intent, certainty, source):
+        return {
+            "intent": intent,
+            "category": INTENT_CATEGORIES.get(intent),
+            "certainty": round(certainty, 2),
+            "source": source
+        }
+
+    def record(self, prompt, intent, category, certainty, latency_ms=None):
+        """Append an LLM-labelled prompt to the training log, if one is configured."""
+        if not self.training_log:
+            return
+        entry = {"prompt": prompt, "intent": intent, "category": category, "certainty": certainty}
+        if latency_ms is not None:
+            entry["llm_latency_ms"] = round(latency_ms, 1)
+        line = json.dumps(entry)
+        with self._log_lock:
+            with open(self.training_log, "a") as log_file:
+                log_file.write(line + "\n")
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+
+import openai
+from openai import OpenAI
+
+from llm_stream import current_token_sink, stream_completion
+from log_config import LazyJson
+from metrics import Counter, Histogram, upstream_timer
+from model_router import ModelRouter, LLM_ESCALATIONS
+from token_accounting import token_ledger
+
+logger = logging.getLogger(__name__)
+
+with open('config/config.json') as config_file:
+    config = json.load(config_file)
+
+# Defaults for the "llm_gateway" section of config.json; tune the rates to the OpenAI tier
+DEFAULT_GATEWAY_SETTINGS = {
+    "default_model": "gpt-4",
+    "max_concurrency": 8,
+    "requests_per_minute": 500,
+    "tokens_per_minute": 40000,
+    "max_retries": 4,
+    "backoff_seconds": 0.5,
+    "max_backoff_seconds": 20,
+    "timeout_seconds": 60,
+    "coalesce": True
+}
+
+LLM_REQUESTS = Counter(
+    "ceebee_llm_requests_total",
+    "LLM completions requested through the gateway, by outcome (ok, error, coalesced).",
+    ("model", "purpose", "outcome")
+)
+LLM_RETRIES = Counter(
+    "ceebee_llm_retries_total",
+    "LLM calls retried, by reason.",
+    ("reason",)
+)
+LLM_WAIT_SECONDS = Histogram(
+    "ceebee_llm_wait_seconds",
+    "Time LLM calls waited for a concurrency slot and the rate limits.",
+    ("model",)
+)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` a minute, holding at most one minute's worth.
+
+    `acquire` blocks (with time.sleep, so greenlets yield under gevent) until the amount
+    is available. Amounts above the capacity are capped at it.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                wait = (amount - self.available) / self.rate
+            time.sleep(wait)
+
+
+class _Flight:
+    """An LLM call in progress, shared by identical concurrent requests."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def retry_reason(error):
+    """Return why `error` is worth retrying ("rate_limit", "server_error", "connection"), or None."""
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+        return "server_error"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    return None
+
+
+def rejection(validate, text):
+    """Return why `validate` rejects `text` ("invalid" if it raised, "rejected" if it returned false), or None."""
+    try:
+        return None if validate(text) else "rejected"
+    except Exception:
+        return "invalid"
+
+
+def retry_after(error):
+    """Return the Retry-After delay of a rate limited response in seconds, if it sent one."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after")) if response is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """
+    Single path for chat completions.
+
+    Every call is trimmed to its token budget and recorded by the token ledger, waits for
+    one of `max_concurrency` slots and for the request and token rate limits, and is
+    retried with jittered exponential backoff on 429, 5xx and connection errors.
+    Identical non-streamed calls in flight at the same time share one upstream request.
+    While a streaming request is in progress (see llm_stream.token_sink), replies are
+    streamed to it unless the call asks for `stream=False`.
+
+    Calls that do not name a model get the one `router` picks for their purpose. A
+    non-streamed reply that fails the call's `validate` check is asked again of the next
+    larger model.
+
+    Args:
+        client: OpenAI client; its own retries should be off (max_retries=0).
+        ledger (TokenLedger): Token accounting.
+        router (ModelRouter): Model per purpose; without one every call uses `default_model`.
+    """
+
+    def __init__(self, client, ledger=token_ledger, default_model="gpt-4", max_concurrency=8,
+                 requests_per_minute=500, tokens_per_minute=40000, max_retries=4, backoff_seconds=0.5,
+                 max_backoff_seconds=20, coalesce=True, router=None):
+        self.client = client
+        self.ledger = ledger
+        self.router = router
+        self.default_model = default_model
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.coalesce = coalesce
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def route(self, purpose):
+        """Return the model a call for `purpose` uses unless it names one."""
+        return self.router.model_for(purpose) if self.router else self.default_model
+
+    def complete(self, messages, purpose="default", model=None, max_tokens=2000, temperature=0.4, stream=None,
+                 validate=None):
+        """
+        Run a chat completion and return the reply text, stripped.
+
+        Args:
+            messages (list): Chat messages.
+            purpose (str): What the call is for; selects the token budget and labels the accounting.
+            model (str): Model to use, defaults to the routed model of `purpose`.
+            max_tokens (int): Maximum completion tokens.
+            temperature (float): Sampling temperature.
+            stream (bool): Stream to the current token sink; None streams when one is bound.
+            validate (callable): Takes the reply and returns whether it is usable; replies
+                it rejects (or raises on) are escalated to the next model tier.
+                Streamed replies are not validated.
+
+        Raises:
+            openai.OpenAIError: The last error once the retries are exhausted, or any
+            error that is not worth retrying.
+        """
+        model = model or self.route(purpose)
+        fitted, prompt_tokens = self.ledger.fit(messages, purpose, model)
+        request = {"model": model, "messages": fitted, "max_tokens": max_tokens, "temperature": temperature}
+
+        sink = current_token_sink() if stream is not False else None
+        if sink:
+            return self._call(request, purpose, prompt_tokens, sink).strip()
+        text = self._coalesced_call(request, purpose, prompt_tokens)
+        if validate is None:
+            return text
+
+        reason = rejection(validate, text)
+        larger = self.router.escalation(model) if reason and self.router else None
+        if larger:
+            LLM_ESCALATIONS.inc(purpose=purpose, from_model=model, reason=reason)
+            logger.info("Reply of %s for %s %s, asking %s", model, purpose, reason, larger)
+            return self.complete(messages, purpose, model=larger, max_tokens=max_tokens, temperature=temperature,
+                                 stream=False, validate=validate)
+        return text
+
+    def _coalesced_call(self, request, purpose, prompt_tokens):
+        if not self.coalesce:
+            return self._call(request, purpose, prompt_tokens).strip()
+        model = request["model"]
+
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            LLM_REQUESTS.inc(model=model, purpose=purpose, outcome="coalesced")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._call(request, purpose, prompt_tokens).strip()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _call(self, request, purpose, prompt_tokens, sink=None):
+        model = request["model"]
+        attempt = 0
+        while True:
+            waited = time.perf_counter()
+            self._requests.acquire()
+            # Rate limits count the completion allowance as well as the prompt
+            self._tokens.acquire(prompt_tokens + request["max_tokens"])
+            with self._slots:
+                LLM_WAIT_SECONDS.observe(time.perf_counter() - waited, model=model)
+                delivered = []
+                usages = []
+                try:
+                    if sink:
+                        def forward(delta):
+                            delivered.append(delta)
+                            sink(delta)
+
+                        text = stream_completion(self.client, forward, on_usage=usages.append, **request)
+                        # Without a reported usage the streamed text is counted locally
+                        self.ledger.record(model, purpose, prompt_tokens, usages[-1] if usages else None,
+                                           completion_text=text)
+                    else:
+                        with upstream_timer("openai"):
+                            response = self.client.chat.completions.create(**request)
+                        self.ledger.record(model, purpose, prompt_tokens, response.usage)
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("LLM response for %s: %s", purpose,
+                                         LazyJson(response.to_dict() if hasattr(response, "to_dict") else str(response)))
+                        text = response.choices[0].message.content
+                    LLM_REQUESTS.inc(model=model, purpose=purpose, outcome="ok")
+                    return text
+                except Exception as e:
+                    if delivered or usages:
+                        # The tokens streamed before the failure are billed all the same
+                        self.ledger.record(model, purpose, prompt_tokens, usages[-1] if usages else None,
+                                           completion_text="".join(delivered))
+                    reason = retry_reason(e)
+                    # A reply already partly streamed to the user cannot be taken back
+                    if reason is None or delivered or attempt >= self.max_retries:
+                        LLM_REQUESTS.inc(model=model, purpose=purpose, outcome="error")
+                        raise
+                    error = e
+            attempt += 1
+            LLM_RETRIES.inc(reason=reason)
+            delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+            delay = max(delay, retry_after(error) or 0)
+            logger.warning("LLM call for %s failed (%s: %s), retry %d in %.1fs", purpose, reason, error, attempt, delay)
+            time.sleep(delay)
+
+
+gateway_settings = {**DEFAULT_GATEWAY_SETTINGS, **config.get("llm_gateway", {})}
+model_routing_config = config.get("model_routing", {})
+llm_gateway = LLMGateway(
+    # Retries are the gateway's job; the client's own would multiply them
+    OpenAI(api_key=config['api_keys']['openai'], max_retries=0, timeout=gateway_settings["timeout_seconds"]),
+    default_model=gateway_settings["default_model"],
+    max_concurrency=gateway_settings["max_concurrency"],
+    requests_per_minute=gateway_settings["requests_per_minute"],
+    tokens_per_minute=gateway_settings["tokens_per_minute"],
+    max_retries=gateway_settings["max_retries"],
+    backoff_seconds=gateway_settings["backoff_seconds"],
+    max_backoff_seconds=gateway_settings["max_backoff_seconds"],
+    coalesce=gateway_settings["coalesce"],
+    router=ModelRouter(
+        tiers=model_routing_config.get("tiers"),
+        routes=model_routing_config.get("routes")
+    ) if model_routing_config.get("enabled", True) else None
+)
@@ -0,0 +1,54 @@
+import threading
+from contextlib import contextmanager
+from metrics import upstream_timer
+
+_local = threading.local()
+
+
+@contextmanager
+def token_sink(callback):
+    """
+    Forward the completion text of LLM calls made by this thread to `callback`.
+
+    While bound, stream-aware call sites (see stream_completion) request a streamed
+    completion and pass every text delta to `callback` as it arrives.
+    """
+    previous = getattr(_local, "sink", None)
+    _local.sink = callback
+    try:
+        yield
+    finally:
+        _local.sink = previous
+
+
+def current_token_sink():
+    """Return the token sink bound to this thread, or None."""
+    return getattr(_local, "sink", None)
+
+
+def stream_completion(client, sink, on_usage=None, **kwargs):
+    """
+    Create a streamed chat completion, pass each text delta to `sink` and return the full text.
+
+    Args:
+        client: OpenAI client.
+        sink: Callable receiving each text delta.
+        on_usage: Callable receiving the `usage` of the completion, if the API reports it.
+        kwargs: Arguments for client.chat.completions.create.
+
+    Returns:
+        str: The concatenated completion text.
+    """
+    parts = []
+    with upstream_timer("openai"):
+        # The last chunk carries the token usage, without choices
+        for chunk in client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs):
+            if on_usage and getattr(chunk, "usage", None):
+                on_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                sink(delta)
+    return "".join(parts)
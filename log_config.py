@@ -0,0 +1,164 @@
+import contextvars
+import json
+import logging
+import random
+import sys
+import time
+
+# Per-request logging state: correlation ID, sampling decision and fields for the request line
+_request = contextvars.ContextVar("log_request", default=None)
+
+DEFAULT_LOGGING_SETTINGS = {
+    "level": "INFO",
+    "format": "json",
+    "debug_sample_rate": 1.0,
+    "request_log": True
+}
+
+
+class LazyJson:
+    """
+    Defer json.dumps of a log argument until the record is actually formatted.
+
+        logger.debug("Context: %s", LazyJson(context))
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        try:
+            return json.dumps(self.value, separators=(",", ":"), default=str)
+        except (TypeError, ValueError):
+            return repr(self.value)
+
+
+def begin_request(sample_rate=None):
+    """
+    Start the logging state of a request and decide whether its DEBUG records are sampled.
+
+    Args:
+        sample_rate (float): Share of requests whose DEBUG records are kept, defaults to
+            the configured `debug_sample_rate`.
+
+    Returns:
+        dict: The request state: correlation_id, sampled, started (perf_counter) and fields.
+    """
+    rate = settings["debug_sample_rate"] if sample_rate is None else sample_rate
+    state = {
+        "correlation_id": None,
+        "sampled": rate >= 1 or random.random() < rate,
+        "started": time.perf_counter(),
+        "fields": {}
+    }
+    _request.set(state)
+    return state
+
+
+def end_request():
+    """Detach and return the logging state of the current request (None outside requests)."""
+    state = _request.get()
+    _request.set(None)
+    return state
+
+
+def set_correlation_id(correlation_id):
+    """Tag every record of the current request with `correlation_id` (the conversation_id)."""
+    state = _request.get()
+    if state is not None and correlation_id:
+        state["correlation_id"] = correlation_id
+
+
+def current_correlation_id():
+    """Return the correlation ID of the current request, or None."""
+    state = _request.get()
+    return state["correlation_id"] if state else None
+
+
+def request_fields():
+    """Return the fields annotated on the current request so far (empty outside requests)."""
+    state = _request.get()
+    return state["fields"] if state else {}
+
+
+def annotate(**fields):
+    """Add fields to the current request's summary line."""
+    state = _request.get()
+    if state is not None:
+        state["fields"].update(fields)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the correlation ID to records and drop DEBUG records of unsampled requests."""
+
+    def filter(self, record):
+        state = _request.get()
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = state["correlation_id"] if state else None
+        if record.levelno <= logging.DEBUG and state is not None and not state["sampled"]:
+            return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one compact JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if getattr(record, "correlation_id", None):
+            entry["conversation_id"] = record.correlation_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for development, with the correlation ID when there is one."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        if getattr(record, "correlation_id", None):
+            line += f" [conversation_id={record.correlation_id}]"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+settings = dict(DEFAULT_LOGGING_SETTINGS)
+
+
+def configure_logging(logging_config=None):
+    """
+    Configure the root logger from the `logging` section of config.json.
+
+    Records go to stderr as compact JSON lines ("format": "json") or plain text ("text").
+    DEBUG records are only formatted when "level" is DEBUG, and then only for the
+    `debug_sample_rate` share of requests. A root logger that already has handlers (e.g.
+    set up by the host) keeps them; only the level and filter are applied.
+    """
+    settings.update(DEFAULT_LOGGING_SETTINGS)
+    settings.update(logging_config or {})
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, str(settings["level"]).upper(), logging.INFO))
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if settings["format"] == "json" else TextFormatter())
+        root.addHandler(handler)
+    for handler in root.handlers:
+        if not any(isinstance(existing, RequestContextFilter) for existing in handler.filters):
+            handler.addFilter(RequestContextFilter())
@@ -0,0 +1,212 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Per-request stage timings for the Server-Timing header
+_timings = contextvars.ContextVar("stage_timings", default=None)
+
+_registry = []
+_collectors = []
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with labels, in the Prometheus text format.
+
+        TURNS.inc(intent="createTicket", status="200")
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Histogram with labels and fixed buckets, in the Prometheus text format.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    labels = format_labels(self.labelnames, key, [("le", format_value(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "ceebee_stage_duration_seconds",
+    "Time spent in each stage of a request.",
+    ("stage",)
+)
+UPSTREAM_SECONDS = Histogram(
+    "ceebee_upstream_request_duration_seconds",
+    "Duration of calls to OpenAI, FreshService and the commerce API, retries included.",
+    ("upstream", "status")
+)
+REQUEST_SECONDS = Histogram(
+    "ceebee_http_request_duration_seconds",
+    "Duration of HTTP requests until the response was sent.",
+    ("endpoint", "method", "status")
+)
+TURNS = Counter(
+    "ceebee_conversation_turns_total",
+    "Conversation turns handled, by intent and response status.",
+    ("intent", "status")
+)
+LLM_TOKENS = Counter(
+    "ceebee_llm_tokens_total",
+    "Tokens reported in the `usage` of OpenAI responses.",
+    ("model", "kind")
+)
+
+
+def register_collector(collect):
+    """
+    Add values that are read at scrape time.
+
+    Args:
+        collect (callable): Returns an iterable of (name, type, documentation, samples)
+            tuples, with `samples` a list of (labels dict, value) pairs.
+    """
+    _collectors.append(collect)
+
+
+def render():
+    """Return every metric of this process in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, kind, documentation, samples in collect():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels.keys(), labels.values())} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def start_timings():
+    """Start collecting the stage timings of the current request."""
+    _timings.set({})
+
+
+def finish_timings():
+    """Detach and return the stage timings of the current request, in seconds by stage."""
+    timings = _timings.get()
+    _timings.set(None)
+    return timings
+
+
+def add_timing(stage, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time a stage of the current request (e.g. "classification", "context_load")."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        add_timing(stage, elapsed)
+
+
+def observe_upstream(upstream, status, seconds):
+    """Record one upstream call."""
+    UPSTREAM_SECONDS.observe(seconds, upstream=upstream, status=str(status))
+    add_timing(upstream, seconds)
+
+
+@contextmanager
+def upstream_timer(upstream):
+    """Time a call to `upstream`; it is recorded with status "error" if it raises."""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        observe_upstream(upstream, status, time.perf_counter() - start)
+
+
+def record_llm_usage(model, usage):
+    """Count the prompt and completion tokens of an OpenAI response's `usage`, if any."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+
+
+def server_timing(timings):
+    """Format stage timings as a Server-Timing header value (durations in milliseconds)."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
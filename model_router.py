@@ -0,0 +1,53 @@
+from metrics import Counter
+
+# Models by tier, cheapest first; a call that fails validation on one tier is retried on the next
+DEFAULT_MODEL_TIERS = {
+    "fast": "gpt-4o-mini",
+    "large": "gpt-4"
+}
+
+# Tier per call purpose; purposes not listed use "default"
+DEFAULT_MODEL_ROUTES = {
+    "intent_classification": "fast",
+    "help": "fast",
+    "documentation": "large",
+    "summary": "large",
+    "order_analysis": "large",
+    "default": "large"
+}
+
+LLM_ESCALATIONS = Counter(
+    "ceebee_llm_escalations_total",
+    "LLM calls repeated on a larger model because the reply failed validation.",
+    ("purpose", "from_model", "reason")
+)
+
+
+class ModelRouter:
+    """
+    Pick the model of an LLM call from its purpose.
+
+    Small, structured tasks (intent classification, short help answers) go to the fast
+    tier and summarization and order analysis to the large one. `escalation` names the
+    model to retry on when a reply from a cheaper tier is rejected.
+
+    Args:
+        tiers (dict): Model per tier name, in escalation order (cheapest first).
+        routes (dict): Tier per purpose, with a "default" entry for the others.
+    """
+
+    def __init__(self, tiers=None, routes=None):
+        self.tiers = dict(tiers or DEFAULT_MODEL_TIERS)
+        self.routes = {**DEFAULT_MODEL_ROUTES, **(routes or {})}
+        self._order = list(self.tiers.values())
+
+    def model_for(self, purpose):
+        tier = self.routes.get(purpose, self.routes.get("default"))
+        return self.tiers.get(tier, self._order[-1])
+
+    def escalation(self, model):
+        """Return the next larger model after `model`, or None if it is the largest or not a tier."""
+        if model not in self._order:
+            return None
+        index = self._order.index(model)
+        return self._order[index + 1] if index + 1 < len(self._order) else None
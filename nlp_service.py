@@ -0,0 +1,167 @@
+import json
+import re
+import threading
+import spacy
+from spacy.matcher import Matcher
+
+with open('config/config.json') as config_file:
+    config = json.load(config_file)
+
+# "blank" loads a bare English tokenizer instead of a trained pipeline
+NLP_MODEL = config.get("nlp", {}).get("model", "en_core_web_sm")
+
+# ID extraction only needs the tokenizer and lexical attributes (LOWER, IS_DIGIT, TEXT),
+# so none of the trained components are loaded
+EXCLUDED_COMPONENTS = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner", "senter"]
+
+# Custom patterns for ticket, subscription, and order IDs
+ID_PATTERNS = [
+    [{"LOWER": "ticket"}, {"LOWER": "id"}, {"IS_DIGIT": True}],
+    [{"LOWER": "subscription"}, {"LOWER": "id"}, {"IS_DIGIT": True}],
+    [{"LOWER": "order"}, {"LOWER": "id"}, {"IS_DIGIT": True}],
+    [{"LOWER": "ticket"}, {"LOWER": "number"}, {"IS_DIGIT": True}],
+    [{"LOWER": "order"}, {"TEXT": {"REGEX": r"SO\d+"}}],
+    [{"TEXT": {"REGEX": r"(INC|SR)-\d+"}}]  # Adjusted to match standalone prefixes like "INC-123456"
+]
+
+_nlp = None
+_matcher = None
+_lock = threading.Lock()
+
+
+def load_pipeline(model=NLP_MODEL):
+    """
+    Load a spaCy pipeline with every unused component excluded.
+    """
+    if model == "blank":
+        return spacy.blank("en")
+    return spacy.load(model, exclude=EXCLUDED_COMPONENTS)
+
+
+def get_nlp():
+    """
+    Return the process-wide spaCy pipeline, loading it on first use.
+    """
+    global _nlp
+    if _nlp is None:
+        with _lock:
+            if _nlp is None:
+                _nlp = load_pipeline()
+    return _nlp
+
+
+def get_matcher():
+    """
+    Return the shared Matcher for ticket, subscription, and order ID patterns.
+    """
+    global _matcher
+    if _matcher is None:
+        nlp = get_nlp()
+        with _lock:
+            if _matcher is None:
+                matcher = Matcher(nlp.vocab)
+                matcher.add("ID_PATTERNS", ID_PATTERNS)
+                _matcher = matcher
+    return _matcher
+
+
+def tokenize(text):
+    """
+    Run `text` through the shared pipeline and return the spaCy doc.
+    """
+    return get_nlp()(text)
+
+
+def extract_ids_pipe(texts, batch_size=256, n_process=1):
+    """
+    Run `texts` through nlp.pipe and yield the extracted IDs of each doc in order.
+    """
+    for doc in get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process):
+        yield extract_ids_from_doc(doc)
+
+
+def extract_ids_from_doc(doc):
+    """
+    Extract ticket, subscription, and order IDs from the provided spaCy doc object.
+
+    This is the original Matcher based extraction. id_extractor.extract_ids returns the
+    same IDs without a doc and is used on the request path; this one is kept as the
+    reference for benchmarks/bench_id_extractor.py.
+
+    Args:
+        doc: spaCy document object.
+
+    Returns:
+        list: A list of extracted IDs with their types.
+    """
+    matches = get_matcher()(doc)
+    details = []
+    seen_ids = {"ticket_id": set(), "subscription_id": set(), "order_id": set()}  # Track IDs to avoid duplicates
+
+    # Define regex patterns
+    order_id_pattern = r"\b(SO|CF|CH|CL|DG|UG|RN|TA|TS)\d{6,10}\b"  # Matches prefixed order IDs like SO000099
+    ticket_id_pattern = r"\b(INC|SR)-\d+\b"  # Matches prefixed ticket IDs like INC-34 or SR-34
+    numeric_ticket_pattern = r"(ticket|sr|incident|number).*?\b\d+\b"  # Matches phrases like "Ticket ID 34"
+
+    for match_id, start, end in matches:
+        span = doc[start:end]
+        id_value = span.text.strip()  # Preserve the original text
+
+        # Extract ticket IDs (e.g., "INC-123456", "SR-34")
+        if re.match(ticket_id_pattern, span.text, re.IGNORECASE):
+            ticket_id = span.text.strip()
+            if ticket_id not in seen_ids["ticket_id"]:
+                details.append({"ticket_id": ticket_id})
+                seen_ids["ticket_id"].add(ticket_id)
+
+        # Extract subscription IDs
+        elif re.match(r"^SUB-\d+$", span.text, re.IGNORECASE) or "subscription" in span.text.lower():
+            subscription_id = span.text.strip()
+            if subscription_id not in seen_ids["subscription_id"]:
+                details.append({"subscription_id": subscription_id})
+                seen_ids["subscription_id"].add(subscription_id)
+
+        # Extract order IDs (e.g., "SO000099")
+        elif re.match(order_id_pattern, span.text, re.IGNORECASE):
+            order_id = span.text.strip()
+            if order_id not in seen_ids["order_id"]:
+                details.append({"order_id": order_id})
+                seen_ids["order_id"].add(order_id)
+
+    # Fallback: Handle phrases like "Ticket ID 34" and "Order SO000099"
+    text = doc.text.lower()  # Case-insensitive matching for fallback logic
+    fallback_matches = re.findall(r"(order|subscription|ticket|sr|incident|number)\s+(with\s+)?(id|number)?\s+(\S+)", text)
+    for match in fallback_matches:
+        id_type, _, _, id_value = match
+        if id_type == "order" and re.match(order_id_pattern, id_value, re.IGNORECASE) and id_value not in seen_ids["order_id"]:
+            details.append({"order_id": id_value})
+            seen_ids["order_id"].add(id_value)
+        elif id_type in ["ticket", "sr", "incident", "number"] and id_value not in seen_ids["ticket_id"]:
+            details.append({"ticket_id": id_value})
+            seen_ids["ticket_id"].add(id_value)
+
+    # Fallback: Match standalone numeric ticket IDs
+    numeric_ticket_matches = re.findall(r"\b\d+\b", text)
+    for match in numeric_ticket_matches:
+        if match not in seen_ids["ticket_id"]:
+            details.append({"ticket_id": match})
+            seen_ids["ticket_id"].add(match)
+
+    # Remove overlapping IDs to ensure a single ID is not classified as multiple types
+    order_ids = seen_ids["order_id"]
+    subscription_ids = seen_ids["subscription_id"]
+    ticket_ids = seen_ids["ticket_id"]
+
+    # Remove IDs from order if they exist in subscription
+    seen_ids["order_id"] -= subscription_ids
+    # Remove IDs from ticket if they exist in order or subscription
+    seen_ids["ticket_id"] -= (order_ids | subscription_ids)
+
+    # Rebuild the details list to ensure no overlap
+    details = (
+        [{"ticket_id": ticket_id} for ticket_id in seen_ids["ticket_id"]] +
+        [{"subscription_id": subscription_id} for subscription_id in seen_ids["subscription_id"]] +
+        [{"order_id": order_id} for order_id in seen_ids["order_id"]]
+    )
+
+    return details
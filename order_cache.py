@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+
+CREATE_ORDER_IDS_SQL = '''CREATE TABLE IF NOT EXISTS order_ids (
+    order_number TEXT PRIMARY KEY,
+    order_id TEXT NOT NULL
+)'''
+
+CREATE_ORDER_DETAILS_SQL = '''CREATE TABLE IF NOT EXISTS order_details (
+    order_id TEXT PRIMARY KEY,
+    document TEXT NOT NULL,
+    etag TEXT,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+)'''
+
+SELECT_ORDER_ID_SQL = 'SELECT order_id FROM order_ids WHERE order_number = ?'
+
+INSERT_ORDER_ID_SQL = 'INSERT OR REPLACE INTO order_ids (order_number, order_id) VALUES (?, ?)'
+
+SELECT_ORDER_DETAILS_SQL = 'SELECT document, etag, expires_at FROM order_details WHERE order_id = ?'
+
+UPSERT_ORDER_DETAILS_SQL = '''INSERT INTO order_details (order_id, document, etag, fetched_at, expires_at) VALUES (?, ?, ?, ?, ?)
+                              ON CONFLICT(order_id) DO UPDATE SET document = excluded.document, etag = excluded.etag,
+                              fetched_at = excluded.fetched_at, expires_at = excluded.expires_at'''
+
+REFRESH_ORDER_DETAILS_SQL = 'UPDATE order_details SET fetched_at = ?, expires_at = ? WHERE order_id = ?'
+
+DELETE_ORDER_DETAILS_SQL = 'DELETE FROM order_details WHERE order_id = ?'
+
+# Expired documents are kept this long for conditional (If-None-Match) revalidation
+DELETE_OLD_ORDER_DETAILS_SQL = 'DELETE FROM order_details WHERE fetched_at < ?'
+
+# Order statuses after which an order no longer changes on its own
+FINAL_ORDER_STATUSES = ("CP", "CL")
+
+
+class OrderCache:
+    """
+    Persistent cache of commerce API order lookups.
+
+    Order numbers resolve to order IDs in the `order_ids` table, which never expires since
+    the mapping cannot change. Order documents live in `order_details` for a TTL that depends
+    on their status: `final_ttl_seconds` once an order is in one of `final_statuses`, and
+    `ttl_seconds` while it is still being processed. Expired documents keep their ETag, so
+    the caller can revalidate them with a conditional request. Callers invalidate an order
+    after changing it.
+    """
+
+    def __init__(self, connection, ttl_seconds=30, final_ttl_seconds=3600, final_statuses=FINAL_ORDER_STATUSES,
+                 retention_seconds=86400):
+        self.connection = connection
+        self.ttl_seconds = float(ttl_seconds)
+        self.final_ttl_seconds = float(final_ttl_seconds)
+        self.final_statuses = frozenset(final_statuses)
+        self.retention_seconds = float(retention_seconds)
+
+        self._lock = threading.Lock()
+        self.id_hits = 0
+        self.id_misses = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.invalidations = 0
+
+    def initialize(self):
+        """Create the cache tables and drop order documents past their retention."""
+        with self.connection() as conn, conn:
+            conn.execute(CREATE_ORDER_IDS_SQL)
+            conn.execute(CREATE_ORDER_DETAILS_SQL)
+            conn.execute(DELETE_OLD_ORDER_DETAILS_SQL, (time.time() - self.retention_seconds,))
+
+    def ttl_for(self, document):
+        """Return the TTL of an order document based on its status."""
+        return self.final_ttl_seconds if document.get("status") in self.final_statuses else self.ttl_seconds
+
+    def get_order_id(self, order_number):
+        """Return the cached order ID of an order number, or None on a miss."""
+        with self.connection() as conn:
+            row = conn.execute(SELECT_ORDER_ID_SQL, (str(order_number),)).fetchone()
+        with self._lock:
+            if row is None:
+                self.id_misses += 1
+            else:
+                self.id_hits += 1
+        return row[0] if row else None
+
+    def put_order_id(self, order_number, order_id):
+        """Store the order ID an order number resolves to."""
+        with self.connection() as conn, conn:
+            conn.execute(INSERT_ORDER_ID_SQL, (str(order_number), str(order_id)))
+
+    def get_details(self, order_id):
+        """
+        Look up an order document.
+
+        Returns:
+            tuple: (document, etag, fresh), where `fresh` is False once the TTL has passed,
+            or (None, None, False) on a miss.
+        """
+        with self.connection() as conn:
+            row = conn.execute(SELECT_ORDER_DETAILS_SQL, (str(order_id),)).fetchone()
+        fresh = row is not None and time.time() < row[2]
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if row is None:
+            return None, None, False
+        return json.loads(row[0]), row[1], fresh
+
+    def put_details(self, order_id, document, etag=None):
+        """Store an order document with the TTL for its status."""
+        now = time.time()
+        with self.connection() as conn, conn:
+            conn.execute(UPSERT_ORDER_DETAILS_SQL, (str(order_id), json.dumps(document), etag, now, now + self.ttl_for(document)))
+
+    def refresh_details(self, order_id, document):
+        """Restart the TTL of a document the upstream confirmed unchanged (304 Not Modified)."""
+        now = time.time()
+        with self.connection() as conn, conn:
+            conn.execute(REFRESH_ORDER_DETAILS_SQL, (now, now + self.ttl_for(document), str(order_id)))
+        with self._lock:
+            self.revalidated += 1
+
+    def invalidate(self, order_id):
+        """Drop the cached document of an order, e.g. after pushing it to a new status."""
+        with self.connection() as conn, conn:
+            conn.execute(DELETE_ORDER_DETAILS_SQL, (str(order_id),))
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        """Return the order ID and order document counters."""
+        with self._lock:
+            id_lookups = self.id_hits + self.id_misses
+            lookups = self.hits + self.misses
+            return {
+                "order_id_hits": self.id_hits,
+                "order_id_misses": self.id_misses,
+                "order_id_hit_ratio": round(self.id_hits / id_lookups, 4) if id_lookups else 0.0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "revalidated": self.revalidated,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,254 @@
+import calendar
+import re
+from datetime import date, timedelta
+
+# Order types included in order reports
+ORDER_TYPES = ("SO", "CF", "CH", "CL", "DG", "UG", "RN", "TA", "TS")
+
+MONTHS = {name.lower(): index for index, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): index for index, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+
+# A date written as 2025-01-31, or with the year last as 31-01-2025, 01/31/2025 or 31.01.2025
+DATE = r"(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{4})"
+
+DATE_RANGE_PATTERN = re.compile(rf"\b(?:from|between)?\s*{DATE}\s*(?:to|and|until|through|-)\s*{DATE}\b", re.IGNORECASE)
+SINCE_PATTERN = re.compile(rf"\b(?:since|after|from)\s+{DATE}\b", re.IGNORECASE)
+ON_DATE_PATTERN = re.compile(rf"\b{DATE}\b")
+SINCE_MONTH_PATTERN = re.compile(rf"\bsince\s+({MONTH_NAMES})\.?(?:\s+(?:of\s+)?(\d{{4}}))?\b", re.IGNORECASE)
+SINCE_YEAR_PATTERN = re.compile(r"\bsince\s+(\d{4})\b", re.IGNORECASE)
+MONTH_PATTERN = re.compile(rf"\b({MONTH_NAMES})\.?(?:\s+(?:of\s+)?(\d{{4}}))?\b", re.IGNORECASE)
+QUARTER_PATTERN = re.compile(r"\bq([1-4])(?:\s+(\d{4}))?\b", re.IGNORECASE)
+LAST_N_PATTERN = re.compile(r"\b(?:last|past|previous)\s+(\d+)\s+(day|week|month|year)s?\b", re.IGNORECASE)
+RELATIVE_PATTERN = re.compile(r"\b(today|yesterday|(?:this|last|past|previous)\s+(?:week|month|quarter|year))\b", re.IGNORECASE)
+MONTH_PREPOSITION_PATTERN = re.compile(r"\b(?:in|for|during|of|since)\s+$", re.IGNORECASE)
+YEAR_PATTERN = re.compile(r"\b(?:in|for|during|of)\s+(\d{4})\b", re.IGNORECASE)
+
+# Order status codes by the words users filter reports with; "failed payment" is about
+# the payment status and is not a status filter
+ORDER_STATUS_WORDS = {
+    "completed": ("CP",),
+    "cancelled": ("CL",),
+    "canceled": ("CL",),
+    "failed": ("PF",)
+}
+STATUS_WORD_PATTERN = re.compile(r"\b([a-z]+)\b(?!\s+payments?\b)", re.IGNORECASE)
+
+
+def add_months(day, months):
+    """Return the first day of the month `months` after the month of `day`."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def iso_date(year, month, day):
+    """Return the date of ISO date parts, or None if they are out of range."""
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def parse_date(text, day_first=False):
+    """
+    Return the date written in `text` (see DATE), or None if it is not a valid date.
+
+    With the year last, the first number is the month unless `day_first` is set or the
+    first number cannot be a month (31-01-2025).
+    """
+    parts = re.split(r"[-/.]", text)
+    if len(parts[0]) == 4:
+        return iso_date(*parts)
+    first, second, year = parts
+    if day_first or int(first) > 12:
+        return iso_date(year, second, first)
+    return iso_date(year, first, second)
+
+
+def month_range(year, month):
+    start = date(year, month, 1)
+    return start, add_months(start, 1)
+
+
+def parse_date_range(text, today=None, day_first=False):
+    """
+    Find the date range a prompt asks about.
+
+    Understands dates and ranges ("2025-01-01 to 2025-01-31", "from 01-01-2025 to
+    01-07-2025", "since 2024-11-19"), months ("January 2025", "in March", "since
+    December"), quarters ("Q1 2025"), years ("in 2024", "since 2023") and relative
+    periods ("today", "last week", "this month", "last 30 days"). Weeks start on
+    Monday. A month or quarter without a year is the most recent one that has started.
+
+    Args:
+        text (str): The user's prompt.
+        today (date): Reference date, defaults to today.
+        day_first (bool): Read 01-07-2025 as 1 July rather than 7 January.
+
+    Returns:
+        tuple: (start, end) dates with `end` exclusive, or (None, None) if no period was found.
+    """
+    today = today or date.today()
+
+    match = DATE_RANGE_PATTERN.search(text)
+    if match:
+        # Both ends are written the same way, so "31-01-2025 to 01-02-2025" is day first throughout
+        for order in (day_first, not day_first):
+            start, last = parse_date(match.group(1), order), parse_date(match.group(2), order)
+            if start and last and start <= last:
+                return start, last + timedelta(days=1)
+
+    match = SINCE_PATTERN.search(text)
+    if match and parse_date(match.group(1), day_first):
+        return parse_date(match.group(1), day_first), today + timedelta(days=1)
+
+    match = ON_DATE_PATTERN.search(text)
+    if match and parse_date(match.group(1), day_first):
+        day = parse_date(match.group(1), day_first)
+        return day, day + timedelta(days=1)
+
+    match = SINCE_MONTH_PATTERN.search(text)
+    if match:
+        month = MONTHS[match.group(1).lower()]
+        year = int(match.group(2)) if match.group(2) else today.year
+        if not match.group(2) and date(year, month, 1) > today:
+            year -= 1
+        return date(year, month, 1), today + timedelta(days=1)
+
+    match = SINCE_YEAR_PATTERN.search(text)
+    if match:
+        return date(int(match.group(1)), 1, 1), today + timedelta(days=1)
+
+    match = LAST_N_PATTERN.search(text)
+    if match:
+        count, unit = int(match.group(1)), match.group(2).lower()
+        end = today + timedelta(days=1)
+        if unit == "day":
+            return end - timedelta(days=count), end
+        if unit == "week":
+            return end - timedelta(weeks=count), end
+        if unit == "month":
+            return add_months(today, -count).replace(day=min(today.day, 28)), end
+        return date(today.year - count, today.month, min(today.day, 28)), end
+
+    match = RELATIVE_PATTERN.search(text)
+    if match:
+        period = " ".join(match.group(1).lower().split())
+        if period == "today":
+            return today, today + timedelta(days=1)
+        if period == "yesterday":
+            return today - timedelta(days=1), today
+        which, unit = period.split()
+        previous = which != "this"
+        if unit == "week":
+            start = today - timedelta(days=today.weekday())
+            return (start - timedelta(weeks=1), start) if previous else (start, start + timedelta(weeks=1))
+        if unit == "month":
+            start = today.replace(day=1)
+            return (add_months(start, -1), start) if previous else (start, add_months(start, 1))
+        if unit == "quarter":
+            start = date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+            return (add_months(start, -3), start) if previous else (start, add_months(start, 3))
+        start = date(today.year, 1, 1)
+        return (date(today.year - 1, 1, 1), start) if previous else (start, date(today.year + 1, 1, 1))
+
+    match = QUARTER_PATTERN.search(text)
+    if match:
+        quarter = int(match.group(1))
+        year = int(match.group(2)) if match.group(2) else today.year
+        start = date(year, 3 * quarter - 2, 1)
+        if not match.group(2) and start > today:
+            start = start.replace(year=year - 1)
+        return start, add_months(start, 3)
+
+    for match in MONTH_PATTERN.finditer(text):
+        # "may" is only a month with a year or after "in", "for"..., not in "may I see..."
+        if match.group(1).lower() == "may" and not match.group(2) \
+                and not MONTH_PREPOSITION_PATTERN.search(text, 0, match.start()):
+            continue
+        month = MONTHS[match.group(1).lower()]
+        year = int(match.group(2)) if match.group(2) else today.year
+        if not match.group(2) and date(year, month, 1) > today:
+            year -= 1
+        return month_range(year, month)
+
+    match = YEAR_PATTERN.search(text)
+    if match:
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year + 1, 1, 1)
+
+    return None, None
+
+
+def parse_statuses(text, status_words=None):
+    """
+    Return the order status codes a prompt filters on ("failed orders"), in prompt order.
+
+    Args:
+        text (str): The user's prompt.
+        status_words (dict): Status codes by word, defaults to ORDER_STATUS_WORDS.
+    """
+    status_words = ORDER_STATUS_WORDS if status_words is None else status_words
+    statuses = {}
+    for match in STATUS_WORD_PATTERN.finditer(text):
+        for status in status_words.get(match.group(1).lower(), ()):
+            statuses[status] = None
+    return tuple(statuses)
+
+
+def rql_list(values):
+    return ",".join(str(value) for value in values)
+
+
+class OrderQuery:
+    """
+    RQL query for the commerce API's order resource.
+
+    Filters on order date (start inclusive, end exclusive), type, status and a minimum
+    total are sent to the API, newest orders first; `rql` adds the page window.
+    """
+
+    def __init__(self, start=None, end=None, types=ORDER_TYPES, statuses=None, min_total=None, sort="-orderDate"):
+        self.start = start
+        self.end = end
+        self.types = tuple(types or ())
+        self.statuses = tuple(statuses or ())
+        self.min_total = min_total
+        self.sort = sort
+
+    def filters(self):
+        """Return the RQL filter terms of the query."""
+        terms = []
+        if self.types:
+            terms.append(f"in(type,({rql_list(self.types)}))")
+        if self.statuses:
+            terms.append(f"in(status,({rql_list(self.statuses)}))")
+        if self.start:
+            terms.append(f"ge(orderDate,{self.start.isoformat()}T00:00:00Z)")
+        if self.end:
+            terms.append(f"lt(orderDate,{self.end.isoformat()}T00:00:00Z)")
+        if self.min_total is not None:
+            terms.append(f"gt(total.value,{self.min_total})")
+        return terms
+
+    def rql(self, offset=0, limit=100):
+        """Return the RQL query string for one page of results."""
+        terms = self.filters()
+        if self.sort:
+            terms.append(f"sort({self.sort})")
+        terms.append(f"limit({offset},{limit})")
+        return ",".join(terms)
+
+    def describe(self):
+        """Describe the date window and status filter for the LLM prompt."""
+        if self.start and self.end:
+            scope = f"orders dated {self.start.isoformat()} to {(self.end - timedelta(days=1)).isoformat()}"
+        elif self.start:
+            scope = f"orders dated {self.start.isoformat()} or later"
+        else:
+            scope = "the most recent orders"
+        if self.statuses:
+            scope += f" with status {', '.join(self.statuses)}"
+        return scope
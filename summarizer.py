@@ -0,0 +1,371 @@
+import contextvars
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from token_counter import count_tokens, CHARS_PER_TOKEN
+
+CREATE_SUMMARY_CHUNKS_SQL = '''CREATE TABLE IF NOT EXISTS summary_chunks (
+    chunk_key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    created_at REAL NOT NULL
+)'''
+
+SELECT_CHUNK_SUMMARY_SQL = 'SELECT summary FROM summary_chunks WHERE chunk_key = ?'
+
+UPSERT_CHUNK_SUMMARY_SQL = '''INSERT INTO summary_chunks (chunk_key, summary, created_at) VALUES (?, ?, ?)
+                              ON CONFLICT(chunk_key) DO UPDATE SET summary = excluded.summary, created_at = excluded.created_at'''
+
+DELETE_OLD_CHUNK_SUMMARIES_SQL = 'DELETE FROM summary_chunks WHERE created_at < ?'
+
+CHUNK_SUMMARY_PROMPT = """
+The following private notes are part of a support ticket thread, oldest first.
+Summarize them in a few sentences for a colleague who will write the customer update.
+Keep what the issue is, what was found, what was done and what happens next, with any
+dates, versions or order and ticket numbers. Leave out greetings and signatures.
+
+Private Notes:
+{notes}
+
+Summary:
+"""
+
+
+class ChunkSummaryCache:
+    """
+    Persistent cache of chunk summaries in the `summary_chunks` table.
+
+    A chunk is keyed on the IDs and bodies of its notes plus the summary prompt and
+    model, so adding a note to a ticket only leaves its last chunk uncached.
+    """
+
+    def __init__(self, connection, ttl_seconds=30 * 86400):
+        self.connection = connection
+        self.ttl_seconds = float(ttl_seconds)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def initialize(self):
+        """Create the cache table and drop entries older than the TTL."""
+        with self.connection() as conn, conn:
+            conn.execute(CREATE_SUMMARY_CHUNKS_SQL)
+            conn.execute(DELETE_OLD_CHUNK_SUMMARIES_SQL, (time.time() - self.ttl_seconds,))
+
+    def get(self, chunk_key):
+        """Return the cached summary of a chunk, or None on a miss."""
+        with self.connection() as conn:
+            row = conn.execute(SELECT_CHUNK_SUMMARY_SQL, (chunk_key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row else None
+
+    def put(self, chunk_key, summary):
+        """Store the summary of a chunk."""
+        with self.connection() as conn, conn:
+            conn.execute(UPSERT_CHUNK_SUMMARY_SQL, (chunk_key, summary, time.time()))
+
+    def stats(self):
+        """Return the hit and miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def split_text(text, max_tokens):
+    """
+    Split `text` into pieces of at most about `max_tokens` tokens, preferring whitespace.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars)
+        cut = cut if cut > max_chars // 2 else max_chars
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+class MapReduceSummarizer:
+    """
+    Summarize long ticket threads in chunks.
+
+    Notes are packed in order into chunks of at most `chunk_tokens` tokens, the chunks are
+    summarized concurrently (map) and the summaries are summarized again until they fit in
+    `reduce_tokens` (reduce). The caller turns the result into the final reply.
+
+    Chunk summaries are LLM calls that take seconds each, so they run on a thread pool of
+    their own rather than on the shared upstream pool (http_clients.fan_out), where they
+    would hold up the short API calls of other requests.
+
+    Args:
+        complete: Callable(prompt, max_tokens) returning the LLM completion text.
+        model: Model name, used for token counting and the cache key.
+        chunk_tokens: Maximum tokens of notes per chunk.
+        summary_tokens: max_tokens for each chunk summary.
+        reduce_tokens: Maximum tokens of summaries handed to the final reply.
+        cache: Optional ChunkSummaryCache.
+        workers: Threads summarizing chunks concurrently, shared by all requests.
+    """
+
+    def __init__(self, complete, model="gpt-4", chunk_tokens=3000, summary_tokens=400, reduce_tokens=4000, cache=None,
+                 workers=4):
+        self.complete = complete
+        self.model = model
+        self.chunk_tokens = chunk_tokens
+        self.summary_tokens = summary_tokens
+        self.reduce_tokens = reduce_tokens
+        self.cache = cache
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.template_version = hashlib.sha256(f"{CHUNK_SUMMARY_PROMPT}\x00{model}".encode("utf-8")).hexdigest()[:16]
+
+    def count(self, text):
+        return count_tokens(text, self.model)
+
+    def needs_chunking(self, notes):
+        """Return True when `notes` ((note_id, text) pairs) do not fit in a single chunk."""
+        total = 0
+        for _, text in notes:
+            total += self.count(text)
+            if total > self.chunk_tokens:
+                return True
+        return False
+
+    def pack(self, notes):
+        """
+        Pack (note_id, text) pairs greedily into chunks of at most `chunk_tokens`, lazily and in order.
+
+        Notes over `chunk_tokens` are split into pieces first.
+
+        Yields:
+            tuple: (note_id, text, tokens, pieces) per note, with `pieces` a list of
+            (piece_id, piece, starts_chunk) triples.
+        """
+        started, current_tokens = False, 0
+        for note_id, text in notes:
+            tokens = self.count(text)
+            split = [(note_id, text, tokens)] if tokens <= self.chunk_tokens else [
+                (f"{note_id}#{index}", piece, self.count(piece))
+                for index, piece in enumerate(split_text(text, self.chunk_tokens))
+            ]
+            pieces = []
+            for piece_id, piece, piece_tokens in split:
+                starts_chunk = not started or current_tokens + piece_tokens > self.chunk_tokens
+                if starts_chunk:
+                    started, current_tokens = True, 0
+                current_tokens += piece_tokens
+                pieces.append((piece_id, piece, starts_chunk))
+            yield note_id, text, tokens, pieces
+
+    def chunk_starts(self, notes):
+        """
+        Yield (note_id, text, tokens, starts_chunk) for (note_id, text) pairs packed by `pack`.
+
+        Packing the notes again from one that starts a chunk gives the same chunks from there
+        on, so a caller dropping old notes at such a note keeps every later chunk cached.
+        """
+        for note_id, text, tokens, pieces in self.pack(notes):
+            yield note_id, text, tokens, pieces[0][2]
+
+    def chunk(self, notes):
+        """
+        Pack (note_id, text) pairs into chunks of at most `chunk_tokens`, keeping their order.
+
+        Chunks are filled greedily from the oldest note, so a new note only changes the last
+        chunk, as long as older notes are only ever dropped where a chunk starts (see
+        `chunk_starts`).
+        """
+        chunks = []
+        for _, _, _, pieces in self.pack(notes):
+            for piece_id, piece, starts_chunk in pieces:
+                if starts_chunk:
+                    chunks.append([])
+                chunks[-1].append((piece_id, piece))
+        return chunks
+
+    def chunk_key(self, chunk):
+        digest = hashlib.sha256(self.template_version.encode("utf-8"))
+        for note_id, text in chunk:
+            digest.update(f"\x00{note_id}\x00".encode("utf-8"))
+            digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+        return digest.hexdigest()
+
+    def summarize_chunk(self, chunk):
+        notes = "\n\n".join(f"Note {index + 1}: {text}" for index, (_, text) in enumerate(chunk))
+        return self.complete(CHUNK_SUMMARY_PROMPT.format(notes=notes), self.summary_tokens)
+
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="summarize")
+        return self._executor
+
+    def close(self):
+        """Stop the chunk thread pool; it is started again on the next summary."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def map(self, chunks):
+        """
+        Summarize `chunks` concurrently, serving unchanged chunks from the cache.
+
+        Each summary is cached as soon as it is written, so when one chunk fails the others
+        are not summarized again on the next attempt. The error of the first failed chunk is
+        raised once every chunk has finished.
+        """
+        keys = [self.chunk_key(chunk) for chunk in chunks]
+        summaries = [self.cache.get(key) if self.cache else None for key in keys]
+        pending = [index for index, summary in enumerate(summaries) if summary is None]
+        # Each chunk runs in a copy of the caller's context, so its timings and log records
+        # are attributed to the request that started it
+        futures = {
+            self.executor().submit(contextvars.copy_context().run, self.summarize_chunk, chunks[index]): index
+            for index in pending
+        }
+        errors = {}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                summaries[index] = future.result()
+            except Exception as e:
+                errors[index] = e
+                continue
+            if self.cache:
+                self.cache.put(keys[index], summaries[index])
+        if errors:
+            raise errors[min(errors)]
+        return summaries
+
+    def summarize(self, notes):
+        """
+        Reduce (note_id, text) pairs to summaries that fit in `reduce_tokens`.
+
+        Returns:
+            list: Summaries in thread order.
+        """
+        summaries = self.map(self.chunk(notes))
+        level = 1
+        while len(summaries) > 1 and sum(self.count(summary) for summary in summaries) > self.reduce_tokens:
+            # Summaries are keyed on their own text, so unchanged groups stay cached as well
+            grouped = self.chunk([(f"level{level}", summary) for summary in summaries])
+            if len(grouped) >= len(summaries):
+                break
+            summaries = self.map(grouped)
+            level += 1
+        return summaries
+
+
+CREATE_TICKET_SUMMARIES_SQL = '''CREATE TABLE IF NOT EXISTS ticket_summaries (
+    ticket_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    note_keys TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)'''
+
+SELECT_TICKET_SUMMARY_SQL = 'SELECT fingerprint, note_keys, summary FROM ticket_summaries WHERE ticket_id = ?'
+
+UPSERT_TICKET_SUMMARY_SQL = '''INSERT INTO ticket_summaries (ticket_id, fingerprint, note_keys, summary, updated_at) VALUES (?, ?, ?, ?, ?)
+                               ON CONFLICT(ticket_id) DO UPDATE SET fingerprint = excluded.fingerprint,
+                               note_keys = excluded.note_keys, summary = excluded.summary, updated_at = excluded.updated_at'''
+
+DELETE_OLD_TICKET_SUMMARIES_SQL = 'DELETE FROM ticket_summaries WHERE updated_at < ?'
+
+
+def note_key(note_id, text):
+    """Identify a note by its ID and a hash of its text, so an edited note counts as new."""
+    return f"{note_id}:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+
+
+class TicketSummaryCache:
+    """
+    Persistent cache of customer-friendly ticket summaries in the `ticket_summaries` table.
+
+    Each ticket keeps its latest summary, the keys of the notes it covers and a fingerprint
+    of those keys, the ticket's `updated_at` and the prompt template. A matching fingerprint
+    means the summary can be served as is; otherwise the caller can update the previous
+    summary with the notes it does not cover yet.
+    """
+
+    def __init__(self, connection, template_version, ttl_seconds=30 * 86400):
+        self.connection = connection
+        self.template_version = template_version
+        self.ttl_seconds = float(ttl_seconds)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.incremental = 0
+        self.misses = 0
+
+    def initialize(self):
+        """Create the cache table and drop entries older than the TTL."""
+        with self.connection() as conn, conn:
+            conn.execute(CREATE_TICKET_SUMMARIES_SQL)
+            conn.execute(DELETE_OLD_TICKET_SUMMARIES_SQL, (time.time() - self.ttl_seconds,))
+
+    def fingerprint(self, note_keys, updated_at):
+        """Hash the note keys, the ticket's updated_at and the prompt template version."""
+        digest = hashlib.sha256(f"{self.template_version}\x00{updated_at}".encode("utf-8"))
+        for key in note_keys:
+            digest.update(f"\x00{key}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup(self, ticket_id, fingerprint):
+        """
+        Look up the summary of a ticket.
+
+        Returns:
+            tuple: ("hit", summary, note_keys) when the fingerprint matches,
+            ("stale", summary, note_keys) when the ticket changed since, or
+            ("miss", None, None).
+        """
+        with self.connection() as conn:
+            row = conn.execute(SELECT_TICKET_SUMMARY_SQL, (str(ticket_id),)).fetchone()
+        if row is None:
+            status = "miss"
+        elif row[0] == fingerprint:
+            status = "hit"
+        else:
+            status = "stale"
+        with self._lock:
+            if status == "hit":
+                self.hits += 1
+            elif status == "stale":
+                self.incremental += 1
+            else:
+                self.misses += 1
+        if row is None:
+            return status, None, None
+        return status, row[2], json.loads(row[1])
+
+    def put(self, ticket_id, fingerprint, note_keys, summary):
+        """Store the summary of a ticket and the notes it covers."""
+        with self.connection() as conn, conn:
+            conn.execute(UPSERT_TICKET_SUMMARY_SQL, (str(ticket_id), fingerprint, json.dumps(note_keys), summary, time.time()))
+
+    def stats(self):
+        """Return the hit, incremental update and miss counters."""
+        with self._lock:
+            lookups = self.hits + self.incremental + self.misses
+            return {
+                "hits": self.hits,
+                "incremental": self.incremental,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.join(REPO_ROOT, "benchmarks")
+REPO_MODULES = {name[:-3] for name in os.listdir(REPO_ROOT) if name.endswith(".py")}
+
+
+def forget_repo_modules():
+    # The modules read config/config.json at import, so each test imports them afresh
+    for name in REPO_MODULES:
+        sys.modules.pop(name, None)
+
+
+@pytest.fixture
+def fresh_app(tmp_path, monkeypatch):
+    """Import app against an empty database, with stubbed upstreams, without initializing it."""
+    for module in ("flask", "flask_cors", "openai"):
+        pytest.importorskip(module)
+    with open(os.path.join(REPO_ROOT, "config", "config.json")) as config_file:
+        config = json.load(config_file)
+    db_path = tmp_path / "conversations.db"
+    config.setdefault("context_store", {})["db_path"] = str(db_path)
+    (tmp_path / "config").mkdir()
+    (tmp_path / "config" / "config.json").write_text(json.dumps(config, indent=4))
+
+    monkeypatch.syspath_prepend(REPO_ROOT)
+    monkeypatch.syspath_prepend(BENCHMARKS)
+    from stub_upstreams import StubUpstreams
+
+    stub = StubUpstreams().start()
+    monkeypatch.setenv("OPENAI_BASE_URL", stub.openai_base_url)
+    monkeypatch.chdir(tmp_path)
+    forget_repo_modules()
+    import app as ceebee
+    ceebee.FRESH_SERVICE_BASE_URL = stub.freshservice_base_url
+    yield ceebee, db_path
+    ceebee.context_store.close()
+    forget_repo_modules()
+    stub.stop()
@@ -0,0 +1,30 @@
+import sqlite3
+
+
+def tables(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_first_request_creates_the_tables(fresh_app):
+    ceebee, db_path = fresh_app
+    assert not ceebee.storage_ready
+
+    response = ceebee.app.test_client().post("/api/conversation", json={"prompt": "How do I add a reseller?"})
+
+    assert response.status_code == 200, response.get_json()
+    assert ceebee.storage_ready
+    assert {"conversations", "intent_cache", "summary_chunks", "ticket_summaries"} <= tables(db_path)
+
+
+def test_initialize_storage_runs_once(fresh_app, monkeypatch):
+    ceebee, _ = fresh_app
+    calls = []
+    initialize_database = ceebee.initialize_database
+    monkeypatch.setattr(ceebee, "initialize_database", lambda: calls.append(1) or initialize_database())
+
+    ceebee.initialize_storage()
+    ceebee.initialize_storage()
+    ceebee.app.test_client().get("/api/cache_stats")
+
+    assert calls == [1]
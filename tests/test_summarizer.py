@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from summarizer import MapReduceSummarizer  # noqa: E402
+
+
+def note_text(note_id):
+    return " ".join(f"note{note_id}word{index}" for index in range(40))
+
+
+def thread(notes):
+    return [{"id": note_id, "private": True, "body_text": note_text(note_id)} for note_id in range(notes)]
+
+
+def counting_summarizer(ceebee, summarized):
+    def complete(prompt, max_tokens):
+        summarized.append(prompt)
+        return "Short summary."
+
+    ceebee.initialize_storage()
+    return MapReduceSummarizer(complete, chunk_tokens=600, reduce_tokens=4000, cache=ceebee.chunk_summary_cache)
+
+
+def test_chunking_again_from_a_chunk_start_keeps_the_later_chunks():
+    summarizer = MapReduceSummarizer(None, chunk_tokens=50)
+    notes = [(note_id, "word " * size) for note_id, size in enumerate((10, 30, 0, 120, 5, 45, 45, 20, 20, 70))]
+    chunks = summarizer.chunk(notes)
+
+    for index, (_, _, _, starts_chunk) in enumerate(summarizer.chunk_starts(notes)):
+        if starts_chunk:
+            tail = summarizer.chunk(notes[index:])
+            assert chunks[len(chunks) - len(tail):] == tail
+
+
+def test_new_note_on_thread_over_budget_only_summarizes_the_last_chunk(fresh_app, monkeypatch):
+    ceebee, _ = fresh_app
+    summarized = []
+    monkeypatch.setattr(ceebee, "summarizer", counting_summarizer(ceebee, summarized))
+    budget = 3000
+
+    kept = ceebee.latest_private_messages(thread(60), token_budget=budget)
+    assert kept[0]["id"] > 0
+    ceebee.summarizer.summarize(ceebee.as_notes(kept))
+    first_run = len(summarized)
+    assert first_run > 2
+
+    # The new note pushes the oldest notes out of the budget
+    summarized.clear()
+    kept = ceebee.latest_private_messages(thread(61), token_budget=budget)
+    assert sum(ceebee.count_tokens(message["body_text"]) for message in kept) <= budget
+    ceebee.summarizer.summarize(ceebee.as_notes(kept))
+
+    assert len(summarized) == 1
+    assert "note60word0" in summarized[0]
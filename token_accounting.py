@@ -0,0 +1,211 @@
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from log_config import request_fields, current_correlation_id
+from metrics import Counter, Histogram, record_llm_usage
+from token_counter import count_tokens, get_encoding, CHARS_PER_TOKEN
+
+with open('config/config.json') as config_file:
+    config = json.load(config_file)
+
+# Tokens the chat format adds per message and to prime the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Prompt budgets per call purpose; gpt-4 has an 8K context and replies take up to 2000 tokens
+DEFAULT_TOKEN_BUDGETS = {
+    "intent_classification": 3000,
+    "summary": 6000,
+    "documentation": 6000,
+    "help": 6000,
+    "order_analysis": 6000,
+    "default": 6000
+}
+
+# USD per 1,000 tokens
+DEFAULT_TOKEN_PRICES = {
+    "gpt-4": {"prompt": 0.03, "completion": 0.06},
+    "gpt-4o-mini": {"prompt": 0.00015, "completion": 0.0006}
+}
+
+TRIM_MARKER = "\n[... {tokens} tokens trimmed ...]\n"
+
+PROMPT_TOKENS = Histogram(
+    "ceebee_llm_prompt_tokens",
+    "Prompt size of LLM calls in tokens, counted before sending.",
+    ("purpose",),
+    buckets=(100, 250, 500, 1000, 2000, 4000, 6000, 8000, 16000, 32000)
+)
+TRIMMED_PROMPTS = Counter(
+    "ceebee_llm_prompts_trimmed_total",
+    "LLM prompts trimmed to their token budget.",
+    ("purpose",)
+)
+
+
+@lru_cache(maxsize=512)
+def cached_token_count(text, model):
+    # The long system prompts repeat on every call
+    return count_tokens(text, model)
+
+
+def message_token_count(message, model):
+    content = message.get("content") or ""
+    if message.get("role") == "system":
+        return cached_token_count(content, model)
+    # Other messages carry customer text, which is not kept around in the cache
+    return count_tokens(content, model)
+
+
+def count_message_tokens(messages, model="gpt-4"):
+    """
+    Count the prompt tokens of chat `messages` the way the API bills them.
+    """
+    return TOKENS_PER_REPLY + sum(TOKENS_PER_MESSAGE + message_token_count(message, model) for message in messages)
+
+
+def trim_text(text, tokens, model="gpt-4"):
+    """
+    Remove about `tokens` tokens from the middle of `text`, keeping its start and end.
+
+    Instructions usually sit at the start and end of a prompt and the bulk (threads,
+    order lists) in between, so the middle is what goes.
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Estimate with characters, like count_tokens
+        pieces, cut = text, tokens * CHARS_PER_TOKEN
+        join = str
+    else:
+        pieces, cut = encoding.encode(text, disallowed_special=()), tokens
+        join = encoding.decode
+    keep = len(pieces) - cut
+    if keep <= 0:
+        return ""
+    return join(pieces[:keep // 2]) + TRIM_MARKER.format(tokens=tokens) + join(pieces[len(pieces) - keep // 2:])
+
+
+class TokenLedger:
+    """
+    Prompt and completion tokens of LLM calls by purpose, model, intent and conversation.
+
+    Prompts are counted locally before they are sent (`fit`), which also trims them to
+    the token budget of their purpose; the `usage` reported by the API is added after
+    the call (`record`). The conversation and intent come from the request's logging
+    state. Per-conversation totals are kept for the most recent `max_conversations`.
+    """
+
+    def __init__(self, budgets=None, prices=None, max_conversations=1024):
+        self.budgets = {**DEFAULT_TOKEN_BUDGETS, **(budgets or {})}
+        self.prices = {**DEFAULT_TOKEN_PRICES, **(prices or {})}
+        self.max_conversations = max_conversations
+        self._by_purpose = {}
+        self._by_model = {}
+        self._by_intent = {}
+        self._by_conversation = OrderedDict()
+        self._lock = threading.Lock()
+
+    def budget(self, purpose):
+        return self.budgets.get(purpose, self.budgets.get("default"))
+
+    def fit(self, messages, purpose, model="gpt-4"):
+        """
+        Count the prompt tokens of `messages` and trim them to the budget of `purpose`.
+
+        The longest non-system message is shortened in the middle until the prompt fits.
+
+        Returns:
+            tuple: (messages, prompt_tokens) with the messages possibly trimmed copies.
+        """
+        prompt_tokens = count_message_tokens(messages, model)
+        budget = self.budget(purpose)
+        if budget and prompt_tokens > budget:
+            candidates = [index for index, message in enumerate(messages) if message.get("role") != "system"]
+            if candidates:
+                index = max(candidates, key=lambda i: len(messages[i].get("content") or ""))
+                excess = prompt_tokens - budget + count_tokens(TRIM_MARKER.format(tokens=prompt_tokens), model)
+                messages = list(messages)
+                messages[index] = {**messages[index], "content": trim_text(messages[index].get("content") or "", excess, model)}
+                prompt_tokens = count_message_tokens(messages, model)
+                TRIMMED_PROMPTS.inc(purpose=purpose)
+        PROMPT_TOKENS.observe(prompt_tokens, purpose=purpose)
+        return messages, prompt_tokens
+
+    def cost(self, model, prompt_tokens, completion_tokens):
+        prices = self.prices.get(model)
+        if not prices:
+            return 0.0
+        return (prompt_tokens * prices.get("prompt", 0) + completion_tokens * prices.get("completion", 0)) / 1000
+
+    def record(self, model, purpose, prompt_estimate, usage=None, completion_text=None):
+        """
+        Record one LLM call.
+
+        Args:
+            model (str): The model called.
+            purpose (str): The call's purpose, as given to `fit`.
+            prompt_estimate (int): The prompt tokens counted by `fit`.
+            usage: The `usage` of the response; without it the local counts are used.
+            completion_text (str): The reply, counted when there is no `usage`.
+        """
+        record_llm_usage(model, usage)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        else:
+            prompt_tokens = prompt_estimate
+            completion_tokens = count_tokens(completion_text or "", model)
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        fields = request_fields()
+        intent = fields.get("intent") or "none"
+        conversation_id = current_correlation_id()
+        # Totals of the request, for its log line
+        fields["prompt_tokens"] = fields.get("prompt_tokens", 0) + prompt_tokens
+        fields["completion_tokens"] = fields.get("completion_tokens", 0) + completion_tokens
+
+        with self._lock:
+            self._add(self._by_purpose, purpose, prompt_tokens, completion_tokens, prompt_estimate, cost)
+            self._add(self._by_model, model, prompt_tokens, completion_tokens, prompt_estimate, cost)
+            self._add(self._by_intent, intent, prompt_tokens, completion_tokens, prompt_estimate, cost)
+            if conversation_id:
+                self._add(self._by_conversation, conversation_id, prompt_tokens, completion_tokens, prompt_estimate, cost)
+                self._by_conversation.move_to_end(conversation_id)
+                while len(self._by_conversation) > self.max_conversations:
+                    self._by_conversation.popitem(last=False)
+
+    @staticmethod
+    def _add(table, key, prompt_tokens, completion_tokens, prompt_estimate, cost):
+        totals = table.get(key)
+        if totals is None:
+            totals = table[key] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                   "estimated_prompt_tokens": 0, "cost_usd": 0.0}
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["estimated_prompt_tokens"] += prompt_estimate
+        totals["cost_usd"] = round(totals["cost_usd"] + cost, 6)
+
+    def conversation(self, conversation_id):
+        """Return the token totals of a conversation, or None if it is not tracked."""
+        with self._lock:
+            totals = self._by_conversation.get(conversation_id)
+            return dict(totals) if totals else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "by_purpose": {key: dict(value) for key, value in self._by_purpose.items()},
+                "by_model": {key: dict(value) for key, value in self._by_model.items()},
+                "by_intent": {key: dict(value) for key, value in self._by_intent.items()},
+                "conversations": len(self._by_conversation)
+            }
+
+
+token_accounting_config = config.get("token_accounting", {})
+token_ledger = TokenLedger(
+    budgets=token_accounting_config.get("budgets"),
+    prices=token_accounting_config.get("prices"),
+    max_conversations=token_accounting_config.get("max_conversations", 1024)
+)
@@ -0,0 +1,56 @@
+import logging
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to an estimate
+    tiktoken = None
+
+# Average characters per token for English text with the GPT-4 tokenizer
+CHARS_PER_TOKEN = 4
+
+logger = logging.getLogger(__name__)
+
+_encodings = {}
+_lock = threading.Lock()
+
+
+def get_encoding(model="gpt-4"):
+    """
+    Return the tiktoken encoding for `model`, or None when tiktoken is not installed or
+    its encoding cannot be loaded (tiktoken downloads it on first use).
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return _encodings[model]
+    except KeyError:
+        pass
+    with _lock:
+        if model not in _encodings:
+            try:
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # Without network access the encoding cannot be downloaded; estimate instead
+                logger.warning("tiktoken encoding for %s not available, estimating token counts: %s", model, e)
+                encoding = None
+            _encodings[model] = encoding
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-4"):
+    """
+    Count the tokens of `text` for `model`.
+
+    Uses tiktoken when it is installed and otherwise estimates one token per
+    CHARS_PER_TOKEN characters.
+    """
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return max(1, -(-len(text) // CHARS_PER_TOKEN))
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,33 +1,73 @@
 import sqlite3
 import uuid
 import json
+import logging
 import re
-import spacy
 import requests
-from flask import Flask, request, jsonify
-from openai import OpenAI
+from flask import Flask, request, jsonify, g, has_app_context
+from context_store import ContextStore, ContextSession, ContextCache, ContextUnavailableError
+from http_clients import get_session
+from commerce_client import CommerceClient
+from order_cache import OrderCache, FINAL_ORDER_STATUSES
+from order_query import OrderQuery, parse_date_range, parse_statuses
+from token_counter import count_tokens
+from log_config import LazyJson
+from llm_gateway import llm_gateway
+
+logger = logging.getLogger(__name__)
 
 with open('config/config.json') as config_file:
     config = json.load(config_file)
 
 OPENAI_API_KEY = config['api_keys']['openai']
-client = OpenAI(api_key=OPENAI_API_KEY)
 fs_user_id = config['user_profile']['fs_user_id']
-nlp = spacy.load("en_core_web_sm")
+
+# Commerce API settings are loaded once and reloaded when config.json changes
+commerce_client = CommerceClient()
+
+# Shared, long-lived context store (a pool of SQLite connections per process)
+# with a write-through in-memory cache for hot conversations
+context_store_config = config.get("context_store", {})
+context_cache_config = config.get("context_cache", {})
+context_cache = None
+if context_cache_config.get("enabled", True):
+    context_cache = ContextCache(
+        max_entries=context_cache_config.get("max_entries", 1024),
+        max_bytes=context_cache_config.get("max_bytes", 8 * 1024 * 1024),
+        ttl_seconds=context_cache_config.get("ttl_seconds", 300)
+    )
+context_store = ContextStore(
+    db_path=context_store_config.get("db_path", "conversations.db"),
+    busy_timeout_ms=context_store_config.get("busy_timeout_ms", 5000),
+    synchronous=context_store_config.get("synchronous", "NORMAL"),
+    cache=context_cache,
+    pool_size=context_store_config.get("pool_size", 8)
+)
+
+# Windows and limits of order reports
+order_reports_config = config.get("order_reports", {})
+
+# Order number to order ID mappings and order documents from the commerce API
+order_cache_config = config.get("order_cache", {})
+order_cache = None
+if order_cache_config.get("enabled", True):
+    order_cache = OrderCache(
+        context_store.connection,
+        ttl_seconds=order_cache_config.get("ttl_seconds", 30),
+        final_ttl_seconds=order_cache_config.get("final_ttl_seconds", 3600),
+        final_statuses=order_cache_config.get("final_statuses", FINAL_ORDER_STATUSES),
+        retention_seconds=order_cache_config.get("retention_seconds", 86400)
+    )
 
 # Lazy imports for detect_intent and extract_ids
 def detect_intent(*args, **kwargs):
     from app import detect_intent as summarize_detect_intent
     return summarize_detect_intent(*args, **kwargs)
 
-def extract_ids(doc):
+def extract_ids(text):
     from app import extract_ids as summarize_extract_ids
-    return summarize_extract_ids(doc)
+    return summarize_extract_ids(text)
 
-# Lazy import for fetch_ticket_conversations
-def fetch_ticket_conversations(ticket_id):
-    from app import fetch_ticket_conversations as summarize_fetch_ticket_conversations
-    return summarize_fetch_ticket_conversations(ticket_id)
 
 # Lazy import for get_customer_friendly_response
 def get_customer_friendly_response(private_messages):
@@ -37,74 +77,108 @@ def get_customer_friendly_response(private_messages):
 # Database Setup
 def initialize_database():
     """Initialize the SQLite database to store conversation states."""
-    conn = sqlite3.connect("conversations.db")
-    cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS conversations (
-        conversation_id TEXT PRIMARY KEY,
-        context TEXT
-    )''')
-    conn.commit()
-    conn.close()
+    context_store.initialize()
+    if order_cache is not None:
+        order_cache.initialize()
 
 # Generate Unique Conversation ID
 def generate_conversation_id():
     """Generate a unique conversation ID."""
-    return str(uuid.uuid4())
+    conversation_id = str(uuid.uuid4())
+    # A new ID cannot have a stored context yet, so its first lookup need not hit SQLite
+    context_store.mark_new(conversation_id)
+    return conversation_id
+
+# Request-scoped context session
+def begin_context_session(conversation_id):
+    """
+    Load the context for a conversation once and bind it to the current request.
+
+    While the session is bound, `retrieve_context` returns the in-memory context and
+    `save_context` only marks it dirty; `commit_context_session` writes it once.
+
+    Raises:
+        ContextUnavailableError: If the context could not be read. No session is bound, so
+            the stored context is not overwritten with a default one.
+    """
+    session = ContextSession(context_store, conversation_id, lambda payload: decode_context(conversation_id, payload))
+    try:
+        session.load()
+    except sqlite3.Error as e:
+        logger.error("SQLite error occurred while retrieving context for %s: %s", conversation_id, e)
+        raise ContextUnavailableError(conversation_id) from e
+    g.context_session = session
+    return session
+
+def get_context_session(conversation_id):
+    """Return the session bound to the current request for `conversation_id`, if any."""
+    if not has_app_context():
+        return None
+    session = g.get("context_session")
+    if session is not None and session.conversation_id == conversation_id:
+        return session
+    return None
+
+def commit_context_session():
+    """
+    Write the request's context once if it changed, and unbind the session.
+
+    Raises:
+        ContextConflictError: If another request updated the same conversation in the meantime.
+    """
+    session = g.pop("context_session", None)
+    if session is not None:
+        session.commit()
 
 # Save Context to Database
 def save_context(conversation_id, context):
     """Save or update the context for a given conversation ID."""
+    session = get_context_session(conversation_id)
+    if session is not None:
+        # Defer the write to the end of the request
+        session.mark_dirty(context)
+        logger.debug("Staged context for %s; it is written once at the end of the request.", conversation_id)
+        return
+
     try:
-        conn = sqlite3.connect("conversations.db")
-        conn.execute("PRAGMA journal_mode=WAL;")  # Enable WAL mode for better concurrency
-        cursor = conn.cursor()
-        cursor.execute('''INSERT INTO conversations (conversation_id, context)
-                          VALUES (?, ?)
-                          ON CONFLICT(conversation_id) 
-                          DO UPDATE SET context = excluded.context''',
-                       (conversation_id, json.dumps(context)))
-        conn.commit()
-        print(f"DEBUG: Successfully saved context for {conversation_id}: {json.dumps(context, indent=2)}")
+        context_store.save(conversation_id, json.dumps(context))
+        logger.debug("Successfully saved context for %s: %s", conversation_id, LazyJson(context))
     except sqlite3.Error as e:
-        print(f"ERROR: SQLite error occurred while saving context for {conversation_id}: {e}")
+        logger.error("SQLite error occurred while saving context for %s: %s", conversation_id, e)
     except Exception as e:
-        print(f"ERROR: Unexpected error while saving context for {conversation_id}: {e}")
-    finally:
-        conn.close()
+        logger.error("Unexpected error while saving context for %s: %s", conversation_id, e)
 
 # Retrieve Context from Database
 def retrieve_context(conversation_id):
     """Retrieve the context for a given conversation ID."""
-    try:
-        conn = sqlite3.connect("conversations.db")
-        conn.execute("PRAGMA journal_mode=WAL;")  # Enable WAL mode for better concurrency
-        cursor = conn.cursor()
-        cursor.execute('SELECT context FROM conversations WHERE conversation_id = ?', (conversation_id,))
-        row = cursor.fetchone()
-        conn.close()
-
-        if row:
-            try:
-                context = json.loads(row[0])
-                #print(f"DEBUG: Retrieved context for {conversation_id}: {json.dumps(context, indent=2)}")
-                return context
-            except json.JSONDecodeError as e:
-                print(f"ERROR: Malformed JSON in database for {conversation_id}: {e}")
-                # Return default context in case of JSON error
-                return initialize_default_context()
-        else:
-            # Log that no context was found and return default
-            default_context = initialize_default_context()
-            print(f"DEBUG: No context found for {conversation_id}. Returning default: {json.dumps(default_context, indent=2)}")
-            return default_context
+    session = get_context_session(conversation_id)
+    if session is not None:
+        return session.context
 
+    try:
+        return decode_context(conversation_id, context_store.load(conversation_id))
     except sqlite3.Error as e:
-        print(f"ERROR: SQLite error occurred while retrieving context for {conversation_id}: {e}")
+        logger.error("SQLite error occurred while retrieving context for %s: %s", conversation_id, e)
         return initialize_default_context()
     except Exception as e:
-        print(f"ERROR: Unexpected error while retrieving context for {conversation_id}: {e}")
+        logger.error("Unexpected error while retrieving context for %s: %s", conversation_id, e)
         return initialize_default_context()
 
+def decode_context(conversation_id, payload):
+    """Decode a stored context payload, falling back to the default context."""
+    if payload:
+        try:
+            return json.loads(payload)
+        except json.JSONDecodeError as e:
+            logger.error("Malformed JSON in database for %s: %s", conversation_id, e)
+            # Return default context in case of JSON error
+            return initialize_default_context()
+    else:
+        # Log that no context was found and return default
+        default_context = initialize_default_context()
+        logger.debug("No context found for %s. Returning default: %s", conversation_id, LazyJson(default_context))
+        return default_context
+
 # Initialize Default Context
 def initialize_default_context(intent=None):
     default_context = {
@@ -127,22 +201,52 @@ def initialize_default_context(intent=None):
 
     return default_context
 
+# Multi-step flow state
+FLOW_STEP_PREFIXES = ("await_", "wait_for_")
+
+# Messages that abandon an ongoing flow; they must make up the whole prompt
+ESCAPE_PHRASE_PATTERN = re.compile(
+    r"^\s*(?:cancel|stop|quit|exit|reset|restart|start over|start again|never ?mind)\s*[.!]*\s*$",
+    re.IGNORECASE
+)
+
+def active_flow_step(context):
+    """Return the pending `next_step` if a multi-step flow is in progress, otherwise None."""
+    next_step = context.get("next_step")
+    if next_step and next_step.startswith(FLOW_STEP_PREFIXES):
+        return next_step
+    return None
+
+def is_escape_phrase(prompt):
+    """Check whether the prompt asks to abandon the current flow, e.g. "cancel" or "start over"."""
+    return bool(ESCAPE_PHRASE_PATTERN.match(prompt or ""))
+
+def handle_flow_escape(context, conversation_id):
+    """
+    Abandon the ongoing multi-step flow and reset the conversation context.
+    """
+    context.clear()
+    context.update(initialize_default_context())
+    context["next_step"] = "complete"
+    context["reply"] = "No problem, I've stopped that request. \n\n Is there anything else I can help you with?"
+    save_context(conversation_id, context)
+    return {"reply": context["reply"], "next_step": context["next_step"]}
+
 # Intent Handler Framework
 def handle_intent(intent, details, conversation_id):
     """Route intents to the appropriate handler function."""
     # Retrieve the current context for the conversation
     context = retrieve_context(conversation_id)
-    print("DEBUG: Retrieving Context Start of handle_intent")
-    print(f"DEBUG: {json.dumps(context, indent=2)}")
+    logger.debug("Context at the start of handle_intent: %s", LazyJson(context))
 
     # Add the latest prompt to the context
     if "prompt" in request.json:
         context["prompt"] = request.json["prompt"]
 
     # Use `next_step` for ongoing flows
-    next_step = context.get("next_step")
+    next_step = active_flow_step(context)
     if next_step:
-        print(f"DEBUG: Continuing flow with next_step: {next_step}")
+        logger.debug("Continuing flow with next_step: %s", next_step)
         # Directly invoke the flow based on `next_step`
         if next_step.startswith("await_"):
             return handle_create_ticket(context, details, conversation_id)
@@ -153,11 +257,17 @@ def handle_intent(intent, details, conversation_id):
     if not intent or intent == "unknown":
         next_step = context.get("next_step")
         if next_step and next_step.startswith("await_"):
-            print("DEBUG: Fallback to next_step flow for ongoing conversation.")
+            logger.debug("Fallback to next_step flow for ongoing conversation.")
             return handle_create_ticket(context, details, conversation_id)
-        elif next_step.startswith("wait_for_"):
+        elif next_step and next_step.startswith("wait_for_"):
             return handle_ticket_close(context, details, conversation_id)
 
+        # Nothing in progress to continue, e.g. a bare "yes" outside of a flow
+        response = {
+            "reply": "Sorry, I'm not sure what you would like to do. \n\n I can help you open a ticket, get an update on a ticket, close a ticket, get help on how to use CloudBlue, show you how to integrate to CloudBlue, or help you find orders and information about your orders.",
+            "next_step": "unsupported"
+        }
+
     else:
         # Handle recognized intents
         if intent == "createTicket":
@@ -188,8 +298,7 @@ def handle_intent(intent, details, conversation_id):
     context.update(response)
 
     # Persist the updated context
-    print("DEBUG: Saving Context in handle_intent function")
-    print(f"DEBUG: {json.dumps(context, indent=2)}")
+    logger.debug("Saving context in handle_intent: %s", LazyJson(context))
     save_context(conversation_id, context)
 
     # Return the response (usually contains `reply` and `next_step`)
@@ -200,15 +309,10 @@ def handle_get_ticket_update(context, details):
     """
     Handle the getTicketUpdate intent logic.
     """
-    # Lazy import for fetch_ticket_conversations
-    def fetch_ticket_conversations(ticket_id):
-        from app import fetch_ticket_conversations as summarize_fetch_ticket_conversations
-        return summarize_fetch_ticket_conversations(ticket_id)
-
-    # Lazy import for get_customer_friendly_response
-    def get_customer_friendly_response(private_messages):
-        from app import get_customer_friendly_response as summarize_get_customer_friendly_response
-        return summarize_get_customer_friendly_response(private_messages)
+    # Lazy import for summarize_ticket_update
+    def summarize_ticket_update(ticket_id):
+        from app import summarize_ticket_update as app_summarize_ticket_update
+        return app_summarize_ticket_update(ticket_id)
 
     # Extract the ticket_id from details
     ticket_id = None
@@ -226,26 +330,12 @@ def handle_get_ticket_update(context, details):
 
     # Make API call to Freshservice to check if the ticket exists and fetch details
     try:
-        # Check if ticket exists and fetch conversations
-        conversations = fetch_ticket_conversations(ticket_id)
-
-        # If conversations are empty, ticket does not exist
-        if not conversations:
-            return {
-                "reply": f"The ticket ID **{ticket_id}** does not exist. Please provide a valid ticket ID.",
-                "next_step": "request_ticket_id"
-            }
-
-        # Extract private messages from conversations
-        private_messages = [
-            conv.get("body_text", "")
-            for conv in conversations
-            if conv.get("private")
-        ]
+        # Summarize the private messages, served from the ticket summary cache while the
+        # ticket is unchanged (a missing ticket raises and is reported below)
+        customer_friendly_response = summarize_ticket_update(ticket_id)
 
         # Generate customer-friendly response
-        if private_messages:
-            customer_friendly_response = get_customer_friendly_response(private_messages)
+        if customer_friendly_response is not None:
             return {
                 "reply": customer_friendly_response + "\n\n Is there anything else I can help with?",
                 "next_step": "complete"
@@ -269,34 +359,29 @@ def handle_create_ticket(context, details, conversation_id):
     # Nested function to create a ticket (used later in the flow)
     def create_ticket(payload):
         from app import generate_auth_header, FRESH_SERVICE_API_KEY, FRESH_SERVICE_BASE_URL
-        import requests
         url = f"{FRESH_SERVICE_BASE_URL}/tickets"
         headers = generate_auth_header(FRESH_SERVICE_API_KEY)
 
         # Submit the request
-        response = requests.post(url, headers=headers, json=payload)
+        response = get_session("freshservice").post(url, headers=headers, json=payload)
         response.raise_for_status()
 
         # Debug the raw response
         response_data = response.json()
-        print(f"DEBUG: Create ticket raw response: {json.dumps(response_data, indent=2)}")
+        logger.debug("Create ticket raw response: %s", LazyJson(response_data))
         return response_data
 
     # Derive the current step
     step = context.get("next_step", "request_ticket_type")
-    print("DEBUG: Starting handle_create_ticket")
-    print(f"DEBUG: Step derived from context: {step}")
-    print(f"DEBUG: Retrieved context: {json.dumps(context, indent=2)}")
+    logger.debug("Starting handle_create_ticket at step %s with context: %s", step, LazyJson(context))
 
     # Process the latest prompt
     prompt = request.json.get("prompt", "").strip().lower()
-    # print(f"DEBUG: Received prompt: {prompt}")
 
     # Handle steps
     if step == "request_ticket_type":
         context["next_step"] = "await_ticket_type"
         context["reply"] = "Before we start, what kind of request would you like to open? \n\n **Service Request** (configuration change or to publish a new product) \n\n or \n\n **Incident** (something is broken or you are experiencing unexpected behavior)?"
-        print("DEBUG: Saving Context in request_ticket_type step")
         save_context(conversation_id, context)
 
     elif step == "await_ticket_type":
@@ -415,16 +500,16 @@ def handle_create_ticket(context, details, conversation_id):
                     "incident_type": "Technical issue"
                 }
             }
-            print(f"DEBUG: Create ticket payload: {json.dumps(payload, indent=2)}")
+            logger.debug("Create ticket payload: %s", LazyJson(payload))
             ticket_response = create_ticket(payload)
 
             # Debug the parsed response
-            print(f"DEBUG: Ticket response: {json.dumps(ticket_response, indent=2)}")
+            logger.debug("Ticket response: %s", LazyJson(ticket_response))
 
             # Extract the ticket ID
             ticket_id = ticket_response.get("ticket", {}).get("id", "N/A") # Default to "N/A" if `id` is not found
             if ticket_id == "N/A":
-                print("WARNING: Ticket ID not found in the response.")
+                logger.warning("Ticket ID not found in the response.")
 
             context["next_step"] = "complete"
             context["reply"] = f"Your ticket has been created successfully! The ticket ID is **{ticket_id}**.\n\nIs there anything else we can help you with?"
@@ -439,42 +524,21 @@ def handle_create_ticket(context, details, conversation_id):
         context["next_step"] = "unsupported"
 
     # Save the updated context after all changes
-    print("DEBUG: Saving Context at the end of handle_create_ticket function")
     save_context(conversation_id, context)
     return {"reply": context["reply"], "next_step": context["next_step"]}
 
-def call_openai_api(model="gpt-4", messages=None, max_tokens=2000):
+def call_openai_api(model=None, messages=None, max_tokens=2000, purpose="default"):
     """
-    Standardized method to call the OpenAI API using the OpenAI client library.
-    Logs the full JSON response from OpenAI to the console for troubleshooting.
+    Standardized method to call the OpenAI API through the LLM gateway.
+    Without a `model` the gateway picks the model tier routed for `purpose`.
+    The full JSON response from OpenAI is logged at DEBUG level for troubleshooting.
+    The prompt is trimmed to the token budget of `purpose` and its tokens are recorded.
     """
     try:
-        if not model:
-            model = "gpt-4"
-        if not messages:
-            messages = []
-
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=max_tokens,
-            temperature=0.4
-        )
-
-        # Convert the response to a serializable format if needed
-        if hasattr(response, "to_dict_recursive"):
-            response_dict = response.to_dict_recursive()
-        elif hasattr(response, "to_dict"):
-            response_dict = response.to_dict()
-        else:
-            raise TypeError("OpenAI API response object is not serializable.")
-
-        # Log the JSON response in a pretty format
-        print("DEBUG: CeeBee API response:", json.dumps(response_dict, indent=2))
-
-        return response_dict["choices"][0]["message"]["content"].strip()
+        # Streamed to the user when a streaming request is in progress
+        return llm_gateway.complete(messages or [], purpose=purpose, model=model, max_tokens=max_tokens)
     except Exception as e:
-        print(f"Error calling OpenAI API: {e}")
+        logger.error("Error calling OpenAI API: %s", e)
         return None
     
 def clean_reply(reply):
@@ -514,7 +578,7 @@ def handle_how_to_help(context):
     ]
 
     # Use the existing OpenAI API handler method
-    response_data = call_openai_api("gpt-4", messages)
+    response_data = call_openai_api(messages=messages, purpose="help")
 
     if not response_data:
         return {
@@ -560,7 +624,7 @@ def handle_integration_help(context):
     ]
 
     # Use the existing OpenAI API handler method
-    response_data = call_openai_api("gpt-4", messages)
+    response_data = call_openai_api(messages=messages, purpose="help")
 
     if not response_data:
         return {
@@ -599,12 +663,10 @@ def handle_ticket_close(context, details, conversation_id):
 
     # Derive the current step
     step = context.get("next_step", "wait_for_request_ticket_id" if not ticket_id else "wait_for_ask_for_closing_message")
-    print(f"DEBUG: Starting handle_ticket_close with step: {step}")
-    print(f"DEBUG: Current context: {json.dumps(context, indent=2)}")
+    logger.debug("Starting handle_ticket_close at step %s with context: %s", step, LazyJson(context))
 
     # Process the latest prompt
     prompt = request.json.get("prompt", "").strip().lower()
-    print(f"DEBUG: Received prompt: {prompt}")
 
     # Handle steps
     if step == "wait_for_request_ticket_id" and not ticket_id:
@@ -617,8 +679,7 @@ def handle_ticket_close(context, details, conversation_id):
 
     elif step == "wait_for_ticket_id":
         # Use `extract_ids` to find a ticket ID in the user input
-        doc = nlp(prompt)
-        extracted_details = extract_ids(doc)
+        extracted_details = extract_ids(prompt)
         for detail in extracted_details:
             if "ticket_id" in detail:
                 ticket_id = detail["ticket_id"]
@@ -642,8 +703,6 @@ def handle_ticket_close(context, details, conversation_id):
         context["ticket_id"] = ticket_id
         context["details"] =details
         context["reply"] = "Would you like to add a message to the ticket before closing it? (Yes/No)"
-        print(f"DEBUG: Starting handle_ticket_close with step: {step}")
-        print(f"DEBUG: Current context: {json.dumps(context, indent=2)}")
         save_context(conversation_id, context)
 
     elif step == "wait_for_ask_for_closing_message":
@@ -677,8 +736,6 @@ def handle_ticket_close(context, details, conversation_id):
         context["ticket_id"] = ticket_id
         context["details"] =details
         context["reply"] = "Please provide the message you'd like to add to the ticket before closing it."
-        print(f"DEBUG: Starting handle_ticket_close after YES is provided.")
-        print(f"DEBUG: About to be saved : {json.dumps(context, indent=2)}")
         save_context(conversation_id, context)
 
     elif step == "wait_for_closing_message":
@@ -711,7 +768,6 @@ def handle_ticket_close(context, details, conversation_id):
         context["reply"] = "Our cool new CeeBee Assistant is still learning some new tricks, and what you’re trying to do isn’t fully supported yet. \n Please check back soon, we’re working on it!"
 
     # Save updated context after processing
-    print(f"DEBUG: Saving Context in handle_ticket_close, step: {step}")
     context["ticket_id"] = ticket_id
     context["details"] =details
     save_context(conversation_id, context)
@@ -719,17 +775,16 @@ def handle_ticket_close(context, details, conversation_id):
 
 def validate_ticket(ticket_id):
     from app import generate_auth_header, FRESH_SERVICE_API_KEY, FRESH_SERVICE_BASE_URL
-    import requests
     url = f"{FRESH_SERVICE_BASE_URL}/tickets/{ticket_id}"
     headers = generate_auth_header(FRESH_SERVICE_API_KEY)
 
     # Submit the request
-    response = requests.get(url, headers=headers)
+    response = get_session("freshservice").get(url, headers=headers)
     response.raise_for_status()
 
     # Debug the raw response
     response_data = response.json()
-    print(f"DEBUG: Validate ticket raw response: {json.dumps(response_data, indent=2)}")
+    logger.debug("Validate ticket raw response: %s", LazyJson(response_data))
     return response_data
 
 def reply_ticket(payload, ticket_id):
@@ -744,83 +799,99 @@ def reply_ticket(payload, ticket_id):
 
     try:
         # Submit the request
-        response = requests.post(url, headers=headers, json=payload)
+        response = get_session("freshservice").post(url, headers=headers, json=payload)
         response.raise_for_status()  # Raise HTTPError for bad HTTP responses (4xx and 5xx)
 
         # Parse and debug the raw response
         response_data = response.json()
-        print(f"DEBUG: Successful ticket reply response: {json.dumps(response_data, indent=2)}")
+        logger.debug("Successful ticket reply response: %s", LazyJson(response_data))
         return response_data
 
     except requests.exceptions.HTTPError as e:
         # Log detailed error information
-        print(f"ERROR: HTTPError occurred: {e}")
+        logger.error("HTTPError occurred: %s", e)
         if e.response is not None:
             try:
                 error_response = e.response.json()  # Parse response if JSON
-                print(f"ERROR: FreshService API Error Response: {json.dumps(error_response, indent=2)}")
+                logger.error("FreshService API Error Response: %s", LazyJson(error_response))
             except ValueError:
-                print(f"ERROR: Non-JSON Error Response: {e.response.text}")
+                logger.error("Non-JSON Error Response: %s", e.response.text)
         raise  # Re-raise the exception for upstream handling
 
     except Exception as e:
         # Catch all other exceptions
-        print(f"ERROR: Unexpected error during ticket reply: {str(e)}")
+        logger.error("Unexpected error during ticket reply: %s", e)
         raise
 
+def iter_orders(query, page_size=50):
+    """
+    Page through the orders matching an OrderQuery, newest first.
+
+    Pages are requested as they are consumed, so a caller that stops early never fetches
+    the rest. Paging ends with the first short page, or at the first order dated before
+    the query window.
+    """
+    offset = 0
+    window_start = query.start.isoformat() if query.start else None
+    while True:
+        orders = call_commerce_api(f"{ORDERS_RESOURCE}/?{query.rql(offset, page_size)}", method="GET")
+        if not isinstance(orders, list):
+            raise ValueError("The orders data is not in the expected format (list).")
+        for order in orders:
+            if window_start and order.get("orderDate", "") < window_start:
+                return
+            yield order
+        if len(orders) < page_size:
+            return
+        offset += page_size
+
 def handle_order_reports(context):
     """
-    Handle the orderReports intent logic by querying the commerce API and filtering the order data.
+    Handle the orderReports intent logic by querying the commerce API for the period the user asked about.
     """
     user_input = context.get("prompt", "")
 
-    # Fetch orders from the API
+    # Date range and status filter from the prompt; without a period the newest orders are reported
+    start, end = parse_date_range(user_input, day_first=order_reports_config.get("day_first", False))
+    statuses = parse_statuses(user_input, order_reports_config.get("status_words"))
+    query = OrderQuery(start, end, statuses=statuses, min_total=order_reports_config.get("min_total", 0))
+    max_orders = order_reports_config.get("max_orders", 100)
+    if start is None:
+        max_orders = min(max_orders, order_reports_config.get("default_orders", 40))
+    token_budget = order_reports_config.get("token_budget", 4000)
+
+    # Fetch orders page by page until the window or the prompt budget is covered
+    transformed_orders = []
+    truncated = False
     try:
-        # Define the API endpoint for fetching orders
-        orders_endpoint = (
-            "resources/88a64097-6581-4b50-9745-26843f37461c/orders/"
-            "?in(type,(SO,CF,CH,CL,DG,UG,RN,CH,TA,TS)),sort(-orderDate),limit(0,40)"
-        )
-
-        # Call the commerce API to fetch orders
-        orders = call_commerce_api(orders_endpoint, method="GET")
-
-        if not isinstance(orders, list):
-            raise ValueError("The orders data is not in the expected format (list).")
+        tokens = 0
+        for order in iter_orders(query, page_size=order_reports_config.get("page_size", 50)):
+            # Transform the order to a smaller payload
+            transformed_order = {
+                "orderId": order["orderId"],
+                "internalId": order["internalId"],
+                "orderNumber": order["orderNumber"],
+                "total": order["total"],
+                "status": order["status"],
+                "paymentStatus": order["paymentStatus"],
+                "provisioningStatus": order["provisioningStatus"],
+                "orderDate": order["orderDate"],
+                "endCustomerName": order["endCustomerName"],
+                "sourceSystem": order.get("sourceSystem", "N/A")
+            }
+            tokens += count_tokens(json.dumps(transformed_order, separators=(",", ":")))
+            if len(transformed_orders) >= max_orders or tokens > token_budget:
+                truncated = True
+                break
+            transformed_orders.append(transformed_order)
     except Exception as e:
         return {
             "reply": f"An error occurred while fetching orders from the API: {e}",
             "next_step": "error"
         }
 
-    # Filter orders by orderDate (2024 and after)
-    filtered_orders = [
-        order for order in orders
-        if "orderDate" in order and order["orderDate"] >= "2024-11-19" and order.get("total", {}).get("value", 0) > 0
-    ]
-
-    # Sort the filtered orders by orderDate (newest first) and limit to 100 orders
-    filtered_orders = sorted(filtered_orders, key=lambda x: x["orderDate"], reverse=True)[:100]
-
-    # Transform the orders to a smaller payload
-    transformed_orders = [
-        {
-            "orderId": order["orderId"],
-            "internalId": order["internalId"],
-            "orderNumber": order["orderNumber"],
-            "total": order["total"],
-            "status": order["status"],
-            "paymentStatus": order["paymentStatus"],
-            "provisioningStatus": order["provisioningStatus"],
-            "orderDate": order["orderDate"],
-            "endCustomerName": order["endCustomerName"],
-            "sourceSystem": order.get("sourceSystem", "N/A")
-        }
-        for order in filtered_orders
-    ]
-
     # Echo how many orders were selected
-    print(f"DEBUG: Number of orders selected: {len(filtered_orders)}")
+    logger.debug("Number of orders selected: %d", len(transformed_orders))
 
     # Define the assistant prompt
     system_prompt = (
@@ -836,14 +907,17 @@ def handle_order_reports(context):
 
     # Prepare the messages payload
     compact_orders = json.dumps(transformed_orders, separators=(",", ":"))
+    data_scope = f"{query.describe()}, newest first"
+    if truncated:
+        data_scope += f", limited to the {len(transformed_orders)} most recent"
     messages = [
         {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"Here is the filtered order data: {compact_orders}"},
+        {"role": "user", "content": f"Here is the filtered order data ({data_scope}): {compact_orders}"},
         {"role": "user", "content": user_input}
     ]
 
     # Use the OpenAI API handler method with a smaller max_tokens value
-    response_data = call_openai_api("gpt-4", messages, max_tokens=2000)
+    response_data = call_openai_api(messages=messages, max_tokens=2000, purpose="order_analysis")
 
     if not response_data:
         return {
@@ -875,53 +949,94 @@ def call_commerce_api(endpoint, method='GET', payload=None, params=None):
     :return: JSON response or raises an HTTP error.
     """
     try:
-        with open('config/config.json') as config_file:
-            config = json.load(config_file)
-
-        APS_TOKEN = config['aps_info']['aps_token']
-        BASE_URL = config['aps_info']['aps_endpoint'].rstrip('/')
-
-        url = f"{BASE_URL}/{endpoint.lstrip('/')}"
-        headers = {
-            'Content-Type': 'application/json',
-            'APS-Token': APS_TOKEN
-        }
-
-        # Print the request details
-        print(f"DEBUG: Making {method.upper()} request to {url}")
-        if params:
-            print(f"DEBUG: Query Parameters:\n{json.dumps(params, indent=2)}")
-        if payload:
-            print(f"DEBUG: Payload:\n{json.dumps(payload, indent=2)}")
+        logger.debug("Making %s request to %s params=%s payload=%s",
+                     method.upper(), endpoint, LazyJson(params), LazyJson(payload))
 
         # Make the request
-        if method.upper() == 'GET':
-            response = requests.get(url, headers=headers, params=params)
-        elif method.upper() == 'POST':
-            response = requests.post(url, headers=headers, json=payload)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}. Use 'GET' or 'POST'.")
+        response = commerce_client.request(endpoint, method=method, payload=payload, params=params)
 
         # Raise an error for bad HTTP responses
         response.raise_for_status()
 
-        # Parse and print the response
+        # Parse and log the response
         try:
             response_json = response.json()
-            print(f"DEBUG: Response JSON:\n{json.dumps(response_json, indent=2)}")
+            logger.debug("Response JSON: %s", LazyJson(response_json))
             return response_json
         except ValueError:
             # Non-JSON response
-            print(f"DEBUG: Response Text:\n{response.text}")
+            logger.debug("Response Text: %s", response.text)
             return response.text
 
-    except FileNotFoundError:
-        raise Exception("Configuration file 'config.json' not found.")
-    except KeyError as e:
-        raise Exception(f"Missing required configuration key: {e}")
     except requests.exceptions.RequestException as e:
         raise Exception(f"An error occurred while making the API request: {e}")
 
+# Commerce resource holding the order documents
+ORDERS_RESOURCE = "resources/88a64097-6581-4b50-9745-26843f37461c/orders"
+
+def resolve_order_id(order_number):
+    """
+    Resolve an order number to its order ID, searching the commerce API only on a cache miss.
+
+    Raises:
+        ValueError: If no order matches the order number.
+    """
+    order_id = order_cache.get_order_id(order_number) if order_cache is not None else None
+    if order_id:
+        return order_id
+
+    order_search_endpoint = f"services/order-manager/orders?like(orderNumber,{order_number}),select(orderDetails)"
+    order_search_response = call_commerce_api(order_search_endpoint, method="GET")
+
+    if not order_search_response or not isinstance(order_search_response, list):
+        raise ValueError("Order search API response is invalid or empty.")
+
+    # Extract the orderId from the first order in the response
+    order_id = order_search_response[0].get("orderId")
+    if not order_id:
+        raise ValueError("Order ID not found in the order search response.")
+
+    if order_cache is not None:
+        order_cache.put_order_id(order_number, order_id)
+    return order_id
+
+def fetch_order_details(order_id):
+    """
+    Fetch an order document, from the cache while it is fresh.
+
+    An expired document with an ETag is revalidated with If-None-Match, so an unchanged
+    order costs a 304 instead of the full document.
+
+    Raises:
+        ValueError: If the commerce API returns no order document.
+    """
+    cached, etag, fresh = order_cache.get_details(order_id) if order_cache is not None else (None, None, False)
+    if fresh:
+        return cached
+
+    order_details_endpoint = f"{ORDERS_RESOURCE}/{order_id}"
+    conditional = {"If-None-Match": etag} if cached is not None and etag else None
+    try:
+        logger.debug("Making GET request to %s", order_details_endpoint)
+        response = commerce_client.request(order_details_endpoint, method="GET", headers=conditional)
+        if response.status_code == 304 and conditional:
+            order_cache.refresh_details(order_id, cached)
+            return cached
+        response.raise_for_status()
+        try:
+            order_details_response = response.json()
+        except ValueError:
+            order_details_response = None
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"An error occurred while making the API request: {e}")
+
+    if not order_details_response or not isinstance(order_details_response, dict):
+        raise ValueError("Order details API response is invalid or empty.")
+
+    if order_cache is not None:
+        order_cache.put_details(order_id, order_details_response, response.headers.get("ETag"))
+    return order_details_response
+
 def handle_get_order_info(context, details):
     """
     Handles the intent to fetch order information and process it for OpenAI.
@@ -948,25 +1063,9 @@ def handle_get_order_info(context, details):
         }
 
     try:
-        # First API call to find the order by order number
-        order_search_endpoint = f"services/order-manager/orders?like(orderNumber,{order_number}),select(orderDetails)"
-        order_search_response = call_commerce_api(order_search_endpoint, method="GET")
-
-        if not order_search_response or not isinstance(order_search_response, list):
-            raise ValueError("Order search API response is invalid or empty.")
-
-        # Extract the orderId from the first order in the response
-        order_data = order_search_response[0]
-        order_id = order_data.get("orderId")
-        if not order_id:
-            raise ValueError("Order ID not found in the order search response.")
-
-        # Second API call to fetch detailed order information
-        order_details_endpoint = f"resources/88a64097-6581-4b50-9745-26843f37461c/orders/{order_id}"
-        order_details_response = call_commerce_api(order_details_endpoint, method="GET")
-
-        if not order_details_response or not isinstance(order_details_response, dict):
-            raise ValueError("Order details API response is invalid or empty.")
+        # Resolve the order number and fetch the order, both cached
+        order_id = resolve_order_id(order_number)
+        order_details_response = fetch_order_details(order_id)
 
         # Extract relevant information
         end_customer_name = order_details_response.get("endCustomerName", "N/A")
@@ -1011,7 +1110,6 @@ def handle_get_order_info(context, details):
 
         # Call OpenAI API
         openai_response = call_openai_api(
-            model="gpt-4",
             messages=[
                 {
                     "role": "system",
@@ -1025,7 +1123,8 @@ def handle_get_order_info(context, details):
                     )
                 },
                 {"role": "user", "content": openai_prompt}
-            ]
+            ],
+            purpose="order_analysis"
         )
 
         return {
@@ -1034,7 +1133,7 @@ def handle_get_order_info(context, details):
         }
 
     except Exception as e:
-        print(f"Error in handle_get_order_info: {e}")
+        logger.exception("Error in handle_get_order_info: %s", e)
         return {
             "reply": f"An error occurred while processing the order information: {e}",
             "next_step": "error"
@@ -1121,7 +1220,6 @@ def handle_get_order_info(context, details):
 
         # Call OpenAI API
         openai_response = call_openai_api(
-            model="gpt-4",
             messages=[
                 {
                     "role": "system", 
@@ -1131,7 +1229,8 @@ def handle_get_order_info(context, details):
                         "If field 'reason' in 'errorDetails' is not null, please summarize that text for the user and put it at the top of your reply followed by \n\n"
                     },
                 {"role": "user", "content": openai_prompt}
-            ]
+            ],
+            purpose="order_analysis"
         )
 
         return {
@@ -1140,7 +1239,7 @@ def handle_get_order_info(context, details):
         }
 
     except Exception as e:
-        print(f"Error in handle_get_order_info: {e}")
+        logger.exception("Error in handle_get_order_info: %s", e)
         return {
             "reply": f"An error occurred while processing the order information: {e}",
             "next_step": "error"
@@ -1172,23 +1271,16 @@ def handle_order_resubmission(context, details):
         }
 
     try:
-        # First API call to find the order by order number
-        order_search_endpoint = f"services/order-manager/orders?like(orderNumber,{order_number}),select(orderDetails)"
-        order_search_response = call_commerce_api(order_search_endpoint, method="GET")
-
-        if not order_search_response or not isinstance(order_search_response, list):
-            raise ValueError("Order search API response is invalid or empty.")
-
-        # Extract the orderId from the first order in the response
-        order_data = order_search_response[0]
-        order_id = order_data.get("orderId")
-        if not order_id:
-            raise ValueError("Order ID not found in the order search response.")
+        # Find the order ID of the order number
+        order_id = resolve_order_id(order_number)
 
         # Resubmit the order using the extracted orderId
         resubmit_endpoint = f"services/order-manager/orders/{order_id}/push"
         payload = {"ofStatus": "PD"}  # Payload required for resubmission
         resubmit_response = call_commerce_api(resubmit_endpoint, method="POST", payload=payload)
+        # The order changes status now; drop the cached document
+        if order_cache is not None:
+            order_cache.invalidate(order_id)
 
         return {
             "reply": f"The order with order number **{order_number}** has been successfully resubmitted. \n\n [Follow the order here](https://hpeinc.demos.cloudblue.com/ccp/v/pa/ux1-ui/order-details?orderId={order_id})",
@@ -1234,23 +1326,16 @@ def handle_order_cancellation(context, details):
         }
 
     try:
-        # First API call to find the order by order number
-        order_search_endpoint = f"services/order-manager/orders?like(orderNumber,{order_number}),select(orderDetails)"
-        order_search_response = call_commerce_api(order_search_endpoint, method="GET")
-
-        if not order_search_response or not isinstance(order_search_response, list):
-            raise ValueError("Order search API response is invalid or empty.")
-
-        # Extract the orderId from the first order in the response
-        order_data = order_search_response[0]
-        order_id = order_data.get("orderId")
-        if not order_id:
-            raise ValueError("Order ID not found in the order search response.")
+        # Find the order ID of the order number
+        order_id = resolve_order_id(order_number)
 
         # Resubmit the order using the extracted orderId
         resubmit_endpoint = f"services/order-manager/orders/{order_id}/push"
         payload = {"ofStatus": "CL"}  # Payload required for resubmission
         resubmit_response = call_commerce_api(resubmit_endpoint, method="POST", payload=payload)
+        # The order changes status now; drop the cached document
+        if order_cache is not None:
+            order_cache.invalidate(order_id)
 
         return {
             "reply": f"The order with order number **{order_number}** has been successfully submitted for cancellation.\n\n [Follow the order here](https://hpeinc.demos.cloudblue.com/ccp/v/pa/ux1-ui/order-details?orderId={order_id})",